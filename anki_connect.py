@@ -0,0 +1,337 @@
+"""Shared AnkiConnect client used by every script that talks to Anki.
+
+Each script used to open a fresh HTTP connection per action.  The client keeps
+a small pool of persistent HTTP/1.1 connections, retries while Anki reports the
+collection as unavailable, batches actions through ``multi``, and records
+per-action latency so a sync can report where its time went.
+
+Set ``ANKI_CONNECT_URL`` or ``ANKI_CONNECT_TIMEOUT`` to point the scripts at a
+different AnkiConnect instance or to allow slower collections.
+"""
+
+from __future__ import annotations
+
+import http.client
+import json
+import os
+import threading
+import time
+from typing import Callable
+from urllib.parse import urlsplit
+
+API_VERSION = 6
+DEFAULT_URL = "http://127.0.0.1:8765"
+DEFAULT_TIMEOUT = 60.0
+MULTI_TIMEOUT = 120.0
+MULTI_BATCH_SIZE = 25
+CARDS_INFO_BATCH_SIZE = 500
+RETRY_ERRORS = {"collection is not available"}
+RETRY_ATTEMPTS = 3
+RETRY_DELAY = 2.0
+POOL_SIZE = 4
+LOCAL_HOSTS = {"127.0.0.1", "localhost", "::1"}
+
+# A reused keep-alive socket may have been closed by Anki between requests.
+# These errors before any response byte mean the request never reached Anki.
+_STALE_CONNECTION_ERRORS = (
+    http.client.RemoteDisconnected,
+    ConnectionResetError,
+    BrokenPipeError,
+)
+# Placeholder result for a failed ``multi`` action.
+_FAILED = object()
+
+
+class AnkiConnectError(RuntimeError):
+    """AnkiConnect returned an error or could not be reached."""
+
+
+class AnkiConnectClient:
+    """Thread-safe AnkiConnect client with pooled keep-alive connections."""
+
+    def __init__(
+        self,
+        url: str = DEFAULT_URL,
+        timeout: float = DEFAULT_TIMEOUT,
+        retries: int = RETRY_ATTEMPTS,
+        retry_delay: float = RETRY_DELAY,
+        pool_size: int = POOL_SIZE,
+    ):
+        parts = urlsplit(url)
+        self.url = url
+        self.host = parts.hostname or "127.0.0.1"
+        self.port = parts.port or 8765
+        self.path = parts.path or "/"
+        self.timeout = timeout
+        self.retries = max(1, retries)
+        self.retry_delay = retry_delay
+        self.pool_size = max(1, pool_size)
+        self._idle: list[http.client.HTTPConnection] = []
+        self._lock = threading.Lock()
+        self._stats: dict[str, dict[str, float]] = {}
+
+    def invoke(self, action: str, **params):
+        return self.request(action, params)
+
+    def is_local(self) -> bool:
+        """Whether Anki runs on this machine and can read our file paths."""
+        return self.host in LOCAL_HOSTS
+
+    def request(self, action: str, params: dict | None = None, timeout: float | None = None):
+        """Run one action, retrying while the collection is unavailable."""
+        body = json.dumps(
+            {"action": action, "params": params or {}, "version": API_VERSION}
+        ).encode("utf-8")
+        for attempt in range(self.retries):
+            started = time.perf_counter()
+            try:
+                response = self._post(body, timeout or self.timeout)
+            finally:
+                self._record(action, time.perf_counter() - started)
+            error = response.get("error")
+            if not error:
+                return response.get("result")
+            if error not in RETRY_ERRORS or attempt == self.retries - 1:
+                raise AnkiConnectError(error)
+            time.sleep(self.retry_delay)
+        raise AnkiConnectError("collection is not available")
+
+    def multi(
+        self,
+        actions: list[dict],
+        batch_size: int = MULTI_BATCH_SIZE,
+        timeout: float = MULTI_TIMEOUT,
+    ) -> list:
+        """Run actions through ``multi`` in batches and return flat results."""
+        results: list = []
+        for offset in range(0, len(actions), batch_size):
+            batch = actions[offset : offset + batch_size]
+            results.extend(multi_results(self.request("multi", {"actions": batch}, timeout=timeout)))
+        return results
+
+    def stats(self) -> dict[str, dict[str, float]]:
+        """Return request count and latency per action, slowest total first."""
+        with self._lock:
+            items = [(action, dict(values)) for action, values in self._stats.items()]
+        items.sort(key=lambda item: item[1]["seconds"], reverse=True)
+        return {
+            action: {
+                "requests": int(values["requests"]),
+                "seconds": round(values["seconds"], 3),
+                "max_seconds": round(values["max_seconds"], 3),
+            }
+            for action, values in items
+        }
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            self._stats.clear()
+
+    def close(self) -> None:
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for connection in idle:
+            connection.close()
+
+    def _record(self, action: str, seconds: float) -> None:
+        with self._lock:
+            values = self._stats.setdefault(
+                action, {"requests": 0, "seconds": 0.0, "max_seconds": 0.0}
+            )
+            values["requests"] += 1
+            values["seconds"] += seconds
+            values["max_seconds"] = max(values["max_seconds"], seconds)
+
+    def _acquire(self, timeout: float) -> http.client.HTTPConnection:
+        with self._lock:
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+        connection.timeout = timeout
+        if connection.sock is not None:
+            connection.sock.settimeout(timeout)
+        return connection
+
+    def _release(self, connection: http.client.HTTPConnection) -> None:
+        with self._lock:
+            if len(self._idle) < self.pool_size:
+                self._idle.append(connection)
+                return
+        connection.close()
+
+    def _post(self, body: bytes, timeout: float) -> dict:
+        connection = self._acquire(timeout)
+        reused = connection.sock is not None
+        try:
+            try:
+                payload = self._round_trip(connection, body)
+            except _STALE_CONNECTION_ERRORS:
+                if not reused:
+                    raise
+                connection.close()
+                payload = self._round_trip(connection, body)
+        except (OSError, http.client.HTTPException, ValueError) as error:
+            connection.close()
+            raise AnkiConnectError(f"AnkiConnect request failed: {error}") from error
+        self._release(connection)
+        return payload
+
+    def _round_trip(self, connection: http.client.HTTPConnection, body: bytes) -> dict:
+        connection.request("POST", self.path, body, {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        data = response.read()
+        if response.status != 200:
+            raise http.client.HTTPException(f"HTTP {response.status} {response.reason}")
+        payload = json.loads(data.decode("utf-8"))
+        if not isinstance(payload, dict):
+            raise ValueError(f"unexpected AnkiConnect response: {payload!r}")
+        return payload
+
+
+class ActionQueue:
+    """Defer AnkiConnect actions and send them as ``multi`` batches.
+
+    Each queued action may carry a callback that receives that action's own
+    result, so callers keep per-row bookkeeping while requests are coalesced.
+    Callbacks may queue follow-up actions; ``flush`` drains until empty.  A
+    batch holding a single action is sent directly instead of through
+    ``multi``.
+    """
+
+    def __init__(self, invoke: Callable | None = None, batch_size: int = MULTI_BATCH_SIZE):
+        self._invoke = invoke or (lambda action, **params: default_client().request(action, params))
+        self.batch_size = max(1, batch_size)
+        self.requests = 0
+        self.actions = 0
+        self._pending: list[tuple[dict, Callable | None]] = []
+        self._sending = False
+
+    def __enter__(self) -> "ActionQueue":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        if exc_type is None:
+            self.flush()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, action: str, callback: Callable | None = None, **params) -> None:
+        self._pending.append(({"action": action, "params": params}, callback))
+        if len(self._pending) >= self.batch_size and not self._sending:
+            self._send_batch()
+
+    def flush(self) -> None:
+        while self._pending:
+            self._send_batch()
+
+    def _send_batch(self) -> None:
+        batch = self._pending[: self.batch_size]
+        del self._pending[: self.batch_size]
+        error = None
+        if len(batch) == 1:
+            action = batch[0][0]
+            results = [self._invoke(action["action"], **action["params"])]
+        else:
+            # Anki runs every action of a multi request even when one fails,
+            # so each successful action's callback runs before the error.
+            results, error = _split_multi_results(
+                self._invoke("multi", actions=[action for action, _ in batch])
+            )
+        self.requests += 1
+        self.actions += len(batch)
+        self._sending = True
+        try:
+            for (_, callback), result in zip(batch, results):
+                if callback is not None and result is not _FAILED:
+                    callback(result)
+        finally:
+            self._sending = False
+        if error is not None:
+            raise error
+
+
+def plan_deck_moves(
+    invoke: Callable, rows, existing_notes: dict, batch_size: int = CARDS_INFO_BATCH_SIZE
+) -> dict[str, list[int]]:
+    """Return target deck -> card IDs for existing cards outside their row's ``DeckPath``.
+
+    ``existing_notes`` maps ``SourceID`` to a ``notesInfo`` record.  Card
+    decks are read with one ``cardsInfo`` sweep, so a no-op resync plans no
+    moves.
+    """
+    target_by_card = {}
+    for row in rows:
+        note = existing_notes.get(row["SourceID"])
+        for card_id in (note or {}).get("cards", []):
+            target_by_card[card_id] = row["DeckPath"]
+    card_ids = list(target_by_card)
+    moves: dict[str, list[int]] = {}
+    for offset in range(0, len(card_ids), batch_size):
+        for card in invoke("cardsInfo", cards=card_ids[offset : offset + batch_size]):
+            target = target_by_card.get(card.get("cardId"))
+            if target and card.get("deckName") != target:
+                moves.setdefault(target, []).append(card["cardId"])
+    return moves
+
+
+def multi_results(items) -> list:
+    """Unwrap per-action ``multi`` results, raising if any action failed."""
+    results, error = _split_multi_results(items)
+    if error is not None:
+        raise error
+    return results
+
+
+def _split_multi_results(items) -> tuple[list, AnkiConnectError | None]:
+    """Return every result, ``_FAILED`` for failed actions, and one error listing them."""
+    results = []
+    errors = []
+    for index, item in enumerate(items or []):
+        if isinstance(item, dict) and item.get("error"):
+            results.append(_FAILED)
+            errors.append(f"action {index}: {item['error']}")
+        elif isinstance(item, dict) and "result" in item:
+            results.append(item.get("result"))
+        else:
+            results.append(item)
+    return results, AnkiConnectError("; ".join(errors)) if errors else None
+
+
+_default_client: AnkiConnectClient | None = None
+_default_lock = threading.Lock()
+
+
+def default_client() -> AnkiConnectClient:
+    """Return the process-wide client, configured from the environment."""
+    global _default_client
+    with _default_lock:
+        if _default_client is None:
+            _default_client = AnkiConnectClient(
+                url=os.environ.get("ANKI_CONNECT_URL", DEFAULT_URL),
+                timeout=float(os.environ.get("ANKI_CONNECT_TIMEOUT", DEFAULT_TIMEOUT)),
+            )
+        return _default_client
+
+
+def configure(**options) -> AnkiConnectClient:
+    """Replace the process-wide client, closing its pooled connections."""
+    global _default_client
+    client = AnkiConnectClient(**options)
+    with _default_lock:
+        previous, _default_client = _default_client, client
+    if previous is not None:
+        previous.close()
+    return client
+
+
+def invoke(action: str, **params):
+    return default_client().request(action, params)
+
+
+def invoke_multi(actions: list[dict], batch_size: int = MULTI_BATCH_SIZE) -> list:
+    return default_client().multi(actions, batch_size)
+
+
+def request_stats() -> dict[str, dict[str, float]]:
+    return default_client().stats()
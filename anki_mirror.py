@@ -0,0 +1,221 @@
+"""Local SQLite mirror of live Anki note state for incremental syncs.
+
+Every sync starts from ``notesInfo`` for a whole model, which is megabytes of
+field HTML for the larger decks.  The mirror keeps the last fields, tags, card
+IDs and ``mod`` timestamp seen for each note.  A refresh lists the model's note
+IDs, asks AnkiConnect for their modification times only, and refetches full
+``notesInfo`` just for notes that are new or whose ``mod`` changed.  Because the
+check compares exact ``mod`` values, edits that arrive later through AnkiWeb
+sync are still refetched.  When ``notesModTime`` is unsupported the whole model
+is fetched, so a stale mirror never hides a manual edit.
+
+Moving or suspending a card, and generating or deleting one, leave the note's
+``mod`` alone.  Each refresh therefore lists the model's card IDs with
+``findCards`` and refetches the notes whose cards were added or deleted.
+Card decks and suspension state are never served from the mirror; callers
+read them live with ``cardsInfo``.
+
+``iter_notes`` yields the same notes in batches: unchanged cached notes first,
+then each refetched ``notesInfo`` chunk while the next one is already in
+flight, so callers can process a model while it is still being fetched.
+
+The database is local state, not source: delete it or pass ``--refresh-mirror``
+to a sync script to rebuild it from Anki.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterator
+
+MIRROR_PATH = Path(
+    os.environ.get(
+        "ANKI_MIRROR_PATH",
+        Path(__file__).resolve().parent / "generated" / "anki_state" / "note_mirror.sqlite3",
+    )
+)
+NOTES_INFO_BATCH_SIZE = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS notes (
+    note_id INTEGER PRIMARY KEY,
+    model TEXT NOT NULL,
+    mod INTEGER NOT NULL,
+    tags TEXT NOT NULL,
+    cards TEXT NOT NULL,
+    fields TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS notes_model ON notes (model);
+"""
+
+
+class NoteMirror:
+    """SQLite-backed copy of ``notesInfo`` results keyed by note ID."""
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path or MIRROR_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.executescript(SCHEMA)
+        self.last_refresh: dict[str, dict[str, int]] = {}
+
+    def __enter__(self) -> "NoteMirror":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def _stale_ids(self, invoke: Callable, model_name: str) -> tuple[list[int], list[int]]:
+        note_ids = invoke("findNotes", query=f'note:"{model_name}"') or []
+        cached = self.cached_mods(model_name)
+        live_mods = live_mod_times(invoke, note_ids) if cached else None
+        if live_mods is None:
+            return note_ids, list(note_ids)
+        stale = {
+            note_id
+            for note_id in note_ids
+            if note_id not in cached or cached[note_id] != live_mods.get(note_id)
+        }
+        stale.update(self._notes_with_changed_cards(invoke, model_name))
+        return note_ids, [note_id for note_id in note_ids if note_id in stale]
+
+    def _notes_with_changed_cards(self, invoke: Callable, model_name: str) -> set[int]:
+        """Return notes whose cards were added or deleted without a change to their ``mod``."""
+        live_cards = set(invoke("findCards", query=f'note:"{model_name}"') or [])
+        owners = self.cached_card_owners(model_name)
+        changed = {owners[card_id] for card_id in owners.keys() - live_cards}
+        added = sorted(live_cards - owners.keys())
+        if added:
+            changed.update(invoke("cardsToNotes", cards=added) or [])
+        return changed
+
+    def notes(self, invoke: Callable, model_name: str) -> list[dict]:
+        """Return notesInfo-shaped notes for a model, refetching only changes."""
+        note_ids, stale_ids = self._stale_ids(invoke, model_name)
+        fetched = []
+        for offset in range(0, len(stale_ids), NOTES_INFO_BATCH_SIZE):
+            fetched.extend(
+                invoke("notesInfo", notes=stale_ids[offset : offset + NOTES_INFO_BATCH_SIZE]) or []
+            )
+        self.store(model_name, fetched, keep_ids=note_ids)
+        self.last_refresh[model_name] = {"notes": len(note_ids), "fetched": len(fetched)}
+        return self.load(model_name, note_ids)
+
+    def iter_notes(self, invoke: Callable, model_name: str) -> Iterator[list[dict]]:
+        """Yield a model's notes in batches, prefetching the next changed chunk."""
+        note_ids, stale_ids = self._stale_ids(invoke, model_name)
+        self.store(model_name, [], keep_ids=note_ids)
+        stale = set(stale_ids)
+        unchanged = [note_id for note_id in note_ids if note_id not in stale]
+        if unchanged:
+            yield self.load(model_name, unchanged)
+        chunks = [
+            stale_ids[offset : offset + NOTES_INFO_BATCH_SIZE]
+            for offset in range(0, len(stale_ids), NOTES_INFO_BATCH_SIZE)
+        ]
+        fetched = 0
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            pending = pool.submit(invoke, "notesInfo", notes=chunks[0]) if chunks else None
+            for index in range(len(chunks)):
+                notes = pending.result() or []
+                if index + 1 < len(chunks):
+                    pending = pool.submit(invoke, "notesInfo", notes=chunks[index + 1])
+                self.store(model_name, notes)
+                fetched += len(notes)
+                yield notes
+        self.last_refresh[model_name] = {"notes": len(note_ids), "fetched": fetched}
+
+    def cached_mods(self, model_name: str) -> dict[int, int]:
+        rows = self.db.execute("SELECT note_id, mod FROM notes WHERE model = ?", (model_name,))
+        return dict(rows)
+
+    def cached_card_owners(self, model_name: str) -> dict[int, int]:
+        rows = self.db.execute("SELECT note_id, cards FROM notes WHERE model = ?", (model_name,))
+        return {card_id: note_id for note_id, cards in rows for card_id in json.loads(cards)}
+
+    def store(self, model_name: str, notes: list[dict], keep_ids=None) -> None:
+        """Upsert fetched notes; with ``keep_ids``, drop the model's other notes."""
+        with self.db:
+            if keep_ids is not None:
+                keep = set(keep_ids)
+                gone = [
+                    (note_id,)
+                    for note_id in self.cached_mods(model_name)
+                    if note_id not in keep
+                ]
+                self.db.executemany("DELETE FROM notes WHERE note_id = ?", gone)
+            self.db.executemany(
+                "INSERT OR REPLACE INTO notes (note_id, model, mod, tags, cards, fields)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (
+                        note["noteId"],
+                        model_name,
+                        int(note.get("mod", -1)),
+                        json.dumps(note.get("tags", []), ensure_ascii=False),
+                        json.dumps(note.get("cards", [])),
+                        json.dumps(note.get("fields", {}), ensure_ascii=False),
+                    )
+                    for note in notes
+                ],
+            )
+
+    def load(self, model_name: str, note_ids=None) -> list[dict]:
+        rows = self.db.execute(
+            "SELECT note_id, mod, tags, cards, fields FROM notes WHERE model = ?",
+            (model_name,),
+        )
+        by_id = {
+            note_id: {
+                "noteId": note_id,
+                "modelName": model_name,
+                "mod": mod,
+                "tags": json.loads(tags),
+                "cards": json.loads(cards),
+                "fields": json.loads(fields),
+            }
+            for note_id, mod, tags, cards, fields in rows
+        }
+        order = note_ids if note_ids is not None else sorted(by_id)
+        return [by_id[note_id] for note_id in order if note_id in by_id]
+
+    def invalidate(self, model_name: str) -> None:
+        """Forget a model so its next refresh fetches every note."""
+        with self.db:
+            self.db.execute("DELETE FROM notes WHERE model = ?", (model_name,))
+
+
+def live_mod_times(invoke: Callable, note_ids) -> dict[int, int] | None:
+    """Return note ID -> mod from ``notesModTime``, or None when unsupported."""
+    if not note_ids:
+        return {}
+    try:
+        rows = invoke("notesModTime", notes=list(note_ids))
+    except RuntimeError:
+        return None
+    return {row["noteId"]: row["mod"] for row in rows or []}
+
+
+def model_notes(invoke: Callable, model_name: str) -> list[dict]:
+    with NoteMirror() as mirror:
+        return mirror.notes(invoke, model_name)
+
+
+def iter_model_notes(invoke: Callable, model_name: str) -> Iterator[list[dict]]:
+    with NoteMirror() as mirror:
+        yield from mirror.iter_notes(invoke, model_name)
+
+
+def invalidate(*model_names: str) -> None:
+    if not MIRROR_PATH.exists():
+        return
+    with NoteMirror() as mirror:
+        for model_name in model_names:
+            mirror.invalidate(model_name)
@@ -6,22 +6,79 @@ still created if missing, and scheduling/deck operations still apply.
 
 Run ``protect_manual_edits.py`` while Anki is open to automatically detect notes
 whose content differs from the source TSV and tag them as locked.
+
+Protected notes still receive source changes to fields the user did not touch.
+``SyncBase`` keeps the last value each sync wrote per field (a local SQLite
+sidecar next to the note mirror), and ``FieldMerger`` merges three ways: a
+field whose live value still equals that base takes the new source value, a
+field changed only in Anki keeps its edit, and a field changed on both sides
+is reported as a conflict and left alone.
+
+``SyncFingerprint`` holds the content fingerprint, then ``:`` and a compact
+per-field vector: the first 8 bytes of each field's SHA-256, base64url
+encoded.  The vector names the exact fields edited since the last sync, and it
+stands in for the merge base when the sidecar has none.  Older notes store the
+bare fingerprint and fall back to whole-note comparison.
+
+Legacy fingerprints are looked up in ``legacy_sync_fingerprints.idx``, a
+binary index derived from the JSON manifest.  Per namespace it holds the
+SHA-256 of each source ID and the raw 32-byte fingerprints of that ID, both
+sorted, and is read through ``mmap`` with a binary search.  The index is
+rebuilt whenever the JSON changes; ``python3 anki_protect.py`` builds it
+explicitly.
 """
 
 from __future__ import annotations
 
+import argparse
+import base64
+import binascii
 import hashlib
 import html
 import json
+import mmap
+import os
 import re
+import sqlite3
+import struct
+import threading
 from functools import lru_cache
+from json.encoder import encode_basestring
 from pathlib import Path
+from typing import Iterable, NamedTuple
 
 LOCKED_TAG = "locked"
 FINGERPRINT_FIELD = "SyncFingerprint"
 LEGACY_FINGERPRINT_PATH = (
     Path(__file__).resolve().parent / "generated" / "legacy_sync_fingerprints.json"
 )
+LEGACY_INDEX_PATH = LEGACY_FINGERPRINT_PATH.with_suffix(".idx")
+LEGACY_INDEX_MAGIC = b"LGFP"
+LEGACY_INDEX_VERSION = 1
+SYNC_BASE_PATH = Path(
+    os.environ.get(
+        "ANKI_SYNC_BASE_PATH",
+        Path(__file__).resolve().parent / "generated" / "anki_state" / "sync_base.sqlite3",
+    )
+)
+SYNC_BASE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS bases (
+    namespace TEXT NOT NULL,
+    source_id TEXT NOT NULL,
+    fields TEXT NOT NULL,
+    PRIMARY KEY (namespace, source_id)
+) WITHOUT ROWID;
+"""
+FIELD_VECTOR_SEPARATOR = ":"
+FIELD_DIGEST_SIZE = 8
+# magic, version, SHA-256 of the JSON manifest, namespace count
+_INDEX_HEADER = struct.Struct("<4sI32sI")
+# entry count, fingerprint count, entries offset, fingerprints offset
+_INDEX_NAMESPACE = struct.Struct("<IIQQ")
+# SHA-256 of the source ID, first fingerprint position, fingerprint count
+_INDEX_ENTRY = struct.Struct("<32sII")
+_DIGEST_SIZE = 32
+_legacy_index_lock = threading.Lock()
 
 # Fields that are not "content" the user authors by hand. These are either
 # identifiers, scheduling/deck metadata, or media handles rewritten by the sync
@@ -90,19 +147,85 @@ def content_fields(field_names) -> list:
     return [name for name in field_names if name not in NON_CONTENT_FIELDS]
 
 
+@lru_cache(maxsize=32)
+def _field_order(field_names: tuple) -> tuple[tuple[str, str], ...]:
+    """Pair each field name with its pre-encoded ``["name",`` payload prefix."""
+    return tuple((name, f"[{encode_basestring(name)},") for name in field_names)
+
+
+def _fingerprint(fields: dict, order) -> str:
+    # Same bytes as json.dumps([[name, value], ...], ensure_ascii=False,
+    # separators=(",", ":")), with the field names encoded only once.
+    payload = ",".join(
+        prefix + encode_basestring(raw_collapse(_field_text(fields.get(name)))) + "]" for name, prefix in order
+    )
+    return hashlib.sha256(f"[{payload}]".encode("utf-8")).hexdigest()
+
+
+def _field_digest(prefix: str, value) -> bytes:
+    payload = prefix + encode_basestring(raw_collapse(_field_text(value))) + "]"
+    return hashlib.sha256(payload.encode("utf-8")).digest()[:FIELD_DIGEST_SIZE]
+
+
 def content_fingerprint(fields: dict, field_names) -> str:
     """Return a stable fingerprint of exactly the fields a sync may replace."""
-    values = [[name, raw_collapse(_field_text(fields.get(name)))] for name in field_names]
-    payload = json.dumps(values, ensure_ascii=False, separators=(",", ":"))
-    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+    return _fingerprint(fields, _field_order(tuple(field_names)))
+
+
+def field_vector(fields: dict, field_names) -> str:
+    """Return the compact per-field fingerprint vector stored after ``:``."""
+    return _encode_vector(_field_digest(prefix, fields.get(name)) for name, prefix in _field_order(tuple(field_names)))
+
+
+def _encode_vector(digests: Iterable[bytes]) -> str:
+    return base64.urlsafe_b64encode(b"".join(digests)).rstrip(b"=").decode("ascii")
+
+
+def stored_fingerprint(fields: dict, fingerprint_field: str = FINGERPRINT_FIELD) -> str:
+    """Return the whole-content fingerprint a sync stored on a live note."""
+    return _field_text(fields.get(fingerprint_field)).partition(FIELD_VECTOR_SEPARATOR)[0]
+
+
+def _stored_digests(fields: dict, field_count: int, fingerprint_field: str) -> list[bytes] | None:
+    vector = _field_text(fields.get(fingerprint_field)).partition(FIELD_VECTOR_SEPARATOR)[2]
+    if not vector:
+        return None
+    try:
+        digests = base64.urlsafe_b64decode(vector + "=" * (-len(vector) % 4))
+    except (binascii.Error, ValueError):
+        return None
+    if len(digests) != field_count * FIELD_DIGEST_SIZE:
+        return None
+    return [digests[start : start + FIELD_DIGEST_SIZE] for start in range(0, len(digests), FIELD_DIGEST_SIZE)]
+
+
+def edited_fields(live_fields: dict, field_names, fingerprint_field: str = FINGERPRINT_FIELD) -> list[str] | None:
+    """Return the fields changed since the last sync, or None without a field vector."""
+    order = _field_order(tuple(field_names))
+    stored = _stored_digests(live_fields, len(order), fingerprint_field)
+    if stored is None:
+        return None
+    return [
+        name
+        for (name, prefix), digest in zip(order, stored)
+        if _field_digest(prefix, live_fields.get(name)) != digest
+    ]
 
 
 def source_fields_with_fingerprint(
-    source_fields: dict, field_names, fingerprint_field: str = FINGERPRINT_FIELD
+    source_fields: dict, field_names, fingerprint_field: str = FINGERPRINT_FIELD, fingerprint: str = ""
 ) -> dict:
-    """Copy source fields and record the content version written by the sync."""
+    """Copy source fields and record the content version written by the sync.
+
+    ``fingerprint`` skips rehashing when the caller already has the source
+    fingerprint, e.g. from ``fingerprint_many``.
+    """
     fields = dict(source_fields)
-    fields[fingerprint_field] = content_fingerprint(fields, field_names)
+    fields[fingerprint_field] = (
+        (fingerprint or content_fingerprint(fields, field_names))
+        + FIELD_VECTOR_SEPARATOR
+        + field_vector(fields, field_names)
+    )
     return fields
 
 
@@ -124,18 +247,203 @@ def load_legacy_fingerprints(path: str = str(LEGACY_FINGERPRINT_PATH)) -> dict:
     return payload["namespaces"]
 
 
+def _legacy_values(value) -> tuple[str, ...]:
+    if isinstance(value, str):
+        return (value,)
+    if isinstance(value, list):
+        return tuple(item for item in value if isinstance(item, str) and item)
+    return ()
+
+
+def legacy_index_path(path: str | Path = LEGACY_FINGERPRINT_PATH) -> Path:
+    """Return where the binary index of the JSON manifest at ``path`` lives."""
+    path = Path(path)
+    if path == LEGACY_FINGERPRINT_PATH:
+        return LEGACY_INDEX_PATH
+    return path.with_suffix(".idx")
+
+
+def build_legacy_index(path: str | Path = LEGACY_FINGERPRINT_PATH, index_path: str | Path | None = None) -> Path:
+    """Convert the JSON manifest into the binary lookup index and return its path."""
+    manifest_path = Path(path)
+    index_path = Path(index_path) if index_path is not None else legacy_index_path(manifest_path)
+    source_digest = hashlib.sha256(manifest_path.read_bytes()).digest()
+    load_legacy_fingerprints.cache_clear()
+    namespaces = load_legacy_fingerprints(str(manifest_path))
+
+    tables = []
+    for name in sorted(namespaces):
+        entries = sorted(
+            (hashlib.sha256(source_id.encode("utf-8")).digest(), sorted({bytes.fromhex(item) for item in values}))
+            for source_id, value in namespaces[name].items()
+            if (values := _legacy_values(value))
+        )
+        tables.append((name.encode("utf-8"), entries))
+
+    offset = _INDEX_HEADER.size + sum(2 + len(name) + _INDEX_NAMESPACE.size for name, _ in tables)
+    directory = bytearray()
+    body = bytearray()
+    for name, entries in tables:
+        digests = [digest for _, group in entries for digest in group]
+        entries_offset = offset + len(body)
+        position = 0
+        for key, group in entries:
+            body += _INDEX_ENTRY.pack(key, position, len(group))
+            position += len(group)
+        digests_offset = offset + len(body)
+        body += b"".join(digests)
+        directory += struct.pack("<H", len(name)) + name
+        directory += _INDEX_NAMESPACE.pack(len(entries), len(digests), entries_offset, digests_offset)
+
+    temporary = index_path.with_suffix(".tmp")
+    temporary.write_bytes(
+        _INDEX_HEADER.pack(LEGACY_INDEX_MAGIC, LEGACY_INDEX_VERSION, source_digest, len(tables)) + directory + body
+    )
+    os.replace(temporary, index_path)
+    return index_path
+
+
+class LegacyFingerprintIndex:
+    """Memory-mapped reader for ``build_legacy_index`` output."""
+
+    def __init__(self, path: str | Path):
+        with open(path, "rb") as handle:
+            self._map = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, self.source_digest, count = _INDEX_HEADER.unpack_from(self._map, 0)
+        if magic != LEGACY_INDEX_MAGIC or version != LEGACY_INDEX_VERSION:
+            self._map.close()
+            raise ValueError(f"Unsupported legacy fingerprint index: {path}")
+        self._namespaces = {}
+        offset = _INDEX_HEADER.size
+        for _ in range(count):
+            (length,) = struct.unpack_from("<H", self._map, offset)
+            name = self._map[offset + 2 : offset + 2 + length].decode("utf-8")
+            offset += 2 + length
+            entry_count, _, entries_offset, digests_offset = _INDEX_NAMESPACE.unpack_from(self._map, offset)
+            offset += _INDEX_NAMESPACE.size
+            self._namespaces[name] = (entry_count, entries_offset, digests_offset)
+
+    def close(self) -> None:
+        self._map.close()
+
+    def lookup(self, namespace: str, source_id: str) -> tuple[str, ...]:
+        table = self._namespaces.get(namespace)
+        if table is None:
+            return ()
+        entry_count, entries_offset, digests_offset = table
+        key = hashlib.sha256(source_id.encode("utf-8")).digest()
+        low, high = 0, entry_count
+        while low < high:
+            middle = (low + high) // 2
+            start = entries_offset + middle * _INDEX_ENTRY.size
+            probe = self._map[start : start + _DIGEST_SIZE]
+            if probe < key:
+                low = middle + 1
+            elif probe > key:
+                high = middle
+            else:
+                _, first, count = _INDEX_ENTRY.unpack_from(self._map, start)
+                begin = digests_offset + first * _DIGEST_SIZE
+                return tuple(
+                    self._map[position : position + _DIGEST_SIZE].hex()
+                    for position in range(begin, begin + count * _DIGEST_SIZE, _DIGEST_SIZE)
+                )
+        return ()
+
+
+def _stat_signature(path: Path):
+    try:
+        stat = path.stat()
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+def legacy_index(path: str = str(LEGACY_FINGERPRINT_PATH)) -> LegacyFingerprintIndex | None:
+    """Return the index for a JSON manifest, rebuilding it when the JSON changed.
+
+    The open index is cached until either file's size or mtime changes.
+    Without the JSON an existing index is used as is; without both, None.
+    """
+    manifest_path = Path(path)
+    signature = (_stat_signature(manifest_path), _stat_signature(legacy_index_path(manifest_path)))
+    # Concurrent scans must not rebuild the same index file at once.
+    with _legacy_index_lock:
+        return _open_legacy_index(str(manifest_path), signature)
+
+
+@lru_cache(maxsize=4)
+def _open_legacy_index(path: str, signature) -> LegacyFingerprintIndex | None:
+    manifest_path = Path(path)
+    index_path = legacy_index_path(manifest_path)
+    index = None
+    if index_path.exists():
+        try:
+            index = LegacyFingerprintIndex(index_path)
+        except (ValueError, struct.error):
+            index = None
+    if not manifest_path.exists():
+        return index
+    if index is None or index.source_digest != hashlib.sha256(manifest_path.read_bytes()).digest():
+        if index is not None:
+            index.close()
+        build_legacy_index(manifest_path, index_path)
+        index = LegacyFingerprintIndex(index_path)
+    return index
+
+
 def legacy_fingerprints(
     namespace: str,
     source_id: str,
     path: str = str(LEGACY_FINGERPRINT_PATH),
 ) -> tuple[str, ...]:
     """Return known previous generated fingerprints for one stable source ID."""
-    value = load_legacy_fingerprints(path).get(namespace, {}).get(source_id, ())
-    if isinstance(value, str):
-        return (value,)
-    if isinstance(value, list):
-        return tuple(item for item in value if isinstance(item, str) and item)
-    return ()
+    index = legacy_index(path)
+    return index.lookup(namespace, source_id) if index is not None else ()
+
+
+class FingerprintCheck(NamedTuple):
+    live: str
+    stored: str
+    source: str
+    legacy: tuple[str, ...]
+
+    @property
+    def edited(self) -> bool:
+        """Whether updating the note would overwrite a user edit (see ``note_has_untracked_edits``)."""
+        if self.stored:
+            return self.live != self.stored
+        return self.live != self.source and self.live not in self.legacy
+
+
+def fingerprint_many(
+    notes: Iterable[tuple[dict, dict, tuple]],
+    field_names,
+    fingerprint_field: str = FINGERPRINT_FIELD,
+) -> list[FingerprintCheck]:
+    """Compare a whole model's notes with their sources in one call.
+
+    ``notes`` yields ``(live_fields, source_fields, legacy)`` triples.  Legacy
+    entries are fingerprints, or field dicts fingerprinted with the same field
+    order.  The source fingerprint is always returned so the caller can write
+    it back without hashing the source again.
+    """
+    order = _field_order(tuple(field_names))
+    checks = []
+    for live_fields, source_fields, legacy in notes:
+        checks.append(
+            FingerprintCheck(
+                _fingerprint(live_fields, order),
+                stored_fingerprint(live_fields, fingerprint_field),
+                _fingerprint(source_fields, order),
+                tuple(
+                    item if isinstance(item, str) else _fingerprint(item, order)
+                    for item in legacy
+                    if item
+                ),
+            )
+        )
+    return checks
 
 
 def note_has_untracked_edits(
@@ -154,9 +462,9 @@ def note_has_untracked_edits(
     a previous generated version.  Anything else is treated as a manual edit.
     """
     live_fingerprint = content_fingerprint(live_fields, field_names)
-    stored_fingerprint = _field_text(live_fields.get(fingerprint_field))
-    if stored_fingerprint:
-        return live_fingerprint != stored_fingerprint
+    stored = stored_fingerprint(live_fields, fingerprint_field)
+    if stored:
+        return live_fingerprint != stored
     known_generated = {
         content_fingerprint(source_fields, field_names),
         *(fingerprint for fingerprint in legacy_fingerprints if fingerprint),
@@ -164,7 +472,175 @@ def note_has_untracked_edits(
     return live_fingerprint not in known_generated
 
 
+def note_edited_since_sync(
+    note: dict, source_fields: dict, field_names, namespace: str, source_id: str
+) -> bool:
+    """Return whether a live note differs from what ``namespace``'s last sync wrote to it."""
+    return note_has_untracked_edits(
+        note.get("fields", {}),
+        source_fields,
+        field_names,
+        legacy_fingerprints=legacy_fingerprints(namespace, source_id),
+    )
+
+
 def _field_text(value) -> str:
     if isinstance(value, dict):
         return value.get("value", "")
     return value or ""
+
+
+class SyncBase:
+    """SQLite sidecar of the field values last written by each sync namespace."""
+
+    def __init__(self, path: str | Path | None = None):
+        self.path = Path(path or SYNC_BASE_PATH)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(self.path, timeout=30)
+        self.db.executescript(SYNC_BASE_SCHEMA)
+
+    def __enter__(self) -> "SyncBase":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def load(self, namespace: str) -> dict[str, dict[str, str]]:
+        rows = self.db.execute("SELECT source_id, fields FROM bases WHERE namespace = ?", (namespace,))
+        return {source_id: json.loads(fields) for source_id, fields in rows}
+
+    def store(self, namespace: str, bases: dict[str, dict[str, str]]) -> None:
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO bases (namespace, source_id, fields) VALUES (?, ?, ?)",
+                [
+                    (namespace, source_id, json.dumps(fields, ensure_ascii=False, separators=(",", ":")))
+                    for source_id, fields in bases.items()
+                ],
+            )
+
+
+class FieldMerger:
+    """Three-way field merge for one sync namespace.
+
+    ``wrote`` records fields a sync wrote as-is, ``merge`` computes the safe
+    updates for a protected note, and ``save`` stores the new bases.  A field
+    missing from the sidecar is compared with its digest in the note's field
+    vector instead.  Without either, every differing field is a conflict.  A
+    conflicting field keeps its old base, or stays without one, so it is
+    reported again until it is resolved.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        field_names,
+        bases: dict[str, dict[str, str]] | None = None,
+        fingerprint_field: str = FINGERPRINT_FIELD,
+    ):
+        self.namespace = namespace
+        self.field_names = tuple(field_names)
+        self.fingerprint_field = fingerprint_field
+        self.bases = bases or {}
+        self.written: dict[str, dict[str, str]] = {}
+        self.conflicts: dict[str, list[str]] = {}
+
+    @classmethod
+    def load(
+        cls,
+        namespace: str,
+        field_names,
+        path: str | Path | None = None,
+        fingerprint_field: str = FINGERPRINT_FIELD,
+    ) -> "FieldMerger":
+        with SyncBase(path) as sync_base:
+            return cls(namespace, field_names, sync_base.load(namespace), fingerprint_field)
+
+    def save(self, path: str | Path | None = None) -> None:
+        if self.written:
+            with SyncBase(path) as sync_base:
+                sync_base.store(self.namespace, self.written)
+
+    def wrote(self, source_id: str, source_fields: dict) -> None:
+        self.written[source_id] = {name: _field_text(source_fields.get(name)) for name in self.field_names}
+        self.conflicts.pop(source_id, None)
+
+    def seed(self, source_id: str, source_fields: dict) -> None:
+        """Record a base for a note known to hold the source, unless one exists."""
+        if source_id not in self.bases:
+            self.wrote(source_id, source_fields)
+
+    def merge(self, source_id: str, live_fields: dict, source_fields: dict) -> dict[str, str]:
+        """Return the source updates that do not overwrite a live edit.
+
+        When the note carries a field vector, the updates also rewrite the
+        fingerprint field: the content fingerprint is kept and the merged
+        fields' digests are refreshed, so the merge is not later mistaken for
+        a user edit.
+        """
+        base = self.bases.get(source_id) or {}
+        order = _field_order(self.field_names)
+        digests = None
+        updates = {}
+        conflicts = []
+        new_base = {}
+        for index, (name, prefix) in enumerate(order):
+            theirs = _field_text(source_fields.get(name))
+            new_base[name] = theirs
+            ours = live_fields.get(name)
+            if raw_collapse(_field_text(ours)) == raw_collapse(theirs):
+                continue
+            previous = base.get(name)
+            if previous is not None:
+                untouched = raw_collapse(_field_text(ours)) == raw_collapse(previous)
+                source_unchanged = raw_collapse(previous) == raw_collapse(theirs)
+            else:
+                if digests is None:
+                    digests = _stored_digests(live_fields, len(order), self.fingerprint_field) or ()
+                digest = digests[index] if digests else None
+                untouched = digest is not None and _field_digest(prefix, ours) == digest
+                source_unchanged = digest is not None and _field_digest(prefix, theirs) == digest
+            if untouched:
+                updates[name] = theirs
+            elif not source_unchanged:
+                conflicts.append(name)
+                if previous is not None:
+                    new_base[name] = previous
+                else:
+                    del new_base[name]
+        if updates:
+            if digests is None:
+                digests = _stored_digests(live_fields, len(order), self.fingerprint_field) or ()
+            if digests:
+                updates[self.fingerprint_field] = stored_fingerprint(
+                    live_fields, self.fingerprint_field
+                ) + FIELD_VECTOR_SEPARATOR + _encode_vector(
+                    _field_digest(prefix, updates[name]) if name in updates else digest
+                    for (name, prefix), digest in zip(order, digests)
+                )
+        self.written[source_id] = new_base
+        if conflicts:
+            self.conflicts[source_id] = conflicts
+        else:
+            self.conflicts.pop(source_id, None)
+        return updates
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the binary legacy fingerprint index from its JSON manifest.")
+    parser.add_argument("--json", default=str(LEGACY_FINGERPRINT_PATH), help="Legacy fingerprint JSON manifest.")
+    parser.add_argument("--index", default=None, help="Output path (defaults to the manifest with an .idx suffix).")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print(f"Wrote legacy fingerprint index: {build_legacy_index(args.json, args.index)}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
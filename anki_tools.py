@@ -3,10 +3,13 @@ import json
 import urllib.request
 import urllib.error
 import subprocess
-import base64
 import argparse
+import tempfile
+from pathlib import Path
 
+import anki_connect
 import anki_protect
+import media_cache
 
 def load_env(file_path):
     env = {}
@@ -19,18 +22,7 @@ def load_env(file_path):
     return env
 
 def invoke(action, **params):
-    request_payload = json.dumps({'action': action, 'params': params, 'version': 6}).encode('utf-8')
-    try:
-        response = urllib.request.urlopen(
-            urllib.request.Request('http://localhost:8765', request_payload),
-            timeout=60,
-        )
-        response_data = json.loads(response.read().decode('utf-8'))
-        if response_data.get('error'):
-            raise RuntimeError(response_data['error'])
-        return response_data['result']
-    except (OSError, json.JSONDecodeError) as error:
-        raise RuntimeError(f"AnkiConnect request failed: {error}") from error
+    return anki_connect.invoke(action, **params)
 
 def get_word_data(word):
     """Fetches definition, example, and IPA with root fallback."""
@@ -99,21 +91,21 @@ def get_image_url(word):
         return None
     return None
 
-def generate_audio_base64(text, filename_core):
+def generate_audio_file(text, output_mp3):
+    """Render text to an MP3 with macOS `say` and ffmpeg; return its path."""
     if not text: return None
-    temp_aiff, output_mp3 = f"{filename_core}.aiff", f"{filename_core}.mp3"
+    output_mp3 = Path(output_mp3)
+    temp_aiff = output_mp3.with_suffix(".aiff")
     try:
-        subprocess.run(["say", "-o", temp_aiff, text], check=True)
-        subprocess.run(["ffmpeg", "-y", "-i", temp_aiff, "-codec:a", "libmp3lame", "-qscale:a", "2", output_mp3], 
+        output_mp3.parent.mkdir(parents=True, exist_ok=True)
+        subprocess.run(["say", "-o", str(temp_aiff), text], check=True)
+        subprocess.run(["ffmpeg", "-y", "-i", str(temp_aiff), "-codec:a", "libmp3lame", "-qscale:a", "2", str(output_mp3)], 
                        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
-        with open(output_mp3, "rb") as f:
-            data = base64.b64encode(f.read()).decode('utf-8')
-        return data
+        return output_mp3
     except (OSError, subprocess.CalledProcessError):
         return None
     finally:
-        if os.path.exists(temp_aiff): os.remove(temp_aiff)
-        if os.path.exists(output_mp3): os.remove(output_mp3)
+        if temp_aiff.exists(): temp_aiff.unlink()
 
 def find_note_id(word):
     query = f"\"Word:{word}\""
@@ -186,25 +178,28 @@ def main():
 
     audio_requests = []
     if not is_update:
-        audio_requests.append(("word", word, "tw"))
+        audio_requests.append(("word", word))
     if not is_update or meaning != current_fields.get("Meaning", ""):
-        audio_requests.append(("meaning", meaning, "tm"))
+        audio_requests.append(("meaning", meaning))
     if not is_update or example != current_fields.get("Example", ""):
         spoken_example = example.replace("<b>", "").replace("</b>", "")
-        audio_requests.append(("example", spoken_example, "te"))
+        audio_requests.append(("example", spoken_example))
 
     media_map = {}
     failed_audio = set()
+    uploader = media_cache.MediaUploader(invoke)
     if audio_requests:
         print("🔊 Generating audio for changed text...")
-    for key, text, filename_core in audio_requests:
-        aud = generate_audio_base64(text, filename_core)
-        if aud:
+    # Generated speech is uploaded and discarded; the media cache only holds downloads.
+    with tempfile.TemporaryDirectory() as audio_dir:
+        for key, text in audio_requests:
             fname = f"{args.prefix}{word}{'' if key=='word' else '_'+key}.mp3"
-            invoke("storeMediaFile", filename=fname, data=aud)
-            media_map[key] = fname
-        else:
-            failed_audio.add(key)
+            audio_path = generate_audio_file(text, Path(audio_dir) / fname)
+            if audio_path:
+                uploader.store(fname, audio_path)
+                media_map[key] = fname
+            else:
+                failed_audio.add(key)
 
     if is_update:
         if "meaning" in failed_audio:
@@ -0,0 +1,81 @@
+"""Build-once card catalogue for the Core and Mastery generators.
+
+``get_cards`` and ``get_level_summary`` used to rebuild every card, including
+the Tatoeba selection loads, on each call.  A ``CardCatalog`` builds the cards
+once per set of build options and indexes them by level and card type.  An
+entry is reused while every input file keeps its size and modification time.
+``invalidate`` drops all entries, for tests that patch the builders.
+"""
+
+from __future__ import annotations
+
+import os
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Callable, Iterable
+
+
+class _CatalogEntry:
+    __slots__ = ("signature", "by_selector", "level_counts")
+
+    def __init__(self, cards: list[dict], signature: tuple, level_field: str, type_field: str):
+        self.signature = signature
+        by_selector = defaultdict(list)
+        for card in cards:
+            level = card[level_field]
+            card_type = card[type_field]
+            by_selector[(None, None)].append(card)
+            by_selector[(level, None)].append(card)
+            by_selector[(None, card_type)].append(card)
+            by_selector[(level, card_type)].append(card)
+        self.by_selector = dict(by_selector)
+        self.level_counts = Counter(card[level_field] for card in cards)
+
+
+class CardCatalog:
+    """Memoized ``build(**options)`` results, keyed by options and input-file stats."""
+
+    def __init__(
+        self,
+        build: Callable[..., list[dict]],
+        inputs: Callable[[], Iterable[str | Path]],
+        level_field: str = "Level",
+        type_field: str = "CardType",
+    ):
+        self._build = build
+        self._inputs = inputs
+        self._level_field = level_field
+        self._type_field = type_field
+        self._entries: dict[tuple, _CatalogEntry] = {}
+
+    def _signature(self) -> tuple:
+        signature = []
+        for path in self._inputs():
+            try:
+                stat = os.stat(path)
+            except OSError:
+                signature.append((str(path), None, None))
+            else:
+                signature.append((str(path), stat.st_size, stat.st_mtime_ns))
+        return tuple(signature)
+
+    def _entry(self, options: dict) -> _CatalogEntry:
+        key = tuple(sorted(options.items()))
+        entry = self._entries.get(key)
+        if entry is None or entry.signature != self._signature():
+            cards = self._build(**options)
+            # Stat after building: loading a stale selection rewrites its file.
+            entry = _CatalogEntry(cards, self._signature(), self._level_field, self._type_field)
+            self._entries[key] = entry
+        return entry
+
+    def cards(self, level: str | None = None, card_type: str | None = None, **options) -> list[dict]:
+        """Return copies of the matching cards in build order."""
+        selected = self._entry(options).by_selector.get((level, card_type), ())
+        return [dict(card) for card in selected]
+
+    def level_counts(self, **options) -> Counter:
+        return Counter(self._entry(options).level_counts)
+
+    def invalidate(self) -> None:
+        self._entries.clear()
@@ -0,0 +1,103 @@
+"""One-pass card validation shared by the deck generators.
+
+Each generator describes its checks as named rules.  ``check_cards`` walks the
+cards once, runs every rule on each card, finds repeated keys with counters,
+and returns structured ``CardError`` records together with the time spent in
+each rule.
+"""
+
+from __future__ import annotations
+
+import time
+from collections import Counter
+from typing import Callable, Iterable, NamedTuple
+
+
+class CardError(NamedTuple):
+    source_id: str
+    rule: str
+    field: str
+    message: str
+
+
+class Rule:
+    """A per-card check; ``check(card)`` returns ``(field, message)`` pairs for its problems."""
+
+    __slots__ = ("name", "check")
+
+    def __init__(self, name: str, check: Callable[[dict], Iterable[tuple[str, str]]]):
+        self.name = name
+        self.check = check
+
+    def start(self) -> Callable[[dict], Iterable[tuple[str, str]]]:
+        """Return the check to use for one validation pass."""
+        return self.check
+
+
+class UniqueRule(Rule):
+    """Flag every card whose ``key(card)`` repeats the key of an earlier card."""
+
+    __slots__ = ("field", "key", "message")
+
+    def __init__(self, name: str, field: str, key: Callable[[dict], object], message: Callable[[dict], str]):
+        super().__init__(name, None)
+        self.field = field
+        self.key = key
+        self.message = message
+
+    def start(self) -> Callable[[dict], Iterable[tuple[str, str]]]:
+        counts = Counter()
+
+        def check(card):
+            key = self.key(card)
+            counts[key] += 1
+            return ((self.field, self.message(card)),) if counts[key] > 1 else ()
+
+        return check
+
+
+def required_fields(fields: Iterable[str], source_field: str = "SourceID") -> Rule:
+    """Rule reporting ``<source id>: blank <field>`` for each empty field."""
+    fields = tuple(fields)
+    return Rule(
+        "blank field",
+        lambda card: [(field, f"{card[source_field]}: blank {field}") for field in fields if not card[field]],
+    )
+
+
+class ValidationReport:
+    __slots__ = ("errors", "timings")
+
+    def __init__(self, errors: list[CardError], timings: dict[str, float]):
+        self.errors = errors
+        self.timings = timings
+
+    @property
+    def messages(self) -> list[str]:
+        return [error.message for error in self.errors]
+
+    def summary(self) -> str:
+        """One line with the error count, total rule time, and the slowest rule."""
+        total = sum(self.timings.values())
+        line = f"validation: {len(self.errors)} error(s), {total * 1000:.1f} ms"
+        if self.timings:
+            name, seconds = max(self.timings.items(), key=lambda item: item[1])
+            line += f" (slowest rule: {name}, {seconds * 1000:.1f} ms)"
+        return line
+
+
+def check_cards(cards: Iterable[dict], rules: Iterable[Rule], source_field: str = "SourceID") -> ValidationReport:
+    """Run every rule on every card in a single pass, keeping errors in card order."""
+    rules = list(rules)
+    checks = [(rule.name, rule.start()) for rule in rules]
+    timings = dict.fromkeys((rule.name for rule in rules), 0.0)
+    errors = []
+    clock = time.perf_counter
+    for card in cards:
+        source_id = card.get(source_field, "")
+        for name, check in checks:
+            started = clock()
+            for field, message in check(card):
+                errors.append(CardError(source_id, name, field, message))
+            timings[name] += clock() - started
+    return ValidationReport(errors, timings)
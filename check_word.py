@@ -1,16 +1,13 @@
 import sys
 import os
-import json
-import urllib.request
+
+import anki_connect
 
 def invoke(action, **params):
     """Talks to AnkiConnect."""
-    request_payload = json.dumps({'action': action, 'params': params, 'version': 6}).encode('utf-8')
     try:
-        response = urllib.request.urlopen(urllib.request.Request('http://localhost:8765', request_payload), timeout=2)
-        response_data = json.loads(response.read().decode('utf-8'))
-        return response_data.get('result')
-    except:
+        return anki_connect.default_client().request(action, params, timeout=2)
+    except anki_connect.AnkiConnectError:
         return None
 
 def load_file_vocabulary(file_path):
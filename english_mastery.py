@@ -1,19 +1,23 @@
 import argparse
-import bz2
 import csv
 import html
 import io
 import re
-import tarfile
 from pathlib import Path
 
+import card_catalog
+import card_validation
 import english_phrases
 import grammar_levels
+import tatoeba_store
 
 
 OUTPUT_DIR = Path("generated/english_mastery")
 TATOEBA_DIR = Path("generated/sources/tatoeba")
 TATOEBA_SELECTED_PATH = TATOEBA_DIR / "selected_eng_audio_sentences.tsv"
+TATOEBA_CHUNKS_PER_JOB = 8
+# Bump when the sentence validators change so marked selection caches are re-checked.
+TATOEBA_SELECTION_VERSION = "1"
 
 MODEL_NAME = "English Mastery"
 TATOEBA_LICENSE = "Tatoeba sentence text/audio metadata from public export."
@@ -240,6 +244,11 @@ SENTENCE_MINING_TARGETS = [
 ]
 
 SENTENCE_MINING_PER_TARGET = 3
+AUDIO_CLOZE_PER_TARGET = 3
+AUDIO_CLOZE_QUOTA = 120
+DICTATION_QUOTA = 60
+AUDIO_SELECTION_FIELDS = ["eng_id", "text", "target", "audio_id", "kind"]
+MINING_SELECTION_FIELDS = ["eng_id", "text", "target", "level", "audio_id", "has_audio"]
 
 TARGET_CUES = {
     "have been": "present-perfect auxiliary with I/you/plural subjects",
@@ -994,83 +1003,13 @@ def _is_clean_english_sentence(sentence):
     return 5 <= _word_count(sentence) <= 13
 
 
-def _load_audio_metadata():
-    path = TATOEBA_DIR / "sentences_with_audio.tar.bz2"
-    rows = {}
-    if not path.exists():
-        return rows
-    with tarfile.open(path, "r:bz2") as archive:
-        handle = archive.extractfile("sentences_with_audio.csv")
-        if handle is None:
-            return rows
-        reader = csv.reader(io.TextIOWrapper(handle, encoding="utf-8", newline=""), delimiter="\t")
-        for row in reader:
-            if len(row) >= 2:
-                rows[row[0]] = row[1]
-    return rows
-
-
-def _load_english_audio_sentences():
-    if TATOEBA_SELECTED_PATH.exists():
-        with TATOEBA_SELECTED_PATH.open(encoding="utf-8", newline="") as handle:
-            return [
-                row
-                for row in csv.DictReader(handle, delimiter="\t")
-                if row["eng_id"] not in INACCESSIBLE_AUDIO_SENTENCE_IDS
-                and row["eng_id"] not in REJECT_AUDIO_SENTENCE_IDS
-            ]
-    sentence_path = TATOEBA_DIR / "eng_sentences.tsv.bz2"
-    audio = _load_audio_metadata()
-    selected = []
-    used = set()
-    target_counts = {target: 0 for target, _ in LISTENING_TARGETS}
-    target_patterns = [(target, re.compile(pattern, re.IGNORECASE)) for target, pattern in LISTENING_TARGETS]
-    with bz2.open(sentence_path, "rt", encoding="utf-8", newline="") as handle:
-        for row in csv.reader(handle, delimiter="\t"):
-            if len(row) < 3:
-                continue
-            sent_id, lang, text = row[0], row[1], row[2]
-            if (
-                lang != "eng"
-                or sent_id not in audio
-                or sent_id in INACCESSIBLE_AUDIO_SENTENCE_IDS
-                or sent_id in REJECT_AUDIO_SENTENCE_IDS
-                or not _is_clean_english_sentence(text)
-            ):
-                continue
-            for target, pattern in target_patterns:
-                if target_counts[target] >= 3 or sent_id in used:
-                    continue
-                if pattern.search(text):
-                    selected.append({"eng_id": sent_id, "text": text, "target": target, "audio_id": audio[sent_id], "kind": "audio_cloze"})
-                    target_counts[target] += 1
-                    used.add(sent_id)
-                    break
-            if len([row for row in selected if row["kind"] == "audio_cloze"]) >= 120:
-                break
-    with bz2.open(sentence_path, "rt", encoding="utf-8", newline="") as handle:
-        for row in csv.reader(handle, delimiter="\t"):
-            if len(row) < 3:
-                continue
-            sent_id, lang, text = row[0], row[1], row[2]
-            if len([row for row in selected if row["kind"] == "dictation"]) >= 60:
-                break
-            if (
-                lang == "eng"
-                and sent_id in audio
-                and sent_id not in used
-                and sent_id not in INACCESSIBLE_AUDIO_SENTENCE_IDS
-                and sent_id not in REJECT_AUDIO_SENTENCE_IDS
-                and _is_clean_english_sentence(text)
-            ):
-                selected.append({"eng_id": sent_id, "text": text, "target": text, "audio_id": audio[sent_id], "kind": "dictation"})
-                used.add(sent_id)
-    TATOEBA_SELECTED_PATH.parent.mkdir(parents=True, exist_ok=True)
-    with TATOEBA_SELECTED_PATH.open("w", encoding="utf-8", newline="") as handle:
-        writer = csv.DictWriter(handle, delimiter="\t", lineterminator="\n", fieldnames=["eng_id", "text", "target", "audio_id", "kind"])
-        writer.writeheader()
-        writer.writerows(selected)
-    return selected
+def _english_tatoeba_rows():
+    """Yield ``(eng_id, text, audio_id or None)`` for English sentences in dump order."""
+    corpus = tatoeba_store.open_corpus(TATOEBA_DIR)
+    if corpus is None:
+        raise FileNotFoundError(TATOEBA_DIR / "eng_sentences.tsv.bz2")
+    with corpus:
+        yield from corpus.sentences("eng")
 
 
 def _audio_url(eng_id):
@@ -1117,63 +1056,291 @@ def _valid_sentence_mining_row(row):
     return True
 
 
-def _load_sentence_mining_sentences():
-    """Mine Tatoeba English sentences for grammar pattern cloze cards."""
-    cache_path = TATOEBA_DIR / "selected_eng_mining_sentences.tsv"
-    reserved_audio_ids = {row["eng_id"] for row in _load_english_audio_sentences()}
-    if cache_path.exists():
-        with cache_path.open(encoding="utf-8", newline="") as handle:
-            rows = list(csv.DictReader(handle, delimiter="\t"))
-        rows = [row for row in rows if _valid_sentence_mining_row(row)]
-        if not any(row["eng_id"] in reserved_audio_ids for row in rows):
-            return rows
-    sentence_path = TATOEBA_DIR / "eng_sentences.tsv.bz2"
-    audio = _load_audio_metadata()
-    selected = []
-    used = set(reserved_audio_ids)
-    used_texts = set()
-    target_counts = {(level, target): 0 for level, target, _ in SENTENCE_MINING_TARGETS}
-    target_patterns = [(level, target, re.compile(pattern, re.IGNORECASE)) for level, target, pattern in SENTENCE_MINING_TARGETS]
-    with bz2.open(sentence_path, "rt", encoding="utf-8", newline="") as handle:
-        for row in csv.reader(handle, delimiter="\t"):
-            if len(row) < 3:
+def _audio_sentence_usable(sent_id, text, audio_id):
+    return (
+        audio_id is not None
+        and sent_id not in INACCESSIBLE_AUDIO_SENTENCE_IDS
+        and sent_id not in REJECT_AUDIO_SENTENCE_IDS
+        and _is_clean_english_sentence(text)
+    )
+
+
+class _EnglishSentence:
+    """One English Tatoeba sentence offered to the selectors.
+
+    Parallel workers precompute ``listening_hits`` and ``mining_hits``; the
+    serial scan leaves them None and tests each still-open target lazily.
+    """
+
+    __slots__ = ("sent_id", "text", "audio_id", "audio_usable", "listening_hits", "mining_hits")
+
+    def __init__(self, sent_id, text, audio_id, listening_hits=None, mining_hits=None):
+        self.sent_id = sent_id
+        self.text = text
+        self.audio_id = audio_id
+        self.audio_usable = _audio_sentence_usable(sent_id, text, audio_id)
+        self.listening_hits = listening_hits
+        self.mining_hits = mining_hits
+
+    def matches_listening(self, target, pattern):
+        if self.listening_hits is not None:
+            return target in self.listening_hits
+        return bool(pattern.search(self.text))
+
+    def mines(self, level, target, pattern):
+        if self.mining_hits is not None:
+            return (level, target) in self.mining_hits
+        return bool(pattern.search(self.text)) and _valid_sentence_mining_row(
+            {"eng_id": self.sent_id, "text": self.text, "target": target, "level": level}
+        )
+
+
+def _listening_patterns():
+    return [(target, re.compile(pattern, re.IGNORECASE)) for target, pattern in LISTENING_TARGETS]
+
+
+def _mining_patterns():
+    return [(level, target, re.compile(pattern, re.IGNORECASE)) for level, target, pattern in SENTENCE_MINING_TARGETS]
+
+
+class _AudioClozeSelector:
+    """Pick audio sentences per listening target until the quota is full."""
+
+    def __init__(self):
+        self.rows = []
+        self.used = set()
+        self.target_counts = {target: 0 for target, _ in LISTENING_TARGETS}
+        self.open_targets = len(self.target_counts)
+        self.patterns = _listening_patterns()
+
+    @property
+    def done(self):
+        return len(self.rows) >= AUDIO_CLOZE_QUOTA or not self.open_targets
+
+    def offer(self, sentence):
+        if sentence.sent_id in self.used or not sentence.audio_usable:
+            return
+        for target, pattern in self.patterns:
+            if self.target_counts[target] >= AUDIO_CLOZE_PER_TARGET:
                 continue
-            sent_id, lang, text = row[0], row[1], row[2]
-            normalized_text = re.sub(r"\s+", " ", text).strip().casefold()
-            if (
-                lang != "eng"
-                or not _is_clean_english_sentence(text)
-                or sent_id in used
-                or normalized_text in used_texts
-            ):
+            if sentence.matches_listening(target, pattern):
+                self.rows.append({"eng_id": sentence.sent_id, "text": sentence.text, "target": target, "audio_id": sentence.audio_id, "kind": "audio_cloze"})
+                self.target_counts[target] += 1
+                if self.target_counts[target] == AUDIO_CLOZE_PER_TARGET:
+                    self.open_targets -= 1
+                self.used.add(sentence.sent_id)
+                return
+
+
+class _DictationSelector:
+    """Pick usable audio sentences that the audio cloze selector did not take."""
+
+    def __init__(self, audio_cloze):
+        self.audio_cloze = audio_cloze
+        self.rows = []
+        self.used = set()
+
+    @property
+    def done(self):
+        return len(self.rows) >= DICTATION_QUOTA
+
+    def offer(self, sentence):
+        if sentence.sent_id in self.used or sentence.sent_id in self.audio_cloze.used:
+            return
+        if sentence.audio_usable:
+            self.rows.append({"eng_id": sentence.sent_id, "text": sentence.text, "target": sentence.text, "audio_id": sentence.audio_id, "kind": "dictation"})
+            self.used.add(sentence.sent_id)
+
+
+class _SentenceMiningSelector:
+    """Pick grammar-pattern sentences outside the reserved audio sentence IDs."""
+
+    def __init__(self, reserved):
+        self.reserved = reserved
+        self.rows = []
+        self.used = set()
+        self.used_texts = set()
+        self.target_counts = {(level, target): 0 for level, target, _ in SENTENCE_MINING_TARGETS}
+        self.open_targets = len(self.target_counts)
+        self.patterns = _mining_patterns()
+
+    @property
+    def done(self):
+        return not self.open_targets
+
+    def offer(self, sentence):
+        sent_id, text, audio_id = sentence.sent_id, sentence.text, sentence.audio_id
+        if sent_id in self.used or any(sent_id in ids for ids in self.reserved):
+            return
+        if not _is_clean_english_sentence(text):
+            return
+        normalized_text = re.sub(r"\s+", " ", text).strip().casefold()
+        if normalized_text in self.used_texts:
+            return
+        for level, target, pattern in self.patterns:
+            key = (level, target)
+            if self.target_counts[key] >= SENTENCE_MINING_PER_TARGET:
+                continue
+            if sentence.mines(level, target, pattern):
+                self.rows.append(
+                    {
+                        "eng_id": sent_id,
+                        "text": text,
+                        "target": target,
+                        "level": level,
+                        "audio_id": audio_id or "",
+                        "has_audio": audio_id is not None and sent_id not in INACCESSIBLE_AUDIO_SENTENCE_IDS,
+                    }
+                )
+                self.target_counts[key] += 1
+                if self.target_counts[key] == SENTENCE_MINING_PER_TARGET:
+                    self.open_targets -= 1
+                self.used.add(sent_id)
+                self.used_texts.add(normalized_text)
+                return
+
+
+def _english_sentences_in_range(store_path, start, stop):
+    """Worker for ``--jobs``: English sentences in a seq range with hits precomputed.
+
+    Sentences that no selector could take, with neither usable audio nor a
+    valid mining target, are dropped before they are sent back.
+    """
+    listening = _listening_patterns()
+    mining = _mining_patterns()
+    found = []
+    with tatoeba_store.TatoebaStore(store_path) as corpus:
+        for sent_id, text, audio_id in corpus.sentences("eng", start, stop):
+            sentence = _EnglishSentence(sent_id, text, audio_id)
+            mining_hits = frozenset(
+                (level, target)
+                for level, target, pattern in mining
+                if _is_clean_english_sentence(text) and sentence.mines(level, target, pattern)
+            )
+            if not sentence.audio_usable and not mining_hits:
                 continue
-            for level, target, pattern in target_patterns:
-                key = (level, target)
-                if target_counts[key] >= SENTENCE_MINING_PER_TARGET:
-                    continue
-                candidate = {
-                    "eng_id": sent_id,
-                    "text": text,
-                    "target": target,
-                    "level": level,
-                    "audio_id": audio.get(sent_id, ""),
-                    "has_audio": sent_id in audio and sent_id not in INACCESSIBLE_AUDIO_SENTENCE_IDS,
-                }
-                if pattern.search(text) and _valid_sentence_mining_row(candidate):
-                    has_audio = sent_id in audio and sent_id not in INACCESSIBLE_AUDIO_SENTENCE_IDS
-                    candidate["has_audio"] = has_audio
-                    selected.append(candidate)
-                    target_counts[key] += 1
-                    used.add(sent_id)
-                    used_texts.add(normalized_text)
-                    break
-    cache_path.parent.mkdir(parents=True, exist_ok=True)
-    with cache_path.open("w", encoding="utf-8", newline="") as handle:
-        writer = csv.DictWriter(handle, delimiter="\t", lineterminator="\n",
-                                fieldnames=["eng_id", "text", "target", "level", "audio_id", "has_audio"])
+            sentence.listening_hits = frozenset(
+                target for target, pattern in listening if sentence.audio_usable and pattern.search(text)
+            )
+            sentence.mining_hits = mining_hits
+            found.append(sentence)
+    return found
+
+
+def _english_sentences(jobs=1):
+    """Yield English sentences in dump order, precomputed by ``jobs`` workers when > 1."""
+    if jobs <= 1:
+        for row in _english_tatoeba_rows():
+            yield _EnglishSentence(*row)
+        return
+    corpus = tatoeba_store.open_corpus(TATOEBA_DIR)
+    if corpus is None:
+        raise FileNotFoundError(TATOEBA_DIR / "eng_sentences.tsv.bz2")
+    with corpus:
+        first, stop = corpus.seq_range("sentences", "eng")
+    chunks = tatoeba_store.seq_chunks(first, stop, jobs * TATOEBA_CHUNKS_PER_JOB)
+    for found in tatoeba_store.map_ordered(
+        _english_sentences_in_range,
+        [(corpus.path, start, end) for start, end in chunks],
+        jobs,
+    ):
+        yield from found
+
+
+def _scan_english_tatoeba(selectors, jobs=1):
+    """Feed every selector, in order, from one pass that stops once all are full."""
+    active = [selector for selector in selectors if not selector.done]
+    if not active:
+        return
+    for sentence in _english_sentences(jobs):
+        for selector in active:
+            selector.offer(sentence)
+        if any(selector.done for selector in active):
+            active = [selector for selector in active if not selector.done]
+            if not active:
+                break
+
+
+def _write_selection(path, fieldnames, rows):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("w", encoding="utf-8", newline="") as handle:
+        writer = csv.DictWriter(handle, delimiter="\t", lineterminator="\n", fieldnames=fieldnames)
         writer.writeheader()
-        writer.writerows(selected)
-    return selected
+        writer.writerows(rows)
+
+
+def _mining_selection_path():
+    return TATOEBA_DIR / "selected_eng_mining_sentences.tsv"
+
+
+def _read_selection(path, key, valid):
+    """Return a cached selection's rows that pass ``valid``, or None when it is missing.
+
+    A file whose every row passed is marked validated under ``key``; later
+    reads of the unchanged file skip ``valid``.
+    """
+    if not path.exists():
+        return None
+    selection = tatoeba_store.SelectionFile(path)
+    if selection.validated(key):
+        return selection.rows
+    rows = [row for row in selection.rows if valid(row)]
+    if len(rows) == len(selection.rows):
+        selection.mark_validated(key)
+    return rows
+
+
+def _english_tatoeba_selections(jobs=1):
+    """Return ``(audio rows, sentence-mining rows)`` from their caches or one mining pass.
+
+    Audio cloze, dictation and sentence mining share a single scan of the
+    English dump when their caches are missing.  A cached mining selection is
+    kept unless it reuses a sentence now reserved for audio cards.
+    """
+    mining_path = _mining_selection_path()
+    mining_rows = _read_selection(
+        mining_path,
+        tatoeba_store.validation_key(
+            TATOEBA_SELECTION_VERSION, sorted(REJECT_SENTENCE_MINING_IDS), SENTENCE_MINING_TARGETS
+        ),
+        _valid_sentence_mining_row,
+    )
+    audio_rows = _read_selection(
+        TATOEBA_SELECTED_PATH,
+        tatoeba_store.validation_key(
+            TATOEBA_SELECTION_VERSION, sorted(INACCESSIBLE_AUDIO_SENTENCE_IDS), sorted(REJECT_AUDIO_SENTENCE_IDS)
+        ),
+        lambda row: row["eng_id"] not in INACCESSIBLE_AUDIO_SENTENCE_IDS
+        and row["eng_id"] not in REJECT_AUDIO_SENTENCE_IDS,
+    )
+    mining = None
+    if audio_rows is None:
+        audio_cloze = _AudioClozeSelector()
+        dictation = _DictationSelector(audio_cloze)
+        selectors = [audio_cloze, dictation]
+        if mining_rows is None:
+            mining = _SentenceMiningSelector((audio_cloze.used, dictation.used))
+            selectors.append(mining)
+        _scan_english_tatoeba(selectors, jobs)
+        audio_rows = audio_cloze.rows + dictation.rows
+        _write_selection(TATOEBA_SELECTED_PATH, AUDIO_SELECTION_FIELDS, audio_rows)
+    reserved = {row["eng_id"] for row in audio_rows}
+    if mining is None and (mining_rows is None or any(row["eng_id"] in reserved for row in mining_rows)):
+        mining = _SentenceMiningSelector((reserved,))
+        _scan_english_tatoeba([mining], jobs)
+    if mining is not None:
+        _write_selection(mining_path, MINING_SELECTION_FIELDS, mining.rows)
+        mining_rows = mining.rows
+    return audio_rows, mining_rows
+
+
+def _load_english_audio_sentences():
+    return _english_tatoeba_selections()[0]
+
+
+def _load_sentence_mining_sentences():
+    """Mine Tatoeba English sentences for grammar pattern cloze cards."""
+    return _english_tatoeba_selections()[1]
 
 
 def _sentence_mining_cards():
@@ -1777,35 +1944,80 @@ def build_cards(include_listening=True, include_mining=True):
     return cards
 
 
+_CARD_CATALOG = card_catalog.CardCatalog(
+    build_cards,
+    lambda: [english_phrases.SOURCE_PATH, TATOEBA_SELECTED_PATH, _mining_selection_path()],
+)
+
+
+def clear_card_cache():
+    """Forget built cards, e.g. after patching a card builder in tests."""
+    _CARD_CATALOG.invalidate()
+
+
 def get_cards(level=None, card_type=None):
-    cards = build_cards()
-    if level is not None:
-        cards = [card for card in cards if card["Level"] == level]
-    if card_type is not None:
-        cards = [card for card in cards if card["CardType"] == card_type]
-    return cards
+    return _CARD_CATALOG.cards(level, card_type)
+
+
+def _card_problem(field, message, failed):
+    """Wrap a predicate as a rule check reporting ``<SourceID>: <message>``."""
+    return lambda card: [(field, f"{card['SourceID']}: {message}")] if failed(card) else ()
+
+
+CARD_RULES = [
+    card_validation.UniqueRule(
+        "duplicate SourceID",
+        "SourceID",
+        key=lambda card: card["SourceID"],
+        message=lambda card: f"{card['SourceID']}: duplicate SourceID",
+    ),
+    card_validation.required_fields(
+        ("SourceID", "DeckPath", "Level", "Topic", "CardType", "PromptMode", "Front", "Answer", "Back")
+    ),
+    card_validation.Rule(
+        "TypeAnswer mismatch",
+        _card_problem(
+            "TypeAnswer",
+            "TypeAnswer mismatch",
+            lambda card: card["PromptMode"].startswith("type_") and card["TypeAnswer"] != card["Answer"],
+        ),
+    ),
+    card_validation.Rule(
+        "multiple-choice marker",
+        _card_problem(
+            "Front",
+            "multiple-choice marker",
+            lambda card: card["CardType"] in {"phrase_cloze", "typed_contrast", "audio_cloze"}
+            and ("A)" in card["Front"] or "B)" in card["Front"]),
+        ),
+    ),
+    card_validation.Rule(
+        "phrase answer leak",
+        _card_problem(
+            "Front",
+            "phrase answer leaks on front",
+            lambda card: card["CardType"] == "phrase_cloze"
+            and card["Answer"].lower() in card["Front"].lower().replace("_____", ""),
+        ),
+    ),
+    card_validation.Rule(
+        "phrase example fragments",
+        _card_problem(
+            "Examples",
+            "too many phrase example fragments",
+            lambda card: card["Topic"] == "natural phrases" and card["Examples"].count("<br>") > 2,
+        ),
+    ),
+]
+
+
+def check_cards(cards):
+    """Return a ``card_validation.ValidationReport`` for ``CARD_RULES``."""
+    return card_validation.check_cards(cards, CARD_RULES)
 
 
 def validate_cards(cards):
-    errors = []
-    source_ids = [card["SourceID"] for card in cards]
-    if len(source_ids) != len(set(source_ids)):
-        errors.append("duplicate SourceID")
-    for card in cards:
-        for field in ("SourceID", "DeckPath", "Level", "Topic", "CardType", "PromptMode", "Front", "Answer", "Back"):
-            if not card[field]:
-                errors.append(f"{card['SourceID']}: blank {field}")
-        if card["PromptMode"].startswith("type_") and card["TypeAnswer"] != card["Answer"]:
-            errors.append(f"{card['SourceID']}: TypeAnswer mismatch")
-        if card["CardType"] in {"phrase_cloze", "typed_contrast", "audio_cloze"} and (
-            "A)" in card["Front"] or "B)" in card["Front"]
-        ):
-            errors.append(f"{card['SourceID']}: multiple-choice marker")
-        if card["CardType"] == "phrase_cloze" and card["Answer"].lower() in card["Front"].lower().replace("_____", ""):
-            errors.append(f"{card['SourceID']}: phrase answer leaks on front")
-        if card["Topic"] == "natural phrases" and card["Examples"].count("<br>") > 2:
-            errors.append(f"{card['SourceID']}: too many phrase example fragments")
-    return errors
+    return check_cards(cards).messages
 
 
 def render_tsv(cards):
@@ -1818,7 +2030,7 @@ def render_tsv(cards):
 
 
 def write_import_file(output_dir=OUTPUT_DIR):
-    cards = build_cards()
+    cards = get_cards()
     errors = validate_cards(cards)
     if errors:
         raise ValueError("\n".join(errors[:30]))
@@ -1833,18 +2045,29 @@ def parse_args(argv=None):
     parser = argparse.ArgumentParser(description="Generate English Mastery Anki TSV.")
     parser.add_argument("--output-dir", default=str(OUTPUT_DIR))
     parser.add_argument("--summary", action="store_true")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for re-mining the Tatoeba selections when their caches are stale.",
+    )
     return parser.parse_args(argv)
 
 
 def main(argv=None):
     args = parse_args(argv)
+    if args.jobs > 1:
+        # Refresh stale selections up front with the requested workers; card
+        # building below then reads the rewritten caches.
+        _english_tatoeba_selections(jobs=args.jobs)
     if args.summary:
         from collections import Counter
 
-        cards = build_cards()
+        cards = get_cards()
         print(f"total: {len(cards)}")
         print("by type:", dict(Counter(card["CardType"] for card in cards)))
         print("by deck:", dict(Counter(card["DeckPath"] for card in cards)))
+        print(check_cards(cards).summary())
         return 0
     print(f"Wrote import file: {write_import_file(args.output_dir)}")
     return 0
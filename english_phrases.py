@@ -5,6 +5,8 @@ import io
 import re
 from pathlib import Path
 
+import card_validation
+
 
 SOURCE_PATH = Path("generated/phrases/english_natural_phrases_reviewed.tsv")
 
@@ -103,50 +105,85 @@ def load_cards(source_path=SOURCE_PATH):
     return cards
 
 
+GENERIC_CONTEXT_PATTERNS = [
+    "sounds natural",
+    "natural moment",
+    "during sending",
+    "during starting",
+    "you can hear",
+    "the manager said",
+    "our team used",
+    "in a polished email",
+    "get off before the meeting",
+    "good morning\" used naturally when meeting someone after a long day",
+    "good night\" at the start of a conversation",
+]
+
+
+def _generic_text_problems(card):
+    problems = []
+    front = card["front"].lower()
+    if "she said" in front and "natural moment" in front:
+        problems.append(("front", f"Generic front remains: {card['phrase']}"))
+    if "common natural connector phrase" in card["meaning"].lower():
+        problems.append(("meaning", f"Generic meaning remains: {card['phrase']}"))
+    if "try using" in card["examples"].lower():
+        problems.append(("examples", f"Generic example remains: {card['phrase']}"))
+    context = (card["front"] + " " + card["examples"]).lower()
+    for pattern in GENERIC_CONTEXT_PATTERNS:
+        if pattern in context:
+            problems.append(("front", f"Generic or mismatched context remains for {card['phrase']}: {pattern}"))
+    return problems
+
+
+def _example_count(card):
+    return len([part for part in re.split(r"\s+\|\s+|;\s+", card["examples"]) if part.strip()])
+
+
+CARD_RULES = [
+    card_validation.UniqueRule(
+        "duplicate phrase",
+        "phrase",
+        key=lambda card: card["phrase"].lower(),
+        message=lambda card: f"Duplicate phrase: {card['phrase']}",
+    ),
+    card_validation.UniqueRule(
+        "duplicate front",
+        "front",
+        key=lambda card: card["front"].lower(),
+        message=lambda card: f"Duplicate front: {card['front']}",
+    ),
+    card_validation.Rule(
+        "level",
+        lambda card: (
+            [("level", f"Invalid level for {card['phrase']}: {card['level']}")]
+            if card["level"] not in {level["id"] for level in LEVELS}
+            else ()
+        ),
+    ),
+    card_validation.Rule(
+        "front contains phrase",
+        lambda card: (
+            [("front", f"Front does not contain phrase: {card['phrase']}")]
+            if not _front_contains_phrase_core(card["phrase"], card["front"])
+            else ()
+        ),
+    ),
+    card_validation.Rule("generic text", _generic_text_problems),
+    card_validation.Rule(
+        "example count",
+        lambda card: [("examples", f"Too few examples: {card['phrase']}")] if _example_count(card) < 2 else (),
+    ),
+]
+
+
+def check_cards(cards):
+    """Return a ``card_validation.ValidationReport`` for ``CARD_RULES``."""
+    return card_validation.check_cards(cards, CARD_RULES, source_field="source_id")
+
+
 def validate_cards(cards):
-    errors = []
-    seen_phrases = set()
-    seen_fronts = set()
-    valid_levels = {level["id"] for level in LEVELS}
-    for card in cards:
-        phrase_key = card["phrase"].lower()
-        front_key = card["front"].lower()
-        if phrase_key in seen_phrases:
-            errors.append(f"Duplicate phrase: {card['phrase']}")
-        if front_key in seen_fronts:
-            errors.append(f"Duplicate front: {card['front']}")
-        seen_phrases.add(phrase_key)
-        seen_fronts.add(front_key)
-        if card["level"] not in valid_levels:
-            errors.append(f"Invalid level for {card['phrase']}: {card['level']}")
-        if not _front_contains_phrase_core(card["phrase"], card["front"]):
-            errors.append(f"Front does not contain phrase: {card['phrase']}")
-        if "she said" in card["front"].lower() and "natural moment" in card["front"].lower():
-            errors.append(f"Generic front remains: {card['phrase']}")
-        if "common natural connector phrase" in card["meaning"].lower():
-            errors.append(f"Generic meaning remains: {card['phrase']}")
-        if "try using" in card["examples"].lower():
-            errors.append(f"Generic example remains: {card['phrase']}")
-        generic_patterns = [
-            "sounds natural",
-            "natural moment",
-            "during sending",
-            "during starting",
-            "you can hear",
-            "the manager said",
-            "our team used",
-            "in a polished email",
-            "get off before the meeting",
-            "good morning\" used naturally when meeting someone after a long day",
-            "good night\" at the start of a conversation",
-        ]
-        for pattern in generic_patterns:
-            if pattern in (card["front"] + " " + card["examples"]).lower():
-                errors.append(f"Generic or mismatched context remains for {card['phrase']}: {pattern}")
-        example_count = len([part for part in re.split(r"\s+\|\s+|;\s+", card["examples"]) if part.strip()])
-        if example_count < 2:
-            errors.append(f"Too few examples: {card['phrase']}")
-    return errors
+    return check_cards(cards).messages
 
 
 def _front_contains_phrase_core(phrase, front):
@@ -251,6 +288,7 @@ def main(argv=None):
         for level in LEVELS:
             print(f"{level['id']}: {counts[level['id']]} cards")
         print(f"total: {len(cards)} cards")
+        print(check_cards(cards).summary())
         return 0
     path = write_import_file(args.output_dir)
     print(f"Wrote phrase import file: {path}")
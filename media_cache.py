@@ -0,0 +1,263 @@
+"""Content-checked local cache for downloaded Tatoeba audio.
+
+Sync scripts used to run ``curl`` once per sentence and keep nothing, so a
+reset Anki media folder meant downloading every file again.  The cache stores
+each MP3 under ``generated/media/`` by its Anki filename (which carries the
+Tatoeba language and sentence ID) and records size and SHA-256 in a sidecar
+``index.json``.  Failed downloads are recorded there too and are not retried
+until ``FAILURE_RETRY_SECONDS`` have passed.  Missing files are fetched by a
+bounded thread pool, and ``MediaUploader`` hands cached files to Anki by path.
+``MediaInventory`` lists the media Anki already has once per run, so each
+file is uploaded at most once.
+"""
+
+from __future__ import annotations
+
+import base64
+import hashlib
+import http.client
+import json
+import os
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Iterable
+
+import anki_connect
+
+CACHE_DIR = Path(__file__).resolve().parent / "generated" / "media"
+INDEX_NAME = "index.json"
+DOWNLOAD_WORKERS = 8
+DOWNLOAD_TIMEOUT = 15
+DOWNLOAD_ATTEMPTS = 2
+FAILURE_RETRY_SECONDS = 24 * 60 * 60
+USER_AGENT = "Mozilla/5.0"
+MEDIA_PATTERNS = ("tatoeba_eng_*", "tatoeba_spa_*", "user_*")
+# A truncated body raises IncompleteRead, which is not an OSError.
+DOWNLOAD_ERRORS = (OSError, http.client.HTTPException)
+
+
+def download(url: str, timeout: float = DOWNLOAD_TIMEOUT) -> bytes:
+    """Return the body at ``url``, retrying once on network errors."""
+    request = urllib.request.Request(url, headers={"User-Agent": USER_AGENT})
+    for attempt in range(DOWNLOAD_ATTEMPTS):
+        try:
+            with urllib.request.urlopen(request, timeout=timeout) as response:
+                return response.read()
+        except DOWNLOAD_ERRORS:
+            if attempt == DOWNLOAD_ATTEMPTS - 1:
+                raise
+    raise OSError(f"download failed: {url}")
+
+
+class MediaCache:
+    """On-disk media files plus a checksum and failure sidecar."""
+
+    def __init__(self, root: str | Path | None = None):
+        self.root = Path(root or CACHE_DIR)
+        self.index_path = self.root / INDEX_NAME
+        self.files: dict[str, dict] = {}
+        self.failures: dict[str, dict] = {}
+        if self.index_path.exists():
+            with self.index_path.open(encoding="utf-8") as handle:
+                payload = json.load(handle)
+            self.files = payload.get("files", {})
+            self.failures = payload.get("failures", {})
+
+    def path(self, filename: str) -> Path:
+        return self.root / filename
+
+    def get(self, filename: str) -> Path | None:
+        """Return the cached file if present and matching its recorded checksum."""
+        entry = self.files.get(filename)
+        path = self.path(filename)
+        if not entry or not path.exists() or path.stat().st_size != entry.get("bytes"):
+            return None
+        if hashlib.sha256(path.read_bytes()).hexdigest() != entry.get("sha256"):
+            return None
+        return path
+
+    def recently_failed(self, filename: str) -> bool:
+        failure = self.failures.get(filename)
+        return bool(failure) and time.time() - failure.get("failed_at", 0) < FAILURE_RETRY_SECONDS
+
+    def fetch_all(
+        self, items: Iterable[tuple[str, str]], workers: int = DOWNLOAD_WORKERS
+    ) -> dict[str, Path | None]:
+        """Ensure ``(filename, url)`` pairs are cached; return filename -> path or None."""
+        results: dict[str, Path | None] = {}
+        missing: dict[str, str] = {}
+        for filename, url in items:
+            if filename in results or filename in missing:
+                continue
+            cached = self.get(filename)
+            if cached is not None:
+                results[filename] = cached
+            elif self.recently_failed(filename):
+                results[filename] = None
+            else:
+                missing[filename] = url
+        if not missing:
+            return results
+        self.root.mkdir(parents=True, exist_ok=True)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            downloads = {
+                filename: pool.submit(download, url) for filename, url in missing.items()
+            }
+            for filename, future in downloads.items():
+                try:
+                    results[filename] = self._store(filename, missing[filename], future.result())
+                except DOWNLOAD_ERRORS as error:
+                    print(f"Audio download failed for {filename}: {error}")
+                    self.failures[filename] = {
+                        "url": missing[filename],
+                        "error": str(error),
+                        "failed_at": time.time(),
+                    }
+                    results[filename] = None
+        self.save()
+        return results
+
+    def fetch(self, filename: str, url: str) -> Path | None:
+        return self.fetch_all([(filename, url)])[filename]
+
+    def fetch_rows(self, rows: Iterable[dict], skip=()) -> dict[str, Path | None]:
+        """Prefetch the audio of TSV rows, except filenames listed in ``skip``."""
+        return self.fetch_all(
+            (audio_filename(row), row["AudioURL"])
+            for row in rows
+            if row.get("AudioURL") and audio_filename(row) and audio_filename(row) not in skip
+        )
+
+    def save(self) -> None:
+        self.root.mkdir(parents=True, exist_ok=True)
+        payload = {
+            "files": dict(sorted(self.files.items())),
+            "failures": dict(sorted(self.failures.items())),
+        }
+        temporary = self.index_path.with_suffix(".tmp")
+        with temporary.open("w", encoding="utf-8") as handle:
+            json.dump(payload, handle, ensure_ascii=False, indent=1)
+        os.replace(temporary, self.index_path)
+
+    def _store(self, filename: str, url: str, data: bytes) -> Path:
+        if not data:
+            raise OSError("empty response")
+        path = self.path(filename)
+        temporary = path.with_suffix(path.suffix + ".part")
+        temporary.write_bytes(data)
+        os.replace(temporary, path)
+        self.files[filename] = {
+            "url": url,
+            "bytes": len(data),
+            "sha256": hashlib.sha256(data).hexdigest(),
+        }
+        self.failures.pop(filename, None)
+        return path
+
+
+class MediaInventory:
+    """Set of media filenames already stored in Anki.
+
+    One ``getMediaFilesNames`` listing per pattern is sent in a single
+    ``multi`` request; uploads add their filename so later rows skip it.
+    """
+
+    def __init__(self, names: Iterable[str] = ()):
+        self.names = set(names)
+
+    @classmethod
+    def load(cls, invoke: Callable, patterns: Iterable[str] = MEDIA_PATTERNS) -> "MediaInventory":
+        inventory = cls()
+        queue = anki_connect.ActionQueue(invoke)
+        for pattern in patterns:
+            queue.add(
+                "getMediaFilesNames",
+                lambda names: inventory.names.update(names or []),
+                pattern=pattern,
+            )
+        queue.flush()
+        return inventory
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self.names
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def add(self, filename: str) -> None:
+        self.names.add(filename)
+
+
+class MediaUploader:
+    """Store local files in Anki's media folder, by path when Anki can read it.
+
+    ``storeMediaFile`` accepts an absolute ``path`` on the Anki host, which
+    avoids a base64 copy that is a third larger than the file.  When Anki is
+    remote, or rejects the path, uploads fall back to base64 ``data`` for the
+    rest of the run.  With an ``inventory``, files Anki already has are
+    skipped and each file is sent at most once.
+    """
+
+    def __init__(
+        self,
+        invoke: Callable,
+        by_path: bool | None = None,
+        inventory: MediaInventory | None = None,
+    ):
+        self.invoke = invoke
+        self.by_path = anki_connect.default_client().is_local() if by_path is None else by_path
+        self.inventory = inventory
+        self.by_path_count = 0
+        self.base64_count = 0
+        self.bytes_saved = 0
+        self.skipped_existing = 0
+
+    def skip(self, filename: str) -> bool:
+        """Return True, and count it, when Anki already has ``filename``."""
+        if self.inventory is None or filename not in self.inventory:
+            return False
+        self.skipped_existing += 1
+        return True
+
+    def store(self, filename: str, path: Path) -> bool:
+        """Upload ``path`` as ``filename``; return False if Anki already had it."""
+        if self.skip(filename):
+            return False
+        path = Path(path)
+        if self.by_path:
+            try:
+                self.invoke("storeMediaFile", filename=filename, path=str(path.resolve()))
+                self.by_path_count += 1
+                self.bytes_saved += 4 * ((path.stat().st_size + 2) // 3)
+                self._stored(filename)
+                return True
+            except RuntimeError as error:
+                print(f"Path upload failed for {filename} ({error}); sending base64 instead.")
+                self.by_path = False
+        data = base64.b64encode(path.read_bytes()).decode("ascii")
+        self.invoke("storeMediaFile", filename=filename, data=data)
+        self.base64_count += 1
+        self._stored(filename)
+        return True
+
+    def summary(self) -> dict[str, int]:
+        return {
+            "uploaded_by_path": self.by_path_count,
+            "uploaded_as_base64": self.base64_count,
+            "base64_bytes_saved": self.bytes_saved,
+            "skipped_existing": self.skipped_existing,
+        }
+
+    def _stored(self, filename: str) -> None:
+        if self.inventory is not None:
+            self.inventory.add(filename)
+
+
+def audio_filename(row: dict) -> str:
+    """Return the media filename referenced by a row's ``[sound:...]`` tag."""
+    audio = row.get("Audio", "")
+    if not audio.startswith("[sound:"):
+        return ""
+    return audio.removeprefix("[sound:").removesuffix("]")
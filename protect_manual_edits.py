@@ -3,19 +3,27 @@
 The sync scripts never overwrite notes tagged ``locked`` (see anki_protect).
 Run this while Anki is open to auto-protect the cards you edited by hand.
 
+The three models are scanned concurrently.  Each scan compares notes chunk by
+chunk while the local mirror fetches the next ``notesInfo`` chunk, and
+``--json-lines`` streams every finding as soon as its chunk is compared.
+
 Usage:
-    python3 protect_manual_edits.py            # report only
-    python3 protect_manual_edits.py --apply    # also tag the edits as locked
+    python3 protect_manual_edits.py                # report only
+    python3 protect_manual_edits.py --json-lines   # stream findings as JSON lines
+    python3 protect_manual_edits.py --apply        # also tag the edits as locked
 """
 
 from __future__ import annotations
 
 import argparse
 import json
-import time
-import urllib.request
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Callable, Iterable
 
+import anki_connect
+import anki_mirror
 import anki_protect
 import sync_english_mastery_to_anki as mastery
 import sync_spanish_core_to_anki as core
@@ -24,135 +32,182 @@ import sync_4000_production_to_anki as prod
 
 MASTERY_CONTENT_FIELDS = anki_protect.content_fields(mastery.FIELDS)
 CORE_CONTENT_FIELDS = anki_protect.content_fields(core.FIELDS)
+TAG_BATCH_SIZE = 100
+
+_print_lock = threading.Lock()
 
 
 def invoke(action: str, **params):
-    payload = json.dumps({"action": action, "params": params, "version": 6}).encode("utf-8")
-    request = urllib.request.Request("http://127.0.0.1:8765", payload, headers={"Content-Type": "application/json"})
-    for attempt in range(3):
-        with urllib.request.urlopen(request, timeout=60) as response:
-            result = json.loads(response.read().decode("utf-8"))
-        if not result.get("error"):
-            return result["result"]
-        if result["error"] != "collection is not available" or attempt == 2:
-            raise RuntimeError(result["error"])
-        time.sleep(2)
-    raise RuntimeError("collection is not available")
-
-
-def compare_model(script_module, path, content_fields, legacy_namespace):
-    rows = script_module.load_rows(path)
-    row_by_id = {row["SourceID"]: row for row in rows}
-    note_ids = invoke("findNotes", query=f'note:"{script_module.MODEL_NAME}"')
-    if not note_ids:
-        return []
-    notes = invoke("notesInfo", notes=note_ids)
+    return anki_connect.invoke(action, **params)
+
+
+def scan_notes(
+    note_batches: Iterable[list[dict]],
+    source_key: Callable[[dict], str],
+    sources: dict,
+    content_fields,
+    legacy_namespace: str,
+    report: Callable | None = None,
+):
+    """Return ``(note id, source id, edited fields, already locked)`` findings.
+
+    Each batch is fingerprinted in one ``fingerprint_many`` call, and
+    ``report`` receives every finding as soon as its batch is done.
+    """
     tagged = []
-    for note in notes:
-        source_id = note.get("fields", {}).get("SourceID", {}).get("value", "")
-        row = row_by_id.get(source_id)
-        if not row:
-            continue
-        fields = note.get("fields", {})
-        if anki_protect.note_has_untracked_edits(
-            fields,
-            row,
+    for notes in note_batches:
+        matched = []
+        for note in notes:
+            key = source_key(note)
+            source_fields = sources.get(key)
+            if source_fields:
+                matched.append((note, key, source_fields))
+        checks = anki_protect.fingerprint_many(
+            (
+                (note.get("fields", {}), source_fields, anki_protect.legacy_fingerprints(legacy_namespace, key))
+                for note, key, source_fields in matched
+            ),
             content_fields,
-            legacy_fingerprints=anki_protect.legacy_fingerprints(legacy_namespace, source_id),
-        ):
-            edited = anki_protect.detect_content_edits(fields, row, content_fields)
+        )
+        for (note, key, source_fields), check in zip(matched, checks):
+            if not check.edited:
+                continue
+            fields = note.get("fields", {})
+            edited = anki_protect.edited_fields(fields, content_fields)
+            if not edited:
+                edited = anki_protect.detect_content_edits(fields, source_fields, content_fields)
             if not edited:
                 edited = ["tracked content fingerprint"]
-            tagged.append(
-                (note["noteId"], source_id, edited, anki_protect.note_is_locked(note.get("tags", [])))
-            )
+            entry = (note["noteId"], key, edited, anki_protect.note_is_locked(note.get("tags", [])))
+            tagged.append(entry)
+            if report is not None:
+                report(entry)
     return tagged
 
 
-def compare_spanish_content(review_path: Path, source_rows):
+def compare_model(script_module, path, content_fields, legacy_namespace, report=None):
+    rows = script_module.load_rows(path)
+    return scan_notes(
+        anki_mirror.iter_model_notes(invoke, script_module.MODEL_NAME),
+        lambda note: note.get("fields", {}).get("SourceID", {}).get("value", ""),
+        {row["SourceID"]: row for row in rows},
+        content_fields,
+        legacy_namespace,
+        report,
+    )
+
+
+def compare_spanish_content(review_path: Path, source_rows, report=None):
     review_rows = prod.load_spanish_review_rows(review_path, source_rows)
-    notes = prod.get_notes(f'note:"{prod.SPANISH_MODEL}"')
-    tagged = []
-    for note in notes:
-        key = prod.source_id_from_spanish_note(note["fields"])
-        row = review_rows.get(key)
-        if not row:
-            continue
-        source_fields = prod.spanish_content_fields(row)
-        fields = note.get("fields", {})
-        if anki_protect.note_has_untracked_edits(
-            fields,
-            source_fields,
-            prod.SPANISH_CONTENT_FIELDS,
-            legacy_fingerprints=anki_protect.legacy_fingerprints(
-                prod.SPANISH_CONTENT_LEGACY_NAMESPACE,
-                key,
+    return scan_notes(
+        anki_mirror.iter_model_notes(invoke, prod.SPANISH_MODEL),
+        lambda note: prod.source_id_from_spanish_note(note["fields"]),
+        {key: prod.spanish_content_fields(row) for key, row in review_rows.items()},
+        prod.SPANISH_CONTENT_FIELDS,
+        prod.SPANISH_CONTENT_LEGACY_NAMESPACE,
+        report,
+    )
+
+
+def compare_spanish_4000(report=None):
+    source_rows = prod.spanish_deck.parse_source_deck("4000 Essential English Words.txt")
+    return compare_spanish_content(prod.SPANISH_REVIEW_PATH, source_rows, report)
+
+
+def scan_all(report_for: Callable[[str], Callable | None] = lambda model_name: None):
+    """Scan every protected model concurrently; results keep the model order."""
+    scans = [
+        (
+            mastery.MODEL_NAME,
+            lambda report: compare_model(
+                mastery, mastery.IMPORT_PATH, MASTERY_CONTENT_FIELDS, mastery.LEGACY_FINGERPRINT_NAMESPACE, report
             ),
-        ):
-            edited = anki_protect.detect_content_edits(fields, source_fields, prod.SPANISH_CONTENT_FIELDS)
-            if not edited:
-                edited = ["tracked content fingerprint"]
-            tagged.append(
-                (note["noteId"], key, edited, anki_protect.note_is_locked(note.get("tags", [])))
-            )
-    return tagged
+        ),
+        (
+            core.MODEL_NAME,
+            lambda report: compare_model(
+                core, core.IMPORT_PATH, CORE_CONTENT_FIELDS, core.LEGACY_FINGERPRINT_NAMESPACE, report
+            ),
+        ),
+        (prod.SPANISH_MODEL, compare_spanish_4000),
+    ]
+    with ThreadPoolExecutor(max_workers=len(scans)) as pool:
+        futures = [(model_name, pool.submit(scan, report_for(model_name))) for model_name, scan in scans]
+        return [(model_name, future.result()) for model_name, future in futures]
+
+
+def print_json_line(payload: dict) -> None:
+    with _print_lock:
+        print(json.dumps(payload, ensure_ascii=False), flush=True)
+
+
+def json_line_reporter(model_name: str) -> Callable:
+    def report(entry):
+        note_id, source_id, edited, already_locked = entry
+        print_json_line(
+            {
+                "model": model_name,
+                "note_id": note_id,
+                "source_id": source_id,
+                "fields": edited,
+                "locked": already_locked,
+            }
+        )
+
+    return report
 
 
 def apply_tags(entries):
     note_ids = [entry[0] for entry in entries if not entry[3]]
     if not note_ids:
         return 0
-    for start in range(0, len(note_ids), 100):
-        invoke("addTags", notes=note_ids[start:start + 100], tags=anki_protect.LOCKED_TAG)
+    with anki_connect.ActionQueue(invoke) as queue:
+        for start in range(0, len(note_ids), TAG_BATCH_SIZE):
+            queue.add("addTags", notes=note_ids[start : start + TAG_BATCH_SIZE], tags=anki_protect.LOCKED_TAG)
     return len(note_ids)
 
 
 def parse_args():
     parser = argparse.ArgumentParser(description="Detect and lock manually edited Anki notes.")
     parser.add_argument("--apply", action="store_true", help="Tag detected edits as locked (default: report only).")
+    parser.add_argument(
+        "--refresh-mirror",
+        action="store_true",
+        help="Ignore the local note mirror and refetch every note from Anki.",
+    )
+    parser.add_argument(
+        "--json-lines",
+        action="store_true",
+        help="Stream one JSON object per finding while scanning, then a summary object.",
+    )
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
     invoke("version")
+    if args.refresh_mirror:
+        anki_mirror.invalidate(mastery.MODEL_NAME, core.MODEL_NAME, prod.SPANISH_MODEL)
 
-    findings = []
-
-    tagged_mastery = compare_model(
-        mastery,
-        mastery.IMPORT_PATH,
-        MASTERY_CONTENT_FIELDS,
-        mastery.LEGACY_FINGERPRINT_NAMESPACE,
-    )
-    findings.append((mastery.MODEL_NAME, tagged_mastery))
-
-    tagged_core = compare_model(
-        core,
-        core.IMPORT_PATH,
-        CORE_CONTENT_FIELDS,
-        core.LEGACY_FINGERPRINT_NAMESPACE,
-    )
-    findings.append((core.MODEL_NAME, tagged_core))
+    findings = scan_all(json_line_reporter if args.json_lines else (lambda model_name: None))
+    all_entries = [entry for _, entries in findings for entry in entries]
+    total = len(all_entries)
+    unprotected = sum(1 for entry in all_entries if not entry[3])
 
-    source_rows = prod.spanish_deck.parse_source_deck("4000 Essential English Words.txt")
-    tagged_spanish = compare_spanish_content(prod.SPANISH_REVIEW_PATH, source_rows)
-    findings.append((prod.SPANISH_MODEL, tagged_spanish))
+    if args.json_lines:
+        tagged = apply_tags(all_entries) if args.apply else 0
+        print_json_line({"total": total, "unprotected": unprotected, "tagged": tagged})
+        return
 
-    total = 0
-    unprotected = 0
     for model_name, entries in findings:
         print(f"\n=== {model_name}: {len(entries)} differing note(s) ===")
         for _, source_id, edited, already_locked in entries:
             status = " [already locked]" if already_locked else " [needs protection]"
             print(f"  - {source_id}: changed {', '.join(edited)}{status}")
-            unprotected += 0 if already_locked else 1
-        total += len(entries)
 
     print(f"\nTotal differing notes detected: {total}; unprotected: {unprotected}")
 
     if args.apply and unprotected:
-        all_entries = [e for _, entries in findings for e in entries]
         count = apply_tags(all_entries)
         print(f"Tagged {count} note(s) with '{anki_protect.LOCKED_TAG}'. Sync scripts will skip them.")
     elif unprotected:
@@ -1,14 +1,20 @@
 import argparse
-import bz2
 import csv
+import hashlib
 import html
 import io
+import json
 import re
-import tarfile
-from collections import Counter
+import sys
+import time
+from collections import Counter, defaultdict
+from functools import lru_cache
 from pathlib import Path
 
+import card_catalog
+import card_validation
 import spanish_grammar_levels
+import tatoeba_store
 
 
 OUTPUT_DIR = Path("generated/spanish_core")
@@ -21,6 +27,8 @@ TATOEBA_LIMIT_BY_LEVEL = {
     "a1_2_core_sentences": 9,
 }
 TATOEBA_SELECTION_VERSION = "7"
+TATOEBA_CHUNKS_PER_JOB = 8
+TATOEBA_PROGRESS_EVERY = 250_000
 
 TATOEBA_LICENSE = "Tatoeba sentence text, CC BY 2.0 FR unless marked otherwise by contributor export."
 TATOEBA_ATTRIBUTION = "Source: Tatoeba.org sentence IDs {spa_id}/{eng_id}."
@@ -795,34 +803,140 @@ SENTENCE_TARGETS = [
     ("b1_bridge", "sentence mining", "podría", r"\b[Pp]odría\b"),
 ]
 TARGET_PATTERNS = {target: pattern for _, _, target, pattern in SENTENCE_TARGETS}
+ACTIVE_SENTENCE_TARGETS = {(level, target) for level, _, target, _ in SENTENCE_TARGETS}
+
+
+def _targets_by_first_word():
+    """Index SENTENCE_TARGETS by the lowercased first word of each target.
+
+    Every pattern starts with ``\\b`` and the target's first word in either case,
+    so a sentence can only match targets whose first word is one of its tokens.
+    """
+    index = defaultdict(list)
+    for position, (level, topic, target, pattern) in enumerate(SENTENCE_TARGETS):
+        index[target.split()[0].lower()].append((position, level, topic, target, re.compile(pattern)))
+    return dict(index)
+
+
+_TARGETS_BY_FIRST_WORD = _targets_by_first_word()
+
+
+def _matching_sentence_targets(spa_text, open_targets=None):
+    """Return ``(level, topic, target)`` for every target in the sentence, in list order.
+
+    When ``open_targets`` is given, patterns of other ``(level, target)`` keys
+    are not run at all.
+    """
+    hits = []
+    for word in {word.lower() for word in _sentence_features(spa_text).tokens}:
+        hits.extend(_TARGETS_BY_FIRST_WORD.get(word, ()))
+    hits.sort(key=lambda hit: hit[0])
+    return [
+        (level, topic, target)
+        for _, level, topic, target, pattern in hits
+        if (open_targets is None or (level, target) in open_targets) and pattern.search(spa_text)
+    ]
 
 
 def _tatoeba_target_limit(level, default_limit):
     return min(default_limit, TATOEBA_LIMIT_BY_LEVEL.get(level, default_limit))
 
 
-def _tatoeba_selection_complete(rows, default_limit):
+def _tatoeba_candidate_limit(level, default_limit):
+    return max(_tatoeba_target_limit(level, default_limit) * 12, 80)
+
+
+def _incomplete_tatoeba_targets(rows, default_limit):
     counts = Counter((row.get("level", ""), row.get("target", "")) for row in rows)
-    return all(
-        counts[(level, target)] == _tatoeba_target_limit(level, default_limit)
+    return {
+        (level, target)
         for level, _, target, _ in SENTENCE_TARGETS
-    )
+        if counts[(level, target)] != _tatoeba_target_limit(level, default_limit)
+    }
+
+
+def _tatoeba_selection_complete(rows, default_limit):
+    return not _incomplete_tatoeba_targets(rows, default_limit)
+
+
+def _tatoeba_target_fingerprints(default_limit):
+    """Hash, per ``(level, target)``, the pattern and the level's limits.
+
+    Only static data goes in, so the fingerprints do not depend on whether a
+    local corpus store exists.  Candidate buckets and dedupe keys are per
+    target, so a target whose fingerprint is unchanged selects the same rows.
+    ``REJECT_TATOEBA_SENTENCE_IDS`` stays out: cached rows are filtered by it
+    on load, which leaves only the targets that lost a row incomplete.
+    Validator changes still go through ``TATOEBA_SELECTION_VERSION``.
+    """
+    fingerprints = {}
+    for level, _, target, pattern in SENTENCE_TARGETS:
+        payload = json.dumps(
+            [
+                level,
+                target,
+                pattern,
+                _tatoeba_target_limit(level, default_limit),
+                _tatoeba_candidate_limit(level, default_limit),
+            ],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        fingerprints[(level, target)] = hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+    return fingerprints
+
+
+class _SentenceFeatures:
+    """Facts about one sentence that the Tatoeba validators share.
+
+    Built once per distinct text by ``_sentence_features``; ``matches``
+    memoizes the level regexes that only some validators need.
+    """
+
+    __slots__ = ("text", "tokens", "word_count", "lowered", "casefolded", "clean", "complexity_markers", "regex_hits")
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = re.findall(r"\w+", text)
+        self.word_count = len(self.tokens)
+        self.lowered = text.lower()
+        self.casefolded = text.casefold()
+        self.clean = self._clean()
+        self.complexity_markers = frozenset(
+            marker for marker in _ALL_COMPLEXITY_MARKERS if marker in self.casefolded
+        )
+        self.regex_hits = {}
+
+    def _clean(self):
+        text = self.text
+        if any(marker in text for marker in ("@", "http://", "https://", "\t")):
+            return False
+        if "Muiriel" in text:
+            return False
+        if re.search(r"[{}<>\\[\\]]", text):
+            return False
+        if text.count("!") > 1 or text.count(";") > 0:
+            return False
+        return 2 <= self.word_count <= 12
+
+    def matches(self, regex):
+        """Return whether compiled ``regex`` finds a match in the casefolded text."""
+        if regex not in self.regex_hits:
+            self.regex_hits[regex] = regex.search(self.casefolded) is not None
+        return self.regex_hits[regex]
+
+
+@lru_cache(maxsize=65536)
+def _sentence_features(text):
+    return _SentenceFeatures(text)
 
 
 def _word_count(sentence):
-    return len(re.findall(r"\w+", sentence, flags=re.UNICODE))
+    return _sentence_features(sentence).word_count
 
 
 def _is_clean_sentence(sentence):
-    if any(marker in sentence for marker in ("@", "http://", "https://", "\t")):
-        return False
-    if "Muiriel" in sentence:
-        return False
-    if re.search(r"[{}<>\\[\\]]", sentence):
-        return False
-    if sentence.count("!") > 1 or sentence.count(";") > 0:
-        return False
-    return 2 <= _word_count(sentence) <= 12
+    return _sentence_features(sentence).clean
 
 
 def _level_sentence_length_ok(level, spa_text, eng_text):
@@ -841,7 +955,7 @@ def _level_sentence_length_ok(level, spa_text, eng_text):
 
 
 def _level_content_ok(level, spa_text, eng_text):
-    text = f"{spa_text} {eng_text}".lower()
+    text = f"{_sentence_features(spa_text).lowered} {_sentence_features(eng_text).lowered}"
     if "..." in text:
         return False
     if "pegarle un tiro" in text:
@@ -942,6 +1056,9 @@ _EARLY_LEVEL_COMPLEXITY_MARKERS = {
         "prioridades",
     ),
 }
+_ALL_COMPLEXITY_MARKERS = frozenset(
+    marker for markers in _EARLY_LEVEL_COMPLEXITY_MARKERS.values() for marker in markers
+)
 
 
 def _tatoeba_pair_quality_key(row):
@@ -949,15 +1066,20 @@ def _tatoeba_pair_quality_key(row):
     level = row.get("level", "")
     spa_text = row.get("spa_text", "")
     eng_text = row.get("eng_text", "")
-    text = f"{spa_text} {eng_text}".casefold()
+    spa = _sentence_features(spa_text)
+    eng = _sentence_features(eng_text)
+    text = f"{spa.casefolded} {eng.casefolded}"
+    # Markers with a space may also span the join between the two sentences.
     marker_penalty = sum(
-        marker in text
+        marker in spa.complexity_markers
+        or marker in eng.complexity_markers
+        or (" " in marker and marker in text)
         for marker in _EARLY_LEVEL_COMPLEXITY_MARKERS.get(level, ())
     )
     dialogue_penalty = int(any(mark in text for mark in ('"', "“", "”")))
     punctuation_penalty = spa_text.count("!") + max(0, spa_text.count("?") - 1)
-    spa_words = _word_count(spa_text)
-    eng_words = _word_count(eng_text)
+    spa_words = spa.word_count
+    eng_words = eng.word_count
     target_match = re.search(TARGET_PATTERNS.get(row.get("target", ""), r"$^"), spa_text)
     target_position_penalty = int(bool(target_match and target_match.start() > 2))
 
@@ -985,29 +1107,17 @@ def _valid_tatoeba_pair(row):
     eng_text = row.get("eng_text", "")
     if row.get("spa_id", "") in REJECT_TATOEBA_SENTENCE_IDS:
         return False
-    if not any(
-        active_level == level and active_target == target
-        for active_level, _, active_target, _ in SENTENCE_TARGETS
-    ):
+    if (level, target) not in ACTIVE_SENTENCE_TARGETS:
         return False
+    return _tatoeba_target_ok(target, spa_text) and _tatoeba_level_ok(level, spa_text, eng_text)
+
+
+def _tatoeba_target_ok(target, spa_text):
+    """Checks that depend on the target word but not on the level."""
     pattern = TARGET_PATTERNS.get(target)
     if not pattern or len(re.findall(pattern, spa_text)) != 1:
         return False
-    if not _is_clean_sentence(spa_text) or not _is_clean_sentence(eng_text):
-        return False
-    if not _level_sentence_length_ok(level, spa_text, eng_text):
-        return False
-    if not _level_content_ok(level, spa_text, eng_text):
-        return False
-
-    lowered = spa_text.casefold()
-    if re.search(
-        r"\b(?:vosotros|vosotras|vuestro|vuestra|vuestros|vuestras|os|"
-        r"sois|estáis|tenéis|queréis|podéis|vais|habéis|hacéis|sabéis|"
-        r"comed|hablad|escuchad|mirad|recordad)\b",
-        lowered,
-    ):
-        return False
+    lowered = _sentence_features(spa_text).casefolded
     if target == "puede" and re.search(r"\bno puede ser\b", lowered):
         return False
     if target in {"puedo", "puedes", "puede"} and not re.search(
@@ -1051,115 +1161,224 @@ def _valid_tatoeba_pair(row):
         lowered,
     ):
         return False
-    if level == "a0_survival" and re.search(
-        r"\b(?:que|estaba|estaban|era|eran|fue|fueron|pueda|puedas|puedan|podría|habría)\b",
-        lowered,
-    ):
+    return True
+
+
+_VOSOTROS_RE = re.compile(
+    r"\b(?:vosotros|vosotras|vuestro|vuestra|vuestros|vuestras|os|"
+    r"sois|estáis|tenéis|queréis|podéis|vais|habéis|hacéis|sabéis|"
+    r"comed|hablad|escuchad|mirad|recordad)\b"
+)
+_LEVEL_BLOCKED_RES = {
+    "a0_survival": (
+        re.compile(r"\b(?:que|estaba|estaban|era|eran|fue|fueron|pueda|puedas|puedan|podría|habría)\b"),
+    ),
+    "a1_1_foundations": (
+        re.compile(
+            r"\b(?:haya|hayas|hayan|sea|seas|sean|fuera|fueras|fueran|habría|podría|sorprendería|vendrías)\b"
+        ),
+        re.compile(r"\b(?:he|has|ha|hemos|han)\s+(?:ido|[a-záéíóúñü]+(?:ado|ido|to|so|cho))\b"),
+        re.compile(
+            r"\b(?:haré|harás|hará|habrá|estaré|estarás|estará|tendré|tendrás|tendrá|"
+            r"vendré|vendrás|vendrá|podré|podrás|podrá|querré|querrás|querrá|"
+            r"[a-záéíóúñü]+(?:aré|eré|iré|arás|erás|irás|ará|erá|irá|aremos|eremos|iremos|arán|erán|irán)|"
+            r"llueva|lluevas|lluevan)\b"
+        ),
+    ),
+}
+
+
+def _tatoeba_level_ok(level, spa_text, eng_text):
+    """Checks shared by every target of a level, computed once per pair."""
+    spa = _sentence_features(spa_text)
+    if not spa.clean or not _sentence_features(eng_text).clean:
         return False
-    if level == "a1_1_foundations" and re.search(
-        r"\b(?:haya|hayas|hayan|sea|seas|sean|fuera|fueras|fueran|habría|podría|sorprendería|vendrías)\b",
-        lowered,
-    ):
+    if not _level_sentence_length_ok(level, spa_text, eng_text):
         return False
-    if level == "a1_1_foundations" and re.search(
-        r"\b(?:he|has|ha|hemos|han)\s+(?:ido|[a-záéíóúñü]+(?:ado|ido|to|so|cho))\b",
-        lowered,
-    ):
+    if not _level_content_ok(level, spa_text, eng_text):
         return False
-    if level == "a1_1_foundations" and re.search(
-        r"\b(?:haré|harás|hará|habrá|estaré|estarás|estará|tendré|tendrás|tendrá|"
-        r"vendré|vendrás|vendrá|podré|podrás|podrá|querré|querrás|querrá|"
-        r"[a-záéíóúñü]+(?:aré|eré|iré|arás|erás|irás|ará|erá|irá|aremos|eremos|iremos|arán|erán|irán)|"
-        r"llueva|lluevas|lluevan)\b",
-        lowered,
-    ):
+    if spa.matches(_VOSOTROS_RE):
         return False
-    return True
+    return not any(spa.matches(regex) for regex in _LEVEL_BLOCKED_RES.get(level, ()))
 
 
-def _load_sentences(path):
-    rows = {}
-    with bz2.open(path, "rt", encoding="utf-8", newline="") as handle:
-        reader = csv.reader(handle, delimiter="\t")
-        for row in reader:
-            if len(row) >= 3:
-                sentence_id, lang, text = row[0], row[1], row[2]
-                if _is_clean_sentence(text):
-                    rows[sentence_id] = text
-    return rows
-
-
-def _load_audio_metadata():
-    audio_path = TATOEBA_DIR / "sentences_with_audio.tar.bz2"
-    if not audio_path.exists():
-        return {}
-    rows = {}
-    with tarfile.open(audio_path, "r:bz2") as archive:
-        handle = archive.extractfile("sentences_with_audio.csv")
-        if handle is None:
-            return {}
-        reader = csv.reader(io.TextIOWrapper(handle, encoding="utf-8", newline=""), delimiter="\t")
-        for row in reader:
-            if len(row) >= 3:
-                rows[row[0]] = {
-                    "audio_id": row[1],
-                    "contributor": "" if row[2] == r"\N" else row[2],
-                    "license": "" if len(row) < 4 or row[3] == r"\N" else row[3],
-                }
-    return rows
+def _tatoeba_pair_rows(limit_per_target, jobs=1, progress=None, targets=None):
+    """Fill every target's candidate bucket from the links, stopping once all are full.
 
-
-def _tatoeba_pair_rows(limit_per_target):
-    spa_path = TATOEBA_DIR / "spa_sentences.tsv.bz2"
-    eng_path = TATOEBA_DIR / "eng_sentences.tsv.bz2"
-    links_path = TATOEBA_DIR / "spa-eng_links.tsv.bz2"
-    if not links_path.exists():
-        links_path = TATOEBA_DIR / "links.tar.bz2"
-    if not (spa_path.exists() and eng_path.exists() and links_path.exists()):
+    ``targets`` limits mining to those ``(level, target)`` keys.  ``progress`` is called with a throughput report every
+    ``TATOEBA_PROGRESS_EVERY`` links and once more when the scan ends.
+    """
+    corpus = tatoeba_store.open_corpus(TATOEBA_DIR)
+    if corpus is None:
         return []
-
-    spa = _load_sentences(spa_path)
-    eng = _load_sentences(eng_path)
-    audio = _load_audio_metadata()
-    pairs_by_target = {(level, target): [] for level, _, target, _ in SENTENCE_TARGETS}
-    target_by_regex = [(level, topic, target, re.compile(pattern)) for level, topic, target, pattern in SENTENCE_TARGETS]
-    seen_target_pairs = set()
-    seen_target_english = set()
-    seen_target_spanish_text = set()
-
-    def visit_pair(left_id, right_id):
-        if left_id in spa and right_id in eng:
-            spa_id, eng_id = left_id, right_id
-        elif right_id in spa and left_id in eng:
-            spa_id, eng_id = right_id, left_id
+    with corpus:
+        if not (corpus.has_sentences("spa") and corpus.has_sentences("eng") and corpus.has_links()):
+            return []
+        candidates = _TatoebaCandidates(limit_per_target, targets)
+        first, stop = corpus.seq_range("links")
+        meter = _MiningProgress(stop - first, candidates, progress)
+        if jobs > 1:
+            chunks = tatoeba_store.seq_chunks(first, stop, jobs * TATOEBA_CHUNKS_PER_JOB)
+            # Arguments are built lazily as workers free up, so each chunk only
+            # runs the patterns of targets still open at submission time.
+            arguments = (
+                (corpus.path, start, end, frozenset(candidates.open_targets)) for start, end in chunks
+            )
+            for (start, end), found in zip(
+                chunks, tatoeba_store.map_ordered(_valid_pairs_in_links, arguments, jobs)
+            ):
+                for level, topic, target, spa_id, spa_text, eng_id, eng_text, audio_meta in found:
+                    if candidates.wants(level, target, spa_id, spa_text, eng_id):
+                        candidates.add(level, topic, target, spa_id, spa_text, eng_id, eng_text, audio_meta)
+                meter.advance(end - start)
+                if not candidates.open_targets:
+                    break
         else:
-            return
-        spa_text = spa[spa_id]
-        eng_text = eng[eng_id]
-        if spa_id in REJECT_TATOEBA_SENTENCE_IDS:
-            return
-        if not _is_clean_sentence(eng_text):
-            return
-        for level, topic, target, pattern in target_by_regex:
-            bucket = pairs_by_target[(level, target)]
-            target_limit = _tatoeba_target_limit(level, limit_per_target)
-            candidate_limit = max(target_limit * 12, 80)
-            if len(bucket) >= candidate_limit:
-                continue
-            pair_key = (level, target, spa_id, eng_id)
-            if pair_key in seen_target_pairs:
-                continue
-            english_key = (level, target, eng_id)
-            if english_key in seen_target_english:
-                continue
-            spanish_text_key = (level, target, spa_text.lower())
-            if spanish_text_key in seen_target_spanish_text:
-                continue
-            if not _level_sentence_length_ok(level, spa_text, eng_text):
-                continue
-            if not _level_content_ok(level, spa_text, eng_text):
-                continue
-            candidate = {
+            targets_by_spanish = {}
+            for spa_id, spa_text, eng_id, eng_text, *audio in corpus.spa_eng_pairs():
+                audio_meta = _tatoeba_audio_meta(*audio)
+                for level, topic, target in _valid_pair_targets(
+                    spa_id,
+                    spa_text,
+                    eng_id,
+                    eng_text,
+                    targets_by_spanish,
+                    wants=lambda level, target: candidates.wants(level, target, spa_id, spa_text, eng_id),
+                    open_targets=candidates.open_targets,
+                ):
+                    candidates.add(level, topic, target, spa_id, spa_text, eng_id, eng_text, audio_meta)
+                meter.advance(1)
+                if not candidates.open_targets:
+                    break
+        meter.finish()
+        return candidates.selected()
+
+
+class _MiningProgress:
+    """Links scanned, links per second, and open targets for a mining scan."""
+
+    def __init__(self, total_links, candidates, report=None):
+        self.total_links = total_links
+        self.candidates = candidates
+        self.report = report
+        self.links = 0
+        self.next_report = TATOEBA_PROGRESS_EVERY
+        self.started = time.perf_counter()
+
+    def advance(self, links):
+        self.links += links
+        if self.report is not None and self.links >= self.next_report:
+            self.next_report = self.links + TATOEBA_PROGRESS_EVERY
+            self.report(self.snapshot())
+
+    def finish(self):
+        if self.report is not None:
+            self.report({**self.snapshot(), "done": True})
+
+    def snapshot(self):
+        elapsed = time.perf_counter() - self.started
+        return {
+            "links": self.links,
+            "total_links": self.total_links,
+            "links_per_sec": round(self.links / elapsed) if elapsed > 0 else 0,
+            "open_targets": len(self.candidates.open_targets),
+            "targets": len(self.candidates.pairs_by_target),
+        }
+
+
+def _print_mining_progress(report):
+    state = "done" if report.get("done") else "mining"
+    print(
+        f"tatoeba {state}: {report['links']:,}/{report['total_links']:,} links, "
+        f"{report['links_per_sec']:,} links/s, "
+        f"{report['open_targets']}/{report['targets']} targets open",
+        file=sys.stderr,
+    )
+
+
+def _tatoeba_audio_meta(audio_id, contributor, license):
+    return (audio_id, contributor, license) if audio_id is not None else ("", "", "")
+
+
+def _valid_pair_targets(spa_id, spa_text, eng_id, eng_text, targets_by_spanish, wants=None, open_targets=None):
+    """Yield ``(level, topic, target)`` the linked pair validly demonstrates, in list order.
+
+    ``targets_by_spanish`` memoizes each Spanish sentence's matching targets.
+    ``wants`` lets the serial scan skip validation for targets whose bucket
+    would reject the pair anyway, and ``open_targets`` skips matching the
+    patterns of full buckets.  Buckets only ever fill, so a memo computed
+    while more targets were open stays a safe superset.
+    """
+    if spa_id in REJECT_TATOEBA_SENTENCE_IDS:
+        return
+    if spa_id not in targets_by_spanish:
+        targets_by_spanish[spa_id] = (
+            _matching_sentence_targets(spa_text, open_targets) if _is_clean_sentence(spa_text) else []
+        )
+    if not targets_by_spanish[spa_id] or not _is_clean_sentence(eng_text):
+        return
+    level_ok = {}
+    for level, topic, target in targets_by_spanish[spa_id]:
+        if wants is not None and not wants(level, target):
+            continue
+        if level not in level_ok:
+            level_ok[level] = _tatoeba_level_ok(level, spa_text, eng_text)
+        if level_ok[level] and _tatoeba_target_ok(target, spa_text):
+            yield level, topic, target
+
+
+def _valid_pairs_in_links(store_path, start, stop, open_targets=None):
+    """Worker for ``--jobs``: valid (target, pair) rows for one range of links."""
+    found = []
+    targets_by_spanish = {}
+    with tatoeba_store.TatoebaStore(store_path) as corpus:
+        for spa_id, spa_text, eng_id, eng_text, *audio in corpus.spa_eng_pairs(start, stop):
+            audio_meta = _tatoeba_audio_meta(*audio)
+            for level, topic, target in _valid_pair_targets(
+                spa_id, spa_text, eng_id, eng_text, targets_by_spanish, open_targets=open_targets
+            ):
+                found.append((level, topic, target, spa_id, spa_text, eng_id, eng_text, audio_meta))
+    return found
+
+
+class _TatoebaCandidates:
+    """Per-target candidate buckets with the scan's caps and dedupe keys.
+
+    Pairs must be offered in links dump order; the serial scan and the merge
+    of parallel results then accept exactly the same candidates.
+    """
+
+    def __init__(self, limit_per_target, targets=None):
+        self.pairs_by_target = {
+            (level, target): []
+            for level, _, target, _ in SENTENCE_TARGETS
+            if targets is None or (level, target) in targets
+        }
+        self.limit_per_target = limit_per_target
+        self.candidate_limits = {
+            (level, target): _tatoeba_candidate_limit(level, limit_per_target)
+            for level, target in self.pairs_by_target
+        }
+        self.open_targets = set(self.candidate_limits)
+        self.seen_target_pairs = set()
+        self.seen_target_english = set()
+        self.seen_target_spanish_text = set()
+
+    def wants(self, level, target, spa_id, spa_text, eng_id):
+        if (level, target) not in self.open_targets:
+            return False
+        return (
+            (level, target, spa_id, eng_id) not in self.seen_target_pairs
+            and (level, target, eng_id) not in self.seen_target_english
+            and (level, target, spa_text.lower()) not in self.seen_target_spanish_text
+        )
+
+    def add(self, level, topic, target, spa_id, spa_text, eng_id, eng_text, audio_meta):
+        self.seen_target_pairs.add((level, target, spa_id, eng_id))
+        self.seen_target_english.add((level, target, eng_id))
+        self.seen_target_spanish_text.add((level, target, spa_text.lower()))
+        self.pairs_by_target[(level, target)].append(
+            {
                 "level": level,
                 "topic": topic,
                 "target": target,
@@ -1167,50 +1386,26 @@ def _tatoeba_pair_rows(limit_per_target):
                 "spa_text": spa_text,
                 "eng_id": eng_id,
                 "eng_text": eng_text,
+                "audio_id": audio_meta[0],
+                "audio_contributor": audio_meta[1],
+                "audio_license": audio_meta[2],
             }
-            if pattern.search(spa_text) and _valid_tatoeba_pair(candidate):
-                audio_meta = audio.get(spa_id, {})
-                seen_target_pairs.add(pair_key)
-                seen_target_english.add(english_key)
-                seen_target_spanish_text.add(spanish_text_key)
-                bucket.append(
-                    {
-                        "level": level,
-                        "topic": topic,
-                        "target": target,
-                        "spa_id": spa_id,
-                        "spa_text": spa_text,
-                        "eng_id": eng_id,
-                        "eng_text": eng_text,
-                        "audio_id": audio_meta.get("audio_id", ""),
-                        "audio_contributor": audio_meta.get("contributor", ""),
-                        "audio_license": audio_meta.get("license", ""),
-                    }
-                )
+        )
+        if len(self.pairs_by_target[(level, target)]) >= self.candidate_limits[(level, target)]:
+            self.open_targets.discard((level, target))
 
-    if links_path.name.endswith(".tsv.bz2"):
-        with bz2.open(links_path, "rt", encoding="utf-8", newline="") as handle:
-            for row in csv.reader(handle, delimiter="\t"):
-                if len(row) >= 2:
-                    visit_pair(row[0], row[1])
-    else:
-        with tarfile.open(links_path, "r:bz2") as archive:
-            handle = archive.extractfile("links.csv")
-            if handle is None:
-                return []
-            reader = csv.reader(io.TextIOWrapper(handle, encoding="utf-8", newline=""), delimiter="\t")
-            for left_id, right_id in reader:
-                visit_pair(left_id, right_id)
-
-    pairs = []
-    for level, _, target, _ in SENTENCE_TARGETS:
-        candidates = pairs_by_target[(level, target)]
-        target_limit = _tatoeba_target_limit(level, limit_per_target)
-        pairs.extend(sorted(candidates, key=_tatoeba_pair_quality_key)[:target_limit])
-    return pairs
-
-
-def _write_selected_tatoeba_pairs(pairs):
+    def selected(self):
+        pairs = []
+        for level, _, target, _ in SENTENCE_TARGETS:
+            if (level, target) not in self.pairs_by_target:
+                continue
+            candidates = self.pairs_by_target[(level, target)]
+            target_limit = _tatoeba_target_limit(level, self.limit_per_target)
+            pairs.extend(sorted(candidates, key=_tatoeba_pair_quality_key)[:target_limit])
+        return pairs
+
+
+def _write_selected_tatoeba_pairs(pairs, fingerprints=None):
     TATOEBA_SELECTED_PATH.parent.mkdir(parents=True, exist_ok=True)
     with TATOEBA_SELECTED_PATH.open("w", encoding="utf-8", newline="") as handle:
         fieldnames = [
@@ -1226,6 +1421,7 @@ def _write_selected_tatoeba_pairs(pairs):
             "audio_contributor",
             "audio_license",
             "license",
+            "selection_fingerprint",
         ]
         writer = csv.DictWriter(handle, delimiter="\t", lineterminator="\n", fieldnames=fieldnames)
         writer.writeheader()
@@ -1235,35 +1431,83 @@ def _write_selected_tatoeba_pairs(pairs):
                     **row,
                     "selection_version": TATOEBA_SELECTION_VERSION,
                     "license": TATOEBA_LICENSE,
+                    "selection_fingerprint": (fingerprints or {}).get((row["level"], row["target"]), ""),
                 }
             )
 
 
 def _apply_tatoeba_text_fixes(row):
-    fixed = dict(row)
-    if fixed.get("spa_id") in TATOEBA_SPANISH_TEXT_FIXES:
-        fixed["spa_text"] = TATOEBA_SPANISH_TEXT_FIXES[fixed["spa_id"]]
-    if fixed.get("spa_id") in TATOEBA_ENGLISH_TEXT_FIXES:
-        fixed["eng_text"] = TATOEBA_ENGLISH_TEXT_FIXES[fixed["spa_id"]]
-    return fixed
+    fixes = {}
+    if row.get("spa_id") in TATOEBA_SPANISH_TEXT_FIXES:
+        fixes["spa_text"] = TATOEBA_SPANISH_TEXT_FIXES[row["spa_id"]]
+    if row.get("spa_id") in TATOEBA_ENGLISH_TEXT_FIXES:
+        fixes["eng_text"] = TATOEBA_ENGLISH_TEXT_FIXES[row["spa_id"]]
+    if isinstance(row, tatoeba_store.SelectionRow):
+        return row.replace(**fixes) if fixes else row
+    return {**row, **fixes}
+
+
+def _tatoeba_validation_key(limit_per_target):
+    """Everything besides validator code that decides whether cached pairs are current."""
+    return tatoeba_store.validation_key(
+        TATOEBA_SELECTION_VERSION,
+        limit_per_target,
+        TATOEBA_LIMIT_BY_LEVEL,
+        SENTENCE_TARGETS,
+        sorted(REJECT_TATOEBA_SENTENCE_IDS),
+        TATOEBA_SPANISH_TEXT_FIXES,
+        TATOEBA_ENGLISH_TEXT_FIXES,
+    )
+
 
+def _load_tatoeba_pairs(limit_per_target=TATOEBA_LIMIT_PER_TARGET, jobs=1, progress=None):
+    """Return the selected pairs, re-mining only targets whose cached rows are stale.
 
-def _load_tatoeba_pairs(limit_per_target=TATOEBA_LIMIT_PER_TARGET):
+    A target is stale when its rows are incomplete or carry a different
+    ``selection_fingerprint``.  Rows written before fingerprints existed carry
+    none and are trusted, as they were before.  Newly rejected sentences fail
+    validation here, so only their targets come up short and are re-mined.  Without a corpus to re-mine
+    from, stale targets keep their cached rows and the file is not rewritten.  A file whose every row passed
+    gets a validated marker, and while neither the file nor
+    ``_tatoeba_validation_key`` changes its rows are returned unchecked.
+    """
+    selection = None
     if TATOEBA_SELECTED_PATH.exists():
-        with TATOEBA_SELECTED_PATH.open(encoding="utf-8", newline="") as handle:
-            rows = []
-            for row in csv.DictReader(handle, delimiter="\t"):
-                if row.get("selection_version") != TATOEBA_SELECTION_VERSION:
-                    continue
-                fixed = _apply_tatoeba_text_fixes(row)
-                if _valid_tatoeba_pair(fixed):
-                    rows.append(fixed)
-        if _tatoeba_selection_complete(rows, limit_per_target):
+        selection = tatoeba_store.SelectionFile(TATOEBA_SELECTED_PATH)
+        validation_key = _tatoeba_validation_key(limit_per_target)
+        if selection.validated(validation_key):
+            return [_apply_tatoeba_text_fixes(row) for row in selection.rows]
+    rows = []
+    for row in selection.rows if selection is not None else ():
+        if row.get("selection_version") != TATOEBA_SELECTION_VERSION:
+            continue
+        fixed = _apply_tatoeba_text_fixes(row)
+        if _valid_tatoeba_pair(fixed):
+            rows.append(fixed)
+
+    fingerprints = _tatoeba_target_fingerprints(limit_per_target)
+    stale = set(fingerprints)
+    if selection is not None:
+        changed = {
+            (row["level"], row["target"])
+            for row in rows
+            if row.get("selection_fingerprint") not in (None, "", fingerprints.get((row["level"], row["target"])))
+        }
+        if not changed and _tatoeba_selection_complete(rows, limit_per_target):
+            if len(rows) == len(selection.rows):
+                selection.mark_validated(validation_key)
+            return rows
+        stale = changed | _incomplete_tatoeba_targets(rows, limit_per_target)
+        if not tatoeba_store.corpus_available(TATOEBA_DIR):
+            # Nothing to re-mine from: keep every cached row and the file as is.
             return rows
 
-    pairs = _tatoeba_pair_rows(limit_per_target)
-    pairs = [_apply_tatoeba_text_fixes(row) for row in pairs]
-    _write_selected_tatoeba_pairs(pairs)
+    kept = [row for row in rows if (row["level"], row["target"]) in fingerprints.keys() - stale]
+    mined = _tatoeba_pair_rows(limit_per_target, jobs=jobs, progress=progress, targets=stale)
+    mined = [_apply_tatoeba_text_fixes(row) for row in mined]
+    order = {(level, target): position for position, (level, _, target, _) in enumerate(SENTENCE_TARGETS)}
+    pairs = sorted(kept + mined, key=lambda row: order[(row["level"], row["target"])])
+    _write_selected_tatoeba_pairs(pairs, fingerprints)
     return [row for row in pairs if _valid_tatoeba_pair(row)]
 
 
@@ -1770,49 +2014,80 @@ def build_cards(include_tatoeba=True):
     return cards
 
 
+_CARD_CATALOG = card_catalog.CardCatalog(build_cards, lambda: [TATOEBA_SELECTED_PATH])
+
+
+def clear_card_cache():
+    """Forget built cards, e.g. after patching a card builder in tests."""
+    _CARD_CATALOG.invalidate()
+
+
 def get_cards(level=None, card_type=None):
-    cards = build_cards()
-    if level is not None:
-        cards = [card for card in cards if card["Level"] == level]
-    if card_type is not None:
-        cards = [card for card in cards if card["CardType"] == card_type]
-    return cards
+    return _CARD_CATALOG.cards(level, card_type)
 
 
 def get_level_summary():
-    cards = build_cards()
+    counts = _CARD_CATALOG.level_counts()
     return [
         {
             "id": level["id"],
             "deck": level["deck"],
             "goal": level["goal"],
-            "card_count": sum(1 for card in cards if card["Level"] == level["id"]),
+            "card_count": counts[level["id"]],
         }
         for level in LEVELS
     ]
 
 
+def _typed_cloze_front_problems(card):
+    if card["CardType"] != "typed_cloze":
+        return ()
+    problems = []
+    if "_____" not in card["Front"]:
+        problems.append(("Front", f"{card['SourceID']}: typed_cloze missing blank"))
+    front_text = re.sub(r"<[^>]+>", " ", card["Front"]).replace("_____", " ")
+    if re.search(rf"\b{re.escape(card['Answer'])}\b", front_text, flags=re.IGNORECASE):
+        problems.append(("Front", f"{card['SourceID']}: typed_cloze answer leaks on front"))
+    return problems
+
+
+def _legacy_cloze_marker(card):
+    for field, value in card.items():
+        if "{{c1::" in value:
+            return ((field, f"{card['SourceID']}: legacy cloze marker"),)
+    return ()
+
+
+CARD_RULES = [
+    card_validation.UniqueRule(
+        "duplicate SourceID",
+        "SourceID",
+        key=lambda card: card["SourceID"],
+        message=lambda card: f"{card['SourceID']}: duplicate SourceID",
+    ),
+    card_validation.required_fields(
+        ("SourceID", "DeckPath", "Level", "CardType", "PromptMode", "Front", "Answer", "Back")
+    ),
+    card_validation.Rule(
+        "type_exact answer length",
+        lambda card: (
+            [("Answer", f"{card['SourceID']}: long answer marked type_exact")]
+            if card["PromptMode"] == "type_exact" and len(card["Answer"].split()) > 4
+            else ()
+        ),
+    ),
+    card_validation.Rule("typed_cloze front", _typed_cloze_front_problems),
+    card_validation.Rule("legacy cloze marker", _legacy_cloze_marker),
+]
+
+
+def check_cards(cards):
+    """Return a ``card_validation.ValidationReport`` for ``CARD_RULES``."""
+    return card_validation.check_cards(cards, CARD_RULES)
+
+
 def validate_cards(cards):
-    errors = []
-    source_ids = [card["SourceID"] for card in cards]
-    if len(source_ids) != len(set(source_ids)):
-        dupes = [sid for sid in source_ids if source_ids.count(sid) > 1]
-        errors.append(f"duplicate SourceID: {set(dupes)}")
-    for card in cards:
-        for field in ("SourceID", "DeckPath", "Level", "CardType", "PromptMode", "Front", "Answer", "Back"):
-            if not card[field]:
-                errors.append(f"{card['SourceID']}: blank {field}")
-        if card["PromptMode"] == "type_exact" and len(card["Answer"].split()) > 4:
-            errors.append(f"{card['SourceID']}: long answer marked type_exact")
-        if card["CardType"] == "typed_cloze" and "_____" not in card["Front"]:
-            errors.append(f"{card['SourceID']}: typed_cloze missing blank")
-        if card["CardType"] == "typed_cloze":
-            front_text = re.sub(r"<[^>]+>", " ", card["Front"]).replace("_____", " ")
-            if re.search(rf"\b{re.escape(card['Answer'])}\b", front_text, flags=re.IGNORECASE):
-                errors.append(f"{card['SourceID']}: typed_cloze answer leaks on front")
-        if "{{c1::" in " ".join(card.values()):
-            errors.append(f"{card['SourceID']}: legacy cloze marker")
-    return errors
+    return check_cards(cards).messages
 
 
 def render_tsv(cards):
@@ -1842,15 +2117,32 @@ def parse_args(argv=None):
     parser.add_argument("--output-dir", default=str(OUTPUT_DIR))
     parser.add_argument("--summary", action="store_true")
     parser.add_argument("--no-tatoeba", action="store_true")
+    parser.add_argument(
+        "--jobs",
+        type=int,
+        default=1,
+        help="Worker processes for re-mining the Tatoeba selection when its cache is stale.",
+    )
+    parser.add_argument(
+        "--progress",
+        action="store_true",
+        help="Report links/sec and open targets on stderr while re-mining the Tatoeba selection.",
+    )
     return parser.parse_args(argv)
 
 
 def main(argv=None):
     args = parse_args(argv)
+    if (args.jobs > 1 or args.progress) and not args.no_tatoeba:
+        # Refresh a stale selection up front with the requested workers and
+        # reporting; card building below then reads the rewritten cache.
+        _load_tatoeba_pairs(jobs=args.jobs, progress=_print_mining_progress if args.progress else None)
     if args.summary:
         for item in get_level_summary():
             print(f"{item['id']}: {item['card_count']} cards")
-        print(f"total: {len(get_cards())} cards")
+        cards = get_cards()
+        print(f"total: {len(cards)} cards")
+        print(check_cards(cards).summary())
         return 0
     path = write_import_files(args.output_dir)
     print(f"Wrote import file: {path}")
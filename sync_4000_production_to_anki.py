@@ -7,13 +7,13 @@ import csv
 import html
 import json
 import re
-import time
-import urllib.request
 from pathlib import Path
 from typing import Dict, Iterable, List, Tuple
 
 import spanish_deck
 
+import anki_connect
+import anki_mirror
 import anki_protect
 
 
@@ -86,6 +86,10 @@ ENGLISH_PRODUCTION_FIELDS = [
     "ProductionLevel",
     "ProductionEnabled",
 ]
+# Fields whose non-empty value makes a production card template render, so
+# filling one makes Anki generate that card.
+SPANISH_CARD_GATE_FIELDS = ("ProductionCue", "SpanishContextProductionEnabled")
+ENGLISH_CARD_GATE_FIELDS = ("ProductionCue",)
 
 LEVELS = [
     (0, "Level 0 Survival", 1, 400),
@@ -478,41 +482,11 @@ ENGLISH_PRODUCTION_BACK_EXTRA = """
 
 
 def invoke(action: str, **params):
-    payload = json.dumps({"action": action, "params": params, "version": 6}).encode("utf-8")
-    request = urllib.request.Request("http://127.0.0.1:8765", payload, headers={"Content-Type": "application/json"})
-    for attempt in range(3):
-        with urllib.request.urlopen(request, timeout=60) as response:
-            result = json.loads(response.read().decode("utf-8"))
-        if not result.get("error"):
-            return result["result"]
-        if result["error"] != "collection is not available" or attempt == 2:
-            raise RuntimeError(result["error"])
-        time.sleep(2)
-    raise RuntimeError("collection is not available")
+    return anki_connect.invoke(action, **params)
 
 
 def invoke_multi(actions: List[Dict[str, object]], batch_size: int = BATCH_SIZE) -> List[object]:
-    results: List[object] = []
-    for offset in range(0, len(actions), batch_size):
-        batch = actions[offset : offset + batch_size]
-        payload = json.dumps({"action": "multi", "params": {"actions": batch}, "version": 6}).encode("utf-8")
-        request = urllib.request.Request(
-            "http://127.0.0.1:8765",
-            payload,
-            headers={"Content-Type": "application/json"},
-        )
-        with urllib.request.urlopen(request, timeout=120) as response:
-            result = json.loads(response.read().decode("utf-8"))
-        if result.get("error"):
-            raise RuntimeError(result["error"])
-        for item in result["result"]:
-            if isinstance(item, dict) and item.get("error"):
-                raise RuntimeError(item["error"])
-            if isinstance(item, dict) and "result" in item:
-                results.append(item.get("result"))
-            else:
-                results.append(item)
-    return results
+    return anki_connect.invoke_multi(actions, batch_size)
 
 
 def chunks(values: List[int], size: int = 500) -> Iterable[List[int]]:
@@ -639,6 +613,8 @@ def ensure_template(
     templates = invoke("modelTemplates", modelName=model_name)
     if name not in templates:
         invoke("modelTemplateAdd", modelName=model_name, template={"Name": name, "Front": front, "Back": back})
+        # New templates generate cards without touching note mod times.
+        anki_mirror.invalidate(model_name)
         return
     if not update_existing:
         return
@@ -681,11 +657,9 @@ def ensure_models(update_existing: bool = False) -> None:
         )
 
 
-def get_notes(query: str) -> List[Dict[str, object]]:
-    note_ids = invoke("findNotes", query=query)
-    if not note_ids:
-        return []
-    return invoke("notesInfo", notes=note_ids)
+def model_notes(model_name: str) -> List[Dict[str, object]]:
+    """Return every note of a model through the incremental local mirror."""
+    return anki_mirror.model_notes(invoke, model_name)
 
 
 def spanish_base_production_cue(fields: Dict[str, Dict[str, str]]) -> str:
@@ -803,30 +777,90 @@ def update_note_fields_many(updates: List[Tuple[int, Dict[str, str]]]) -> None:
     invoke_multi(actions)
 
 
-def card_maps_for_notes(notes: List[Dict[str, object]]) -> Dict[int, Dict[int, int]]:
+def card_maps_for_notes(
+    notes: List[Dict[str, object]],
+) -> Tuple[Dict[int, Dict[int, int]], Dict[int, Dict[str, object]]]:
+    """Return noteId -> {ord: cardId} and the live ``cardsInfo`` record of each card."""
     card_ids: List[int] = []
     for note in notes:
         card_ids.extend(note.get("cards", []))
-    cards = []
+    live: Dict[int, Dict[str, object]] = {}
     for batch in chunks(card_ids):
-        cards.extend(invoke("cardsInfo", cards=batch))
+        for card in invoke("cardsInfo", cards=batch):
+            live[card["cardId"]] = card
     by_note: Dict[int, Dict[int, int]] = {}
-    for card in cards:
+    for card in live.values():
         by_note.setdefault(card["note"], {})[card["ord"]] = card["cardId"]
-    return by_note
+    return by_note, live
+
+
+def notes_gaining_cards(
+    notes: List[Dict[str, object]], updates: List[Tuple[int, Dict[str, str]]], gate_fields: Iterable[str]
+) -> List[int]:
+    """Return IDs of notes whose update fills a previously empty card gate field."""
+    fields_by_note = {note["noteId"]: note.get("fields", {}) for note in notes}
+    return [
+        note_id
+        for note_id, fields in updates
+        if any(
+            fields.get(name) and not fields_by_note.get(note_id, {}).get(name, {}).get("value", "")
+            for name in gate_fields
+        )
+    ]
 
 
-def apply_card_plan(deck_cards: Dict[str, List[int]], active_cards: List[int], suspended_cards: List[int]) -> None:
+def add_generated_cards(
+    note_ids: List[int], note_cards: Dict[int, Dict[int, int]], live: Dict[int, Dict[str, object]]
+) -> None:
+    """Add the cards Anki generated for ``note_ids`` to the maps from ``card_maps_for_notes``."""
+    for batch in chunks(note_ids):
+        card_ids = invoke("findCards", query="nid:" + ",".join(str(note_id) for note_id in batch))
+        for new_batch in chunks([card for card in card_ids if card not in live]):
+            for card in invoke("cardsInfo", cards=new_batch):
+                live[card["cardId"]] = card
+                note_cards.setdefault(card["note"], {})[card["ord"]] = card["cardId"]
+
+
+def apply_card_plan(
+    deck_cards: Dict[str, List[int]],
+    active_cards: List[int],
+    suspended_cards: List[int],
+    live: Dict[int, Dict[str, object]] | None = None,
+) -> Dict[str, int]:
+    """Send only the deck moves and suspension changes the live cards need.
+
+    Every touched card marks the collection modified, so the plan is diffed
+    against the ``cardsInfo`` records in ``live`` (as returned by
+    ``card_maps_for_notes``).  Planned cards missing from it are fetched
+    first, and cards ``cardsInfo`` does not return are sent as planned.
+    """
+    live = dict(live or {})
+    planned_ids = {card for cards in deck_cards.values() for card in cards}
+    planned_ids.update(active_cards)
+    planned_ids.update(suspended_cards)
+    for batch in chunks(sorted(planned_ids - set(live))):
+        for card in invoke("cardsInfo", cards=batch):
+            live[card["cardId"]] = card
+    moved = 0
     for deck_name in sorted(deck_cards):
-        cards = deck_cards[deck_name]
+        cards = [card for card in deck_cards[deck_name] if live.get(card, {}).get("deckName") != deck_name]
         if cards:
             invoke("changeDeck", cards=cards, deck=deck_name)
-    for batch in chunks(active_cards):
-        if batch:
-            invoke("unsuspend", cards=batch)
-    for batch in chunks(suspended_cards):
-        if batch:
-            invoke("suspend", cards=batch)
+            moved += len(cards)
+    to_unsuspend = [card for card in active_cards if live.get(card, {"queue": -1}).get("queue") == -1]
+    to_suspend = [card for card in suspended_cards if live.get(card, {}).get("queue") != -1]
+    for batch in chunks(to_unsuspend):
+        invoke("unsuspend", cards=batch)
+    for batch in chunks(to_suspend):
+        invoke("suspend", cards=batch)
+    return {
+        "planned_deck_moves": sum(len(cards) for cards in deck_cards.values()),
+        "applied_deck_moves": moved,
+        "planned_unsuspend": len(active_cards),
+        "applied_unsuspend": len(to_unsuspend),
+        "planned_suspend": len(suspended_cards),
+        "applied_suspend": len(to_suspend),
+    }
 
 
 def cleanup_empty_source_decks() -> List[str]:
@@ -851,7 +885,7 @@ def cleanup_empty_source_decks() -> List[str]:
 def sync_spanish(
     order_map: Dict[str, int], active_limit: int, context_active_limit: int, force: bool = False
 ) -> Dict[str, int]:
-    notes = get_notes(f'note:"{SPANISH_MODEL}"')
+    notes = model_notes(SPANISH_MODEL)
     updates: List[Tuple[int, Dict[str, str]]] = []
     note_orders: Dict[int, int] = {}
     updated = 0
@@ -861,6 +895,9 @@ def sync_spanish(
     skipped_locked = 0
     auto_locked = 0
     typing_enabled_locked = 0
+    merged_locked = 0
+    lock_queue = anki_connect.ActionQueue(invoke, BATCH_SIZE)
+    planned = []
     for note in notes:
         fields = note["fields"]
         key = source_id_from_spanish_note(fields)
@@ -888,34 +925,41 @@ def sync_spanish(
             "SpanishContextCue": spanish_context_cue(fields),
             "SpanishContextProductionEnabled": context_enabled,
         }
-        preserve_content = not force and anki_protect.note_is_locked(note.get("tags", []))
-        if preserve_content:
-            skipped_locked += 1
-            typing_fields = missing_production_answer(fields, answer)
-            if typing_fields:
-                updates.append((note["noteId"], typing_fields))
-                typing_enabled_locked += 1
-        elif not force and anki_protect.note_has_untracked_edits(
-            fields,
-            source_fields,
-            SPANISH_PRODUCTION_FIELDS,
-            PRODUCTION_FINGERPRINT_FIELD,
+        planned.append((note, key, answer, source_fields, legacy_source_fields))
+    checks = anki_protect.fingerprint_many(
+        (
             (
-                *anki_protect.legacy_fingerprints(
-                    SPANISH_PRODUCTION_LEGACY_NAMESPACE, key
-                ),
-                anki_protect.content_fingerprint(
-                    legacy_source_fields, SPANISH_PRODUCTION_FIELDS
-                ),
-            ),
-        ):
-            invoke("addTags", notes=[note["noteId"]], tags=anki_protect.LOCKED_TAG)
-            auto_locked += 1
+                note["fields"],
+                source_fields,
+                (*anki_protect.legacy_fingerprints(SPANISH_PRODUCTION_LEGACY_NAMESPACE, key), legacy_source_fields),
+            )
+            for note, key, _, source_fields, legacy_source_fields in planned
+        ),
+        SPANISH_PRODUCTION_FIELDS,
+        PRODUCTION_FINGERPRINT_FIELD,
+    )
+    merger = anki_protect.FieldMerger.load(
+        SPANISH_PRODUCTION_LEGACY_NAMESPACE,
+        SPANISH_PRODUCTION_FIELDS,
+        fingerprint_field=PRODUCTION_FINGERPRINT_FIELD,
+    )
+    for (note, key, answer, source_fields, _), check in zip(planned, checks):
+        fields = note["fields"]
+        preserve_content = not force and anki_protect.note_is_locked(note.get("tags", []))
+        if preserve_content or (not force and check.edited):
+            if preserve_content:
+                skipped_locked += 1
+            else:
+                lock_queue.add("addTags", notes=[note["noteId"]], tags=anki_protect.LOCKED_TAG)
+                auto_locked += 1
+            merged = merger.merge(key, fields, source_fields)
             typing_fields = missing_production_answer(fields, answer)
-            if typing_fields:
-                updates.append((note["noteId"], typing_fields))
-                typing_enabled_locked += 1
+            if merged or typing_fields:
+                updates.append((note["noteId"], {**merged, **typing_fields}))
+            merged_locked += bool(merged)
+            typing_enabled_locked += bool(typing_fields)
         else:
+            merger.wrote(key, source_fields)
             updates.append(
                 (
                     note["noteId"],
@@ -923,13 +967,18 @@ def sync_spanish(
                         source_fields,
                         SPANISH_PRODUCTION_FIELDS,
                         PRODUCTION_FINGERPRINT_FIELD,
+                        check.source,
                     ),
                 )
             )
             updated += 1
+    lock_queue.flush()
     update_note_fields_many(updates)
-    notes = get_notes(f'note:"{SPANISH_MODEL}"')
-    note_cards = card_maps_for_notes(notes)
+    merger.save()
+    # The first notesInfo response lists every card except those generated
+    # by updates that filled a card's gate field.
+    note_cards, live_cards = card_maps_for_notes(notes)
+    add_generated_cards(notes_gaining_cards(notes, updates, SPANISH_CARD_GATE_FIELDS), note_cards, live_cards)
     deck_cards: Dict[str, List[int]] = {}
     active_cards: List[int] = []
     suspended_cards: List[int] = []
@@ -951,15 +1000,18 @@ def sync_spanish(
             deck_cards.setdefault(deck_name, []).append(cards[2])
             (active_cards if context_active else suspended_cards).append(cards[2])
             context_suspended += 0 if context_active else 1
-    apply_card_plan(deck_cards, active_cards, suspended_cards)
+    card_plan = apply_card_plan(deck_cards, active_cards, suspended_cards, live_cards)
     return {
         "updated_notes": updated,
         "recognition_suspended": recognition_suspended,
         "production_suspended": production_suspended,
         "context_suspended": context_suspended,
+        "card_plan": card_plan,
         "skipped_locked": skipped_locked,
         "auto_locked": auto_locked,
         "typing_enabled_locked": typing_enabled_locked,
+        "merged_locked": merged_locked,
+        "field_conflicts": merger.conflicts,
     }
 
 
@@ -1015,22 +1067,26 @@ def sync_spanish_content(review_path: Path, source_rows: List[Dict[str, str]], f
     review_rows = load_spanish_review_rows(review_path, source_rows)
     if not review_rows:
         return {"updated_notes": 0, "missing_review_rows": 0}
-    notes = get_notes(f'note:"{SPANISH_MODEL}"')
+    notes = model_notes(SPANISH_MODEL)
     updates: List[Tuple[int, Dict[str, str]]] = []
     missing = 0
     skipped_locked = 0
     auto_locked = 0
+    merged_updates: List[Tuple[int, Dict[str, str]]] = []
+    merger = anki_protect.FieldMerger.load(SPANISH_CONTENT_LEGACY_NAMESPACE, SPANISH_CONTENT_FIELDS)
+    lock_queue = anki_connect.ActionQueue(invoke, BATCH_SIZE)
     for note in notes:
-        if not force and anki_protect.note_is_locked(note.get("tags", [])):
+        locked = not force and anki_protect.note_is_locked(note.get("tags", []))
+        if locked:
             skipped_locked += 1
-            continue
         key = source_id_from_spanish_note(note["fields"])
         row = review_rows.get(key)
         if not row:
-            missing += 1
+            if not locked:
+                missing += 1
             continue
         source_fields = spanish_content_fields(row)
-        if not force and anki_protect.note_has_untracked_edits(
+        if not locked and not force and anki_protect.note_has_untracked_edits(
             note.get("fields", {}),
             source_fields,
             SPANISH_CONTENT_FIELDS,
@@ -1038,21 +1094,31 @@ def sync_spanish_content(review_path: Path, source_rows: List[Dict[str, str]], f
                 SPANISH_CONTENT_LEGACY_NAMESPACE, key
             ),
         ):
-            invoke("addTags", notes=[note["noteId"]], tags=anki_protect.LOCKED_TAG)
+            lock_queue.add("addTags", notes=[note["noteId"]], tags=anki_protect.LOCKED_TAG)
             auto_locked += 1
+            locked = True
+        if locked:
+            merged = merger.merge(key, note.get("fields", {}), source_fields)
+            if merged:
+                merged_updates.append((note["noteId"], merged))
             continue
+        merger.wrote(key, source_fields)
         updates.append(
             (
                 note["noteId"],
                 anki_protect.source_fields_with_fingerprint(source_fields, SPANISH_CONTENT_FIELDS),
             )
         )
-    update_note_fields_many(updates)
+    lock_queue.flush()
+    update_note_fields_many(updates + merged_updates)
+    merger.save()
     return {
         "updated_notes": len(updates),
         "missing_review_rows": missing,
         "skipped_locked": skipped_locked,
         "auto_locked": auto_locked,
+        "merged_locked": len(merged_updates),
+        "field_conflicts": merger.conflicts,
     }
 
 
@@ -1082,8 +1148,7 @@ def sync_english(
     notes: List[Dict[str, object]] = []
     seen_note_ids = set()
     for model_name in ENGLISH_MODELS:
-        model_note_ids = invoke("findNotes", query=f'note:"{model_name}"')
-        for note in invoke("notesInfo", notes=model_note_ids):
+        for note in model_notes(model_name):
             if note["noteId"] in seen_note_ids:
                 continue
             seen_note_ids.add(note["noteId"])
@@ -1107,6 +1172,9 @@ def sync_english(
     skipped_locked = 0
     auto_locked = 0
     typing_enabled_locked = 0
+    merged_locked = 0
+    lock_queue = anki_connect.ActionQueue(invoke, BATCH_SIZE)
+    planned = []
     for note in notes:
         key = source_id_from_english_note(note)
         order = order_map.get(key, 99999)
@@ -1146,35 +1214,41 @@ def sync_english(
             "ProductionLevel": level_for_order(order),
             "ProductionEnabled": "yes" if cue else "",
         }
+        planned.append((note, key, answer, source_fields, legacy_source_fields))
+    checks = anki_protect.fingerprint_many(
+        (
+            (
+                note.get("fields", {}),
+                source_fields,
+                (*anki_protect.legacy_fingerprints(ENGLISH_PRODUCTION_LEGACY_NAMESPACE, key), legacy_source_fields),
+            )
+            for note, key, _, source_fields, legacy_source_fields in planned
+        ),
+        ENGLISH_PRODUCTION_FIELDS,
+        PRODUCTION_FINGERPRINT_FIELD,
+    )
+    merger = anki_protect.FieldMerger.load(
+        ENGLISH_PRODUCTION_LEGACY_NAMESPACE,
+        ENGLISH_PRODUCTION_FIELDS,
+        fingerprint_field=PRODUCTION_FINGERPRINT_FIELD,
+    )
+    for (note, key, answer, source_fields, _), check in zip(planned, checks):
         fields = note.get("fields", {})
         preserve_content = not force and anki_protect.note_is_locked(note.get("tags", []))
-        if preserve_content:
-            skipped_locked += 1
-            typing_fields = missing_production_answer(fields, answer)
-            if typing_fields:
-                updates.append((note["noteId"], typing_fields))
-                typing_enabled_locked += 1
-        elif not force and anki_protect.note_has_untracked_edits(
-            fields,
-            source_fields,
-            ENGLISH_PRODUCTION_FIELDS,
-            PRODUCTION_FINGERPRINT_FIELD,
-            (
-                *anki_protect.legacy_fingerprints(
-                    ENGLISH_PRODUCTION_LEGACY_NAMESPACE, key
-                ),
-                anki_protect.content_fingerprint(
-                    legacy_source_fields, ENGLISH_PRODUCTION_FIELDS
-                ),
-            ),
-        ):
-            invoke("addTags", notes=[note["noteId"]], tags=anki_protect.LOCKED_TAG)
-            auto_locked += 1
+        if preserve_content or (not force and check.edited):
+            if preserve_content:
+                skipped_locked += 1
+            else:
+                lock_queue.add("addTags", notes=[note["noteId"]], tags=anki_protect.LOCKED_TAG)
+                auto_locked += 1
+            merged = merger.merge(key, fields, source_fields)
             typing_fields = missing_production_answer(fields, answer)
-            if typing_fields:
-                updates.append((note["noteId"], typing_fields))
-                typing_enabled_locked += 1
+            if merged or typing_fields:
+                updates.append((note["noteId"], {**merged, **typing_fields}))
+            merged_locked += bool(merged)
+            typing_enabled_locked += bool(typing_fields)
         else:
+            merger.wrote(key, source_fields)
             updates.append(
                 (
                     note["noteId"],
@@ -1182,13 +1256,16 @@ def sync_english(
                         source_fields,
                         ENGLISH_PRODUCTION_FIELDS,
                         PRODUCTION_FINGERPRINT_FIELD,
+                        check.source,
                     ),
                 )
             )
             updated += 1
+    lock_queue.flush()
     update_note_fields_many(updates)
-    notes = [note for model_name in ENGLISH_MODELS for note in get_notes(f'note:"{model_name}"')]
-    note_cards = card_maps_for_notes(notes)
+    merger.save()
+    note_cards, live_cards = card_maps_for_notes(notes)
+    add_generated_cards(notes_gaining_cards(notes, updates, ENGLISH_CARD_GATE_FIELDS), note_cards, live_cards)
     deck_cards: Dict[str, List[int]] = {}
     active_cards: List[int] = []
     suspended_cards: List[int] = []
@@ -1206,15 +1283,18 @@ def sync_english(
             deck_cards.setdefault(deck_name, []).append(cards[1])
             (active_cards if production_active else suspended_cards).append(cards[1])
             production_suspended += 0 if production_active else 1
-    apply_card_plan(deck_cards, active_cards, suspended_cards)
+    card_plan = apply_card_plan(deck_cards, active_cards, suspended_cards, live_cards)
     return {
         "updated_notes": updated,
         "missing_cues": missing_cues,
         "recognition_suspended": recognition_suspended,
         "production_suspended": production_suspended,
+        "card_plan": card_plan,
         "skipped_locked": skipped_locked,
         "auto_locked": auto_locked,
         "typing_enabled_locked": typing_enabled_locked,
+        "merged_locked": merged_locked,
+        "field_conflicts": merger.conflicts,
     }
 
 
@@ -1233,6 +1313,11 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument("--spanish-review", default=str(SPANISH_REVIEW_PATH))
     parser.add_argument("--force", action="store_true", help="Overwrite notes even if tagged locked (manual edits).")
     parser.add_argument("--update-models", action="store_true", help="Replace existing production templates and CSS.")
+    parser.add_argument(
+        "--refresh-mirror",
+        action="store_true",
+        help="Ignore the local note mirror and refetch every note from Anki.",
+    )
     return parser.parse_args()
 
 
@@ -1242,6 +1327,8 @@ def main() -> int:
     if args.cleanup_old_decks_only:
         print(json.dumps({"deleted_empty_source_decks": cleanup_empty_source_decks()}, ensure_ascii=False, indent=2))
         return 0
+    if args.refresh_mirror:
+        anki_mirror.invalidate(SPANISH_MODEL, *ENGLISH_MODELS)
     source_rows = spanish_deck.parse_source_deck(args.source)
     order_map = difficulty_order(source_rows)
     ensure_models(update_existing=args.update_models)
@@ -1273,6 +1360,7 @@ def main() -> int:
             sense_rows=turkish_rows,
         )
     result["deleted_empty_source_decks"] = cleanup_empty_source_decks()
+    result["anki_requests"] = anki_connect.request_stats()
     print(json.dumps(result, ensure_ascii=False, indent=2))
     return 0
 
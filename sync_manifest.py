@@ -0,0 +1,87 @@
+"""Per-deck manifest of the source rows written by the last successful sync.
+
+The manifest maps each ``SourceID`` to a fingerprint of its TSV row.  A later
+sync only needs to send rows that are new, changed, or missing from Anki;
+rows whose fingerprint still matches were already written and are skipped
+before any per-row AnkiConnect work.  Rows whose content was preserved (for
+example locked notes) are never recorded, so they are rechecked every run.
+
+The manifest is local state: delete it or pass ``--full`` to a sync script to
+force a full pass.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+from pathlib import Path
+
+MANIFEST_DIR = Path(__file__).resolve().parent / "generated" / "anki_state"
+MANIFEST_VERSION = 1
+
+
+def row_fingerprint(row: dict, field_names) -> str:
+    values = [row.get(name, "") for name in field_names]
+    payload = json.dumps(values, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def manifest_path(namespace: str) -> Path:
+    return MANIFEST_DIR / f"{namespace}.manifest.json"
+
+
+def _fields_key(field_names) -> str:
+    return row_fingerprint({name: name for name in field_names}, field_names)
+
+
+def load_manifest(namespace: str, field_names) -> dict[str, str]:
+    """Return SourceID -> row fingerprint, or {} when missing or outdated."""
+    path = manifest_path(namespace)
+    if not path.exists():
+        return {}
+    try:
+        with path.open(encoding="utf-8") as handle:
+            payload = json.load(handle)
+    except (OSError, ValueError):
+        return {}
+    if payload.get("version") != MANIFEST_VERSION or payload.get("fields") != _fields_key(field_names):
+        return {}
+    rows = payload.get("rows")
+    return rows if isinstance(rows, dict) else {}
+
+
+def save_manifest(namespace: str, field_names, fingerprints: dict[str, str]) -> None:
+    path = manifest_path(namespace)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {
+        "version": MANIFEST_VERSION,
+        "fields": _fields_key(field_names),
+        "rows": dict(sorted(fingerprints.items())),
+    }
+    temporary = path.with_suffix(".tmp")
+    with temporary.open("w", encoding="utf-8") as handle:
+        json.dump(payload, handle, ensure_ascii=False, separators=(",", ":"))
+    os.replace(temporary, path)
+
+
+def plan_rows(rows: list[dict], previous: dict[str, str], existing_source_ids, field_names):
+    """Split rows into the ones to send and the manifest entries to carry over.
+
+    A row is sent when it is new to the manifest, its fingerprint changed, or
+    its note is missing from Anki.  Returns ``(pending, fingerprints, carried,
+    removed)`` where ``fingerprints`` covers every current row and ``removed``
+    counts manifest entries whose SourceID left the TSV.  Those entries are
+    not carried, so they must not be saved back.
+    """
+    fingerprints = {row["SourceID"]: row_fingerprint(row, field_names) for row in rows}
+    pending = []
+    carried = {}
+    for row in rows:
+        source_id = row["SourceID"]
+        if source_id in existing_source_ids and previous.get(source_id) == fingerprints[source_id]:
+            carried[source_id] = fingerprints[source_id]
+        else:
+            pending.append(row)
+    removed = sum(1 for source_id in previous if source_id not in fingerprints)
+    return pending, fingerprints, carried, removed
@@ -1,14 +1,15 @@
 import argparse
-import base64
 import csv
 import json
-import subprocess
-import time
-import urllib.request
+from collections import Counter
 from pathlib import Path
 
 
+import anki_connect
+import anki_mirror
 import anki_protect
+import media_cache
+import sync_manifest
 
 
 MODEL_NAME = "Spanish Core Learning"
@@ -161,17 +162,7 @@ BACK_TEMPLATE = """
 
 
 def invoke(action, **params):
-    payload = json.dumps({"action": action, "params": params, "version": 6}).encode("utf-8")
-    request = urllib.request.Request("http://127.0.0.1:8765", payload)
-    for attempt in range(3):
-        with urllib.request.urlopen(request, timeout=60) as response:
-            result = json.loads(response.read().decode("utf-8"))
-        if not result.get("error"):
-            return result["result"]
-        if result["error"] != "collection is not available" or attempt == 2:
-            raise RuntimeError(result["error"])
-        time.sleep(2)
-    raise RuntimeError("collection is not available")
+    return anki_connect.invoke(action, **params)
 
 
 def ensure_model(update_existing=False):
@@ -209,11 +200,8 @@ def load_rows(path):
 
 
 def load_existing_notes():
-    note_ids = invoke("findNotes", query=f'note:"{MODEL_NAME}"')
-    if not note_ids:
-        return {}
     existing = {}
-    for note in invoke("notesInfo", notes=note_ids):
+    for note in anki_mirror.model_notes(invoke, MODEL_NAME):
         fields = note.get("fields", {})
         source_id = fields.get("SourceID", {}).get("value", "")
         if source_id:
@@ -228,53 +216,100 @@ def strip_audio(row):
         row["Audio"] = ""
 
 
-def store_audio(row):
+def store_audio(row, cache=None, uploader=None):
     audio_url = row.get("AudioURL", "")
-    audio = row.get("Audio", "")
-    if not audio_url or not audio.startswith("[sound:"):
-        return
-    filename = audio.removeprefix("[sound:").removesuffix("]")
+    filename = media_cache.audio_filename(row)
+    if not audio_url or not filename:
+        return False
+    uploader = uploader or media_cache.MediaUploader(invoke)
+    if uploader.skip(filename):
+        return True
+    path = (cache or media_cache.MediaCache()).fetch(filename, audio_url)
     try:
-        result = subprocess.run(
-            ["curl", "-fsSL", "--max-time", "15", "--retry", "1", "-A", "Mozilla/5.0", audio_url],
-            check=True,
-            capture_output=True,
-            timeout=20,
-        )
-        audio_data = result.stdout
-        invoke("storeMediaFile", filename=filename, data=base64.b64encode(audio_data).decode("ascii"))
-    except (OSError, RuntimeError, subprocess.CalledProcessError) as error:
+        if path is None:
+            raise OSError("download failed")
+        uploader.store(filename, path)
+        return True
+    except (OSError, RuntimeError) as error:
         print(f"Audio skipped for {row.get('SourceID')}: {error}")
         strip_audio(row)
+        return False
 
 
 def sync_media(rows):
     audio_rows = [row for row in rows if row.get("AudioURL")]
-    existing_media = set(invoke("getMediaFilesNames", pattern="tatoeba_spa_*.mp3"))
+    inventory = media_cache.MediaInventory.load(invoke)
+    cache = media_cache.MediaCache()
+    cache.fetch_rows(audio_rows, skip=inventory)
+    uploader = media_cache.MediaUploader(invoke, inventory=inventory)
     stored = 0
     skipped = 0
     for index, row in enumerate(audio_rows, start=1):
-        filename = row.get("Audio", "").removeprefix("[sound:").removesuffix("]")
-        if filename in existing_media:
+        if uploader.skip(media_cache.audio_filename(row)):
             skipped += 1
             continue
-        store_audio(row)
+        store_audio(row, cache, uploader)
         stored += 1
         if index % 25 == 0:
             print(f"Processed {index}/{len(audio_rows)} audio rows...", flush=True)
-    return {"audio_rows": len(audio_rows), "stored": stored, "skipped_existing": skipped}
+    return {
+        "audio_rows": len(audio_rows),
+        "stored": stored,
+        "skipped_existing": skipped,
+        "upload": uploader.summary(),
+    }
 
 
-def sync_rows(rows, store_media=True, force=False):
-    created = 0
-    updated = 0
-    moved = 0
+def sync_rows(rows, store_media=True, force=False, batch_size=anki_connect.MULTI_BATCH_SIZE, full=False):
+    tally = Counter()
     skipped_locked = 0
-    auto_locked = 0
     existing_notes = load_existing_notes()
-    for deck_name in sorted({row["DeckPath"] for row in rows}):
+    previous = {} if full or force else sync_manifest.load_manifest(LEGACY_FINGERPRINT_NAMESPACE, FIELDS)
+    pending, fingerprints, synced, removed = sync_manifest.plan_rows(
+        rows, previous, existing_notes, FIELDS
+    )
+    merger = anki_protect.FieldMerger.load(LEGACY_FINGERPRINT_NAMESPACE, CONTENT_FIELDS)
+    for row in rows:
+        # Carried rows were last written exactly as they appear in the TSV.
+        if row["SourceID"] in synced:
+            merger.seed(row["SourceID"], row)
+    # The manifest only skips field writes; every existing note still gets
+    # its deck checked.
+    deck_moves = anki_connect.plan_deck_moves(invoke, rows, existing_notes)
+    carried = set(synced)
+    queue = anki_connect.ActionQueue(invoke, batch_size)
+    cache = media_cache.MediaCache()
+    inventory = media_cache.MediaInventory.load(invoke) if store_media else None
+    uploader = media_cache.MediaUploader(invoke, inventory=inventory)
+    if store_media:
+        cache.fetch_rows(pending, skip=inventory)
+
+    def written(counter, source_id, fingerprint):
+        def record(_result):
+            tally.update([counter])
+            if fingerprint:
+                synced[source_id] = fingerprint
+        return record
+
+    for row in rows:
+        existing = existing_notes.get(row["SourceID"])
+        if row["SourceID"] not in carried or anki_protect.note_is_locked(existing.get("tags", [])):
+            continue
+        source_fields = {field: row.get(field, "") for field in FIELDS}
+        if anki_protect.note_edited_since_sync(
+            existing, source_fields, CONTENT_FIELDS, LEGACY_FINGERPRINT_NAMESPACE, row["SourceID"]
+        ):
+            # Lock hand edits now so a later TSV change cannot overwrite them.
+            queue.add(
+                "addTags",
+                lambda _: tally.update(["auto_locked"]),
+                notes=[existing["noteId"]],
+                tags=anki_protect.LOCKED_TAG,
+            )
+            del synced[row["SourceID"]]
+    for deck_name in sorted({row["DeckPath"] for row in pending}):
         invoke("createDeck", deck=deck_name)
-    for index, row in enumerate(rows, start=1):
+    for index, row in enumerate(pending, start=1):
         deck_name = row["DeckPath"]
         existing = existing_notes.get(row["SourceID"])
         source_fields = {field: row.get(field, "") for field in FIELDS}
@@ -285,32 +320,46 @@ def sync_rows(rows, store_media=True, force=False):
             if not force and anki_protect.note_is_locked(tags):
                 skipped_locked += 1
                 preserve_content = True
-            elif not force and anki_protect.note_has_untracked_edits(
-                existing.get("fields", {}),
-                source_fields,
-                CONTENT_FIELDS,
-                legacy_fingerprints=anki_protect.legacy_fingerprints(
-                    LEGACY_FINGERPRINT_NAMESPACE, row["SourceID"]
-                ),
+            elif not force and anki_protect.note_edited_since_sync(
+                existing, source_fields, CONTENT_FIELDS, LEGACY_FINGERPRINT_NAMESPACE, row["SourceID"]
             ):
-                invoke("addTags", notes=[note_id], tags=anki_protect.LOCKED_TAG)
-                auto_locked += 1
+                queue.add(
+                    "addTags",
+                    lambda _: tally.update(["auto_locked"]),
+                    notes=[note_id],
+                    tags=anki_protect.LOCKED_TAG,
+                )
                 preserve_content = True
-        if store_media and not preserve_content:
-            store_audio(row)
+        if preserve_content:
+            merged = merger.merge(row["SourceID"], existing.get("fields", {}), source_fields)
+            if merged:
+                queue.add(
+                    "updateNoteFields",
+                    lambda _: tally.update(["merged_locked"]),
+                    note={"id": note_id, "fields": merged},
+                )
+        elif store_media:
+            store_audio(row, cache, uploader)
             source_fields = {field: row.get(field, "") for field in FIELDS}
         fields = anki_protect.source_fields_with_fingerprint(source_fields, CONTENT_FIELDS)
-        if existing:
-            if not preserve_content:
-                invoke("updateNoteFields", note={"id": note_id, "fields": fields})
-                updated += 1
-            card_ids = invoke("findCards", query=f"nid:{note_id}")
-            if card_ids:
-                invoke("changeDeck", cards=card_ids, deck=deck_name)
-                moved += len(card_ids)
-        else:
-            invoke(
+        if not preserve_content:
+            merger.wrote(row["SourceID"], source_fields)
+        # Record the row only if it was written exactly as it appears in the
+        # TSV; rows whose audio was stripped or skipped are retried next run.
+        fingerprint = fingerprints[row["SourceID"]]
+        if (not store_media and row.get("AudioURL")) or sync_manifest.row_fingerprint(row, FIELDS) != fingerprint:
+            fingerprint = None
+        record = written("updated" if existing else "created", row["SourceID"], fingerprint)
+        if existing and not preserve_content:
+            queue.add(
+                "updateNoteFields",
+                record,
+                note={"id": note_id, "fields": fields},
+            )
+        elif not existing:
+            queue.add(
                 "addNote",
+                record,
                 note={
                     "deckName": deck_name,
                     "modelName": MODEL_NAME,
@@ -319,15 +368,34 @@ def sync_rows(rows, store_media=True, force=False):
                     "tags": row["Tags"].split(),
                 },
             )
-            created += 1
         if index % 100 == 0:
-            print(f"Synced {index}/{len(rows)} rows...")
+            print(f"Synced {index}/{len(pending)} changed rows...")
+    for deck_name, card_ids in sorted(deck_moves.items()):
+        queue.add(
+            "changeDeck",
+            lambda _, moved=len(card_ids): tally.update(moved_cards=moved),
+            cards=card_ids,
+            deck=deck_name,
+        )
+    queue.flush()
+    # Removed SourceIDs leave the manifest, so a row that comes back is written again.
+    sync_manifest.save_manifest(
+        LEGACY_FINGERPRINT_NAMESPACE,
+        FIELDS,
+        {source_id: fingerprint for source_id, fingerprint in synced.items() if source_id in fingerprints},
+    )
+    merger.save()
     return {
-        "created": created,
-        "updated": updated,
-        "moved_cards": moved,
+        "created": tally["created"],
+        "updated": tally["updated"],
+        "moved_cards": tally["moved_cards"],
         "skipped_locked": skipped_locked,
-        "auto_locked": auto_locked,
+        "auto_locked": tally["auto_locked"],
+        "merged_locked": tally["merged_locked"],
+        "field_conflicts": merger.conflicts,
+        "unchanged_skipped": len(rows) - len(pending),
+        "removed_rows": removed,
+        "media_upload": uploader.summary(),
     }
 
 
@@ -343,7 +411,7 @@ def prune_stale_notes(valid_source_ids):
         source_id = fields.get("SourceID", {}).get("value", "")
         if not source_id or source_id in valid_source_ids:
             continue
-        stored = fields.get(anki_protect.FINGERPRINT_FIELD, {}).get("value", "")
+        stored = anki_protect.stored_fingerprint(fields)
         if not stored:
             continue
         if anki_protect.content_fingerprint(fields, CONTENT_FIELDS) != stored:
@@ -363,6 +431,22 @@ def parse_args(argv=None):
     parser.add_argument("--media-only", action="store_true", help="Only store audio media from the TSV.")
     parser.add_argument("--update-model", action="store_true", help="Replace the existing note template and CSS.")
     parser.add_argument("--force", action="store_true", help="Overwrite notes even if tagged locked (manual edits).")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Send every TSV row, ignoring the manifest of rows written by the last sync.",
+    )
+    parser.add_argument(
+        "--refresh-mirror",
+        action="store_true",
+        help="Ignore the local note mirror and refetch every note from Anki.",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=anki_connect.MULTI_BATCH_SIZE,
+        help="Number of note writes sent per AnkiConnect multi request.",
+    )
     return parser.parse_args(argv)
 
 
@@ -370,11 +454,14 @@ def main(argv=None):
     args = parse_args(argv)
     invoke("version")
     ensure_model(update_existing=args.update_model)
+    if args.refresh_mirror:
+        anki_mirror.invalidate(MODEL_NAME)
     rows = load_rows(args.path)
     if args.media_only:
-        print(json.dumps({"media": sync_media(rows)}, ensure_ascii=False, indent=2))
+        media = sync_media(rows)
+        print(json.dumps({"media": media, "anki_requests": anki_connect.request_stats()}, ensure_ascii=False, indent=2))
         return 0
-    result = sync_rows(rows, store_media=not args.skip_media, force=args.force)
+    result = sync_rows(rows, store_media=not args.skip_media, force=args.force, batch_size=args.batch_size, full=args.full)
     pruned = prune_stale_notes({row["SourceID"] for row in rows}) if args.prune_stale else 0
     print(
         json.dumps(
@@ -382,6 +469,7 @@ def main(argv=None):
                 "synced": result,
                 "pruned_stale_notes": pruned,
                 "rows": len(rows),
+                "anki_requests": anki_connect.request_stats(),
             },
             ensure_ascii=False,
             indent=2,
@@ -0,0 +1,403 @@
+"""Indexed SQLite copy of the Tatoeba dumps used for sentence mining.
+
+Spanish Core and English Mastery used to decompress ``spa_sentences.tsv.bz2``,
+``eng_sentences.tsv.bz2``, ``sentences_with_audio.tar.bz2`` and the links
+archive on every selection cache miss, holding whole sentence dicts in memory.
+``ingest`` converts the dumps once into ``corpus.sqlite3`` next to them:
+sentences by language in dump order, Spanish-English links oriented as
+``(spa_id, eng_id)`` in dump order, and audio metadata keyed by sentence ID.
+Mining code streams rows from the store with bounded memory.
+
+The store is rebuilt automatically when a dump's size or modification time
+changes, and it keeps working after the dumps are deleted.  Ingesting needs
+both sentence dumps; a partial set never replaces an existing store.  Run
+``python3 tatoeba_store.py`` to ingest ahead of time.
+
+``SelectionFile`` reads the small selected-sentence TSVs mined from the
+store into compact ``SelectionRow`` objects, and records a marker once a
+file's rows have passed validation so unchanged files are not re-checked.
+"""
+
+from __future__ import annotations
+
+import argparse
+import bz2
+import csv
+import hashlib
+import io
+import json
+import os
+import sqlite3
+import tarfile
+from collections import deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+from typing import Callable, Iterable, Iterator
+
+TATOEBA_DIR = Path("generated/sources/tatoeba")
+STORE_NAME = "corpus.sqlite3"
+# Validated-cache markers are written next to their TSV unless this is set.
+MARKER_DIR: Path | None = None
+STORE_VERSION = "1"
+SENTENCE_DUMPS = ("spa_sentences.tsv.bz2", "eng_sentences.tsv.bz2")
+AUDIO_DUMP = "sentences_with_audio.tar.bz2"
+LINK_DUMPS = ("spa-eng_links.tsv.bz2", "links.tar.bz2")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS sentences (
+    seq INTEGER PRIMARY KEY,
+    id TEXT NOT NULL UNIQUE,
+    lang TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sentences_lang ON sentences (lang, seq);
+CREATE TABLE IF NOT EXISTS audio (
+    sentence_id TEXT PRIMARY KEY,
+    audio_id TEXT NOT NULL,
+    contributor TEXT,
+    license TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS links (
+    seq INTEGER PRIMARY KEY,
+    spa_id TEXT NOT NULL,
+    eng_id TEXT NOT NULL
+);
+"""
+
+
+class TatoebaStore:
+    """Read-only queries over an ingested corpus."""
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        self.db = sqlite3.connect(self.path)
+
+    def __enter__(self) -> "TatoebaStore":
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.db.close()
+
+    def meta(self, key: str) -> str | None:
+        row = self.db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def has_sentences(self, lang: str) -> bool:
+        row = self.db.execute("SELECT 1 FROM sentences WHERE lang = ? LIMIT 1", (lang,)).fetchone()
+        return row is not None
+
+    def has_links(self) -> bool:
+        return self.meta("links") == "1"
+
+    def seq_range(self, table: str, lang: str | None = None) -> tuple[int, int]:
+        """Return ``(first, stop)`` sequence numbers of ``sentences`` or ``links`` rows."""
+        where = " WHERE lang = ?" if lang else ""
+        first, last = self.db.execute(
+            f"SELECT MIN(seq), MAX(seq) FROM {table}{where}", (lang,) if lang else ()
+        ).fetchone()
+        return (first, last + 1) if first is not None else (0, 0)
+
+    def sentences(
+        self, lang: str, start: int | None = None, stop: int | None = None
+    ) -> Iterator[tuple[str, str, str | None]]:
+        """Yield ``(id, text, audio_id or None)`` in dump order, optionally by seq range."""
+        yield from self.db.execute(
+            "SELECT s.id, s.text, a.audio_id FROM sentences s"
+            " LEFT JOIN audio a ON a.sentence_id = s.id"
+            " WHERE s.lang = ? AND s.seq >= ? AND s.seq < ? ORDER BY s.seq",
+            (lang, *_bounds(start, stop)),
+        )
+
+    def spa_eng_pairs(self, start: int | None = None, stop: int | None = None) -> Iterator[tuple]:
+        """Yield ``(spa_id, spa_text, eng_id, eng_text, audio_id, contributor, license)``.
+
+        Rows follow the links dump order, optionally limited to a seq range.
+        Audio columns are None when the Spanish sentence has no audio row with
+        a contributor column.
+        """
+        yield from self.db.execute(
+            "SELECT l.spa_id, s.text, l.eng_id, e.text, a.audio_id, a.contributor, a.license"
+            " FROM links l"
+            " JOIN sentences s ON s.id = l.spa_id"
+            " JOIN sentences e ON e.id = l.eng_id"
+            " LEFT JOIN audio a ON a.sentence_id = l.spa_id AND a.contributor IS NOT NULL"
+            " WHERE l.seq >= ? AND l.seq < ?"
+            " ORDER BY l.seq",
+            _bounds(start, stop),
+        )
+
+
+def _bounds(start: int | None, stop: int | None) -> tuple[int, int]:
+    return (-(2**63) if start is None else start, 2**63 - 1 if stop is None else stop)
+
+
+def seq_chunks(first: int, stop: int, chunks: int) -> list[tuple[int, int]]:
+    """Split ``[first, stop)`` into at most ``chunks`` contiguous ranges."""
+    size = max(1, -(-(stop - first) // max(1, chunks)))
+    return [(start, min(start + size, stop)) for start in range(first, stop, size)]
+
+
+def map_ordered(function: Callable, arguments: Iterable[tuple], jobs: int) -> Iterator:
+    """Yield ``function(*args)`` for each argument tuple, in order, from a process pool.
+
+    At most ``2 * jobs`` calls are in flight, so a consumer that stops early
+    wastes little work; calls not yet started are cancelled.
+    """
+    arguments = iter(arguments)
+    with ProcessPoolExecutor(max_workers=max(1, jobs)) as pool:
+        pending = deque(pool.submit(function, *args) for args in islice(arguments, 2 * max(1, jobs)))
+        try:
+            while pending:
+                result = pending.popleft().result()
+                for args in islice(arguments, 1):
+                    pending.append(pool.submit(function, *args))
+                yield result
+        finally:
+            for future in pending:
+                future.cancel()
+
+
+class SelectionRow(Mapping):
+    """Read-only row of a selection TSV.
+
+    Values live in a tuple and column names in an index shared by every row
+    of the file, so rows are cheap to hold yet read like the ``csv.DictReader``
+    dicts they replace.
+    """
+
+    __slots__ = ("_columns", "_values")
+
+    def __init__(self, columns: dict[str, int], values: tuple):
+        self._columns = columns
+        self._values = values
+
+    def __getitem__(self, key: str):
+        return self._values[self._columns[key]]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._columns)
+
+    def __len__(self) -> int:
+        return len(self._columns)
+
+    def __repr__(self) -> str:
+        return f"SelectionRow({dict(self)!r})"
+
+    def replace(self, **changes) -> "SelectionRow":
+        values = list(self._values)
+        for key, value in changes.items():
+            values[self._columns[key]] = value
+        return SelectionRow(self._columns, tuple(values))
+
+
+class SelectionFile:
+    """A selection TSV read in one pass, plus its validated-cache marker.
+
+    The marker stores the file's SHA-256 and the caller's validation key.
+    While both match, the rows are known to have passed validation.
+    """
+
+    def __init__(self, path: str | Path):
+        self.path = Path(path)
+        data = self.path.read_bytes()
+        self.digest = hashlib.sha256(data).hexdigest()
+        reader = csv.reader(io.StringIO(data.decode("utf-8"), newline=""), delimiter="\t")
+        header = next(reader, [])
+        columns = {name: index for index, name in enumerate(header)}
+        width = len(header)
+        self.rows = [
+            SelectionRow(columns, tuple(values[:width]) + (None,) * (width - len(values)))
+            for values in reader
+            if values
+        ]
+
+    @property
+    def marker_path(self) -> Path:
+        return (MARKER_DIR or self.path.parent) / f"{self.path.name}.validated.json"
+
+    def validated(self, key: str) -> bool:
+        try:
+            marker = json.loads(self.marker_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return False
+        return marker == {"sha256": self.digest, "key": key}
+
+    def mark_validated(self, key: str) -> None:
+        self.marker_path.write_text(json.dumps({"sha256": self.digest, "key": key}), encoding="utf-8")
+
+
+def validation_key(*parts) -> str:
+    """Hash the JSON-serialisable inputs that decide whether cached rows are valid."""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def store_path(directory: str | Path = TATOEBA_DIR) -> Path:
+    return Path(directory) / STORE_NAME
+
+
+def source_signature(directory: str | Path = TATOEBA_DIR) -> str:
+    """Size and mtime of every dump present, so changed dumps trigger a rebuild."""
+    directory = Path(directory)
+    signature = {}
+    for name in (*SENTENCE_DUMPS, AUDIO_DUMP, *LINK_DUMPS):
+        path = directory / name
+        if path.exists():
+            stat = path.stat()
+            signature[name] = [stat.st_size, stat.st_mtime_ns]
+    return json.dumps(signature, sort_keys=True)
+
+
+def has_sentence_dumps(directory: str | Path = TATOEBA_DIR) -> bool:
+    """Whether every sentence dump is present, the minimum worth ingesting."""
+    return all((Path(directory) / name).exists() for name in SENTENCE_DUMPS)
+
+
+def corpus_available(directory: str | Path = TATOEBA_DIR) -> bool:
+    """Whether ``open_corpus`` would return a store, without ingesting anything."""
+    if has_sentence_dumps(directory):
+        return True
+    path = store_path(directory)
+    if not path.exists():
+        return False
+    with TatoebaStore(path) as store:
+        return store.meta("version") == STORE_VERSION
+
+
+def open_corpus(directory: str | Path = TATOEBA_DIR) -> TatoebaStore | None:
+    """Open the store, ingesting first when it is missing or older than the dumps.
+
+    Only a full set of sentence dumps is ingested.  With a partial set, such as
+    the links dump alone, an existing store is kept as it is and a missing one
+    stays missing.
+    """
+    directory = Path(directory)
+    path = store_path(directory)
+    can_ingest = has_sentence_dumps(directory)
+    if path.exists():
+        store = TatoebaStore(path)
+        current = store.meta("version") == STORE_VERSION and (
+            not can_ingest or store.meta("sources") == source_signature(directory)
+        )
+        if current:
+            return store
+        store.close()
+    if not can_ingest:
+        return None
+    ingest(directory)
+    return TatoebaStore(path)
+
+
+def _read_sentence_dump(path: Path) -> Iterator[tuple[str, str, str]]:
+    with bz2.open(path, "rt", encoding="utf-8", newline="") as handle:
+        for row in csv.reader(handle, delimiter="\t"):
+            if len(row) >= 3:
+                yield row[0], row[1], row[2]
+
+
+def _read_tar_tsv(path: Path, member: str) -> Iterator[list[str]]:
+    with tarfile.open(path, "r:bz2") as archive:
+        handle = archive.extractfile(member)
+        if handle is None:
+            return
+        yield from csv.reader(io.TextIOWrapper(handle, encoding="utf-8", newline=""), delimiter="\t")
+
+
+def _read_audio_dump(path: Path) -> Iterator[tuple[str, str, str | None, str]]:
+    for row in _read_tar_tsv(path, "sentences_with_audio.csv"):
+        if len(row) < 2:
+            continue
+        contributor = None
+        if len(row) >= 3:
+            contributor = "" if row[2] == r"\N" else row[2]
+        license = "" if len(row) < 4 or row[3] == r"\N" else row[3]
+        yield row[0], row[1], contributor, license
+
+
+def _read_link_dump(path: Path) -> Iterator[list[str]]:
+    if path.name.endswith(".tsv.bz2"):
+        with bz2.open(path, "rt", encoding="utf-8", newline="") as handle:
+            yield from csv.reader(handle, delimiter="\t")
+    else:
+        yield from _read_tar_tsv(path, "links.csv")
+
+
+def ingest(directory: str | Path = TATOEBA_DIR) -> dict[str, int]:
+    """Rebuild the store from whichever dumps exist and return row counts."""
+    directory = Path(directory)
+    path = store_path(directory)
+    temporary = path.with_suffix(".tmp")
+    if temporary.exists():
+        temporary.unlink()
+    db = sqlite3.connect(temporary)
+    try:
+        db.execute("PRAGMA journal_mode = OFF")
+        db.execute("PRAGMA synchronous = OFF")
+        db.executescript(SCHEMA)
+        with db:
+            for name in SENTENCE_DUMPS:
+                if (directory / name).exists():
+                    db.executemany(
+                        "INSERT OR REPLACE INTO sentences (id, lang, text) VALUES (?, ?, ?)",
+                        _read_sentence_dump(directory / name),
+                    )
+            if (directory / AUDIO_DUMP).exists():
+                db.executemany(
+                    "INSERT OR REPLACE INTO audio (sentence_id, audio_id, contributor, license)"
+                    " VALUES (?, ?, ?, ?)",
+                    _read_audio_dump(directory / AUDIO_DUMP),
+                )
+            links_path = next((directory / name for name in LINK_DUMPS if (directory / name).exists()), None)
+            if links_path is not None:
+                lang_by_id = dict(db.execute("SELECT id, lang FROM sentences WHERE lang IN ('spa', 'eng')"))
+
+                def oriented_links():
+                    for row in _read_link_dump(links_path):
+                        if len(row) < 2:
+                            continue
+                        left, right = row[0], row[1]
+                        if lang_by_id.get(left) == "spa" and lang_by_id.get(right) == "eng":
+                            yield left, right
+                        elif lang_by_id.get(right) == "spa" and lang_by_id.get(left) == "eng":
+                            yield right, left
+
+                db.executemany("INSERT INTO links (spa_id, eng_id) VALUES (?, ?)", oriented_links())
+            db.executemany(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                [
+                    ("version", STORE_VERSION),
+                    ("sources", source_signature(directory)),
+                    ("links", "1" if links_path is not None else "0"),
+                ],
+            )
+        counts = {
+            table: db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+            for table in ("sentences", "audio", "links")
+        }
+    finally:
+        db.close()
+    os.replace(temporary, path)
+    return counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest Tatoeba dumps into an indexed SQLite store.")
+    parser.add_argument("--dir", default=str(TATOEBA_DIR), help="Directory holding the Tatoeba dumps.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    counts = ingest(args.dir)
+    print(json.dumps({"store": str(store_path(args.dir)), **counts}, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
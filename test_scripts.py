@@ -1,22 +1,33 @@
 import unittest
+import bz2
 import csv
 import io
 from unittest.mock import patch, MagicMock
 import os
 import json
+import hashlib
 import html
+import http.client
 import re
+import tarfile
 import tempfile
+import threading
 from pathlib import Path
 from collections import Counter, defaultdict
+from http.server import BaseHTTPRequestHandler, HTTPServer
 
 # Import functions from scripts if possible, or we can test the CLI behavior
 # Since the scripts are mostly monolithic main blocks, we will test the key logic functions
 
 import check_word
 import get_pexels_image
+import media_cache
+import anki_connect
+import anki_mirror
 import anki_protect
 import anki_tools
+import card_catalog
+import card_validation
 import grammar_levels
 import spanish_grammar_levels
 import spanish_core_learning
@@ -24,11 +35,46 @@ import spanish_deck
 import sync_spanish_core_to_anki
 import sync_english_mastery_to_anki
 import sync_4000_production_to_anki
+import sync_manifest
+import protect_manual_edits
+import tatoeba_store
 import english_phrases
 import english_mastery
 import generate_english_turkish_cues
 
 
+_mirror_dir = tempfile.TemporaryDirectory()
+_mirror_patch = patch.object(anki_mirror, "MIRROR_PATH", Path(_mirror_dir.name) / "note_mirror.sqlite3")
+
+
+_manifest_patch = patch.object(sync_manifest, "MANIFEST_DIR", Path(_mirror_dir.name))
+_media_patch = patch.object(media_cache, "CACHE_DIR", Path(_mirror_dir.name) / "media")
+_sync_base_patch = patch.object(anki_protect, "SYNC_BASE_PATH", Path(_mirror_dir.name) / "sync_base.sqlite3")
+_legacy_index_patch = patch.object(
+    anki_protect, "LEGACY_INDEX_PATH", Path(_mirror_dir.name) / "legacy_sync_fingerprints.idx"
+)
+_marker_patch = patch.object(tatoeba_store, "MARKER_DIR", Path(_mirror_dir.name))
+
+
+def setUpModule():
+    _mirror_patch.start()
+    _manifest_patch.start()
+    _media_patch.start()
+    _sync_base_patch.start()
+    _legacy_index_patch.start()
+    _marker_patch.start()
+
+
+def tearDownModule():
+    _marker_patch.stop()
+    _legacy_index_patch.stop()
+    _sync_base_patch.stop()
+    _media_patch.stop()
+    _manifest_patch.stop()
+    _mirror_patch.stop()
+    _mirror_dir.cleanup()
+
+
 def _template_stem(text):
     cleaned = re.sub(r"\{\{c\d+::[^}]*\}\}", "", text)
     cleaned = cleaned.replace("_____", "")
@@ -105,6 +151,83 @@ class TestAnkiAutomation(unittest.TestCase):
             )
         )
 
+    def test_fingerprint_many_matches_per_note_checks(self):
+        """The bulk API keeps the stored fingerprint format and the per-note verdicts."""
+        field_names = ["Front", "Bäck \"quoted\""]
+        old_source = {"Front": "old  <b>front</b>", "Bäck \"quoted\"": "ñ\u2028\t😀"}
+        new_source = {"Front": "new front", "Bäck \"quoted\"": "back"}
+        old_fingerprint = anki_protect.content_fingerprint(old_source, field_names)
+        reference = json.dumps(
+            [[name, anki_protect.raw_collapse(old_source[name])] for name in field_names],
+            ensure_ascii=False,
+            separators=(",", ":"),
+        )
+        self.assertEqual(old_fingerprint, hashlib.sha256(reference.encode("utf-8")).hexdigest())
+
+        as_live = lambda fields: {name: {"value": value} for name, value in fields.items()}
+        notes = [
+            (as_live(old_source), new_source, (old_fingerprint,)),
+            (as_live(old_source), new_source, (old_source,)),
+            (as_live(old_source), new_source, ()),
+            (as_live(new_source), new_source, ()),
+            ({**as_live(new_source), anki_protect.FINGERPRINT_FIELD: {"value": old_fingerprint}}, new_source, ()),
+        ]
+        checks = anki_protect.fingerprint_many(notes, field_names)
+
+        self.assertEqual([check.edited for check in checks], [False, False, True, False, True])
+        self.assertEqual(
+            [check.edited for check in checks],
+            [
+                anki_protect.note_has_untracked_edits(live, source, field_names, legacy_fingerprints=tuple(
+                    item if isinstance(item, str) else anki_protect.content_fingerprint(item, field_names)
+                    for item in legacy
+                ))
+                for live, source, legacy in notes
+            ],
+        )
+        self.assertEqual(checks[1].legacy, (old_fingerprint,))
+        self.assertEqual(
+            anki_protect.source_fields_with_fingerprint(new_source, field_names, fingerprint=checks[0].source),
+            anki_protect.source_fields_with_fingerprint(new_source, field_names),
+        )
+
+    def test_protect_scan_streams_findings_and_tags_through_multi(self):
+        """Edited notes are reported per batch and locked with batched addTags actions."""
+        field_names = ["Front", "Back"]
+        written = anki_protect.source_fields_with_fingerprint({"Front": "front", "Back": "back"}, field_names)
+
+        def note(note_id, source_id, back, tags=()):
+            fields = {name: {"value": value} for name, value in written.items()}
+            fields["SourceID"] = {"value": source_id}
+            fields["Back"] = {"value": back}
+            return {"noteId": note_id, "fields": fields, "tags": list(tags)}
+
+        batches = [[note(1, "a", "back"), note(2, "b", "my back")], [note(3, "c", "edited", ["locked"]), note(4, "x", "y")]]
+        sources = {key: {"Front": "front", "Back": "back"} for key in "abc"}
+        reported = []
+        tagged = protect_manual_edits.scan_notes(
+            iter(batches),
+            lambda item: item["fields"]["SourceID"]["value"],
+            sources,
+            field_names,
+            "unused",
+            reported.append,
+        )
+
+        self.assertEqual([(2, "b", ["Back"], False), (3, "c", ["Back"], True)], tagged)
+        self.assertEqual(tagged, reported)
+
+        calls = []
+
+        def fake_invoke(action, **params):
+            calls.append((action, params))
+            return [None] * len(params["actions"])
+
+        with patch.object(protect_manual_edits, "invoke", side_effect=fake_invoke):
+            self.assertEqual(protect_manual_edits.apply_tags([(note_id, "", [], False) for note_id in range(250)]), 250)
+        self.assertEqual(["multi"], [action for action, _ in calls])
+        self.assertEqual([100, 100, 50], [len(action["params"]["notes"]) for action in calls[0][1]["actions"]])
+
     def test_legacy_manifest_covers_changed_generated_content(self):
         anki_protect.load_legacy_fingerprints.cache_clear()
         namespaces = anki_protect.load_legacy_fingerprints()
@@ -118,6 +241,227 @@ class TestAnkiAutomation(unittest.TestCase):
             for fingerprint in entries.values():
                 self.assertRegex(fingerprint, r"^[0-9a-f]{64}$")
 
+    def test_legacy_index_matches_manifest_and_rebuilds_when_json_changes(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            manifest = Path(tmp) / "legacy.json"
+            first, second, third = ("a" * 64, "b" * 64, "c" * 64)
+            manifest.write_text(
+                json.dumps({"version": 1, "namespaces": {"deck": {"1": first, "2": [third, second], "3": 7}}}),
+                encoding="utf-8",
+            )
+            path = str(manifest)
+
+            self.assertEqual(anki_protect.legacy_fingerprints("deck", "1", path), (first,))
+            self.assertEqual(anki_protect.legacy_fingerprints("deck", "2", path), (second, third))
+            self.assertEqual(anki_protect.legacy_fingerprints("deck", "3", path), ())
+            self.assertEqual(anki_protect.legacy_fingerprints("other", "1", path), ())
+            self.assertTrue(anki_protect.legacy_index_path(manifest).exists())
+
+            manifest.write_text(json.dumps({"version": 1, "namespaces": {"deck": {"4": first}}}), encoding="utf-8")
+            self.assertEqual(anki_protect.legacy_fingerprints("deck", "1", path), ())
+            self.assertEqual(anki_protect.legacy_fingerprints("deck", "4", path), (first,))
+
+            manifest.unlink()
+            self.assertEqual(anki_protect.legacy_fingerprints("deck", "4", path), (first,))
+
+    def test_anki_connect_client_reuses_connection_and_retries(self):
+        """One keep-alive socket serves every action, including busy-collection retries."""
+        connections = []
+        responses = [
+            {"result": None, "error": "collection is not available"},
+            {"result": 6, "error": None},
+            {"result": [{"result": 1, "error": None}, {"result": 2, "error": None}], "error": None},
+        ]
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                connections.append(self.client_address)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers["Content-Length"]))
+                body = json.dumps(responses.pop(0)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = HTTPServer(("127.0.0.1", 0), Handler)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        client = anki_connect.AnkiConnectClient(
+            f"http://127.0.0.1:{server.server_port}", retry_delay=0
+        )
+        try:
+            self.assertEqual(6, client.invoke("version"))
+            self.assertEqual([1, 2], client.multi([{"action": "a"}, {"action": "b"}]))
+        finally:
+            client.close()
+            server.shutdown()
+            server.server_close()
+
+        self.assertEqual(1, len(connections))
+        stats = client.stats()
+        self.assertEqual(2, stats["version"]["requests"])
+        self.assertEqual(1, stats["multi"]["requests"])
+
+    def test_action_queue_runs_every_applied_callback_before_raising(self):
+        """Anki applies all multi actions, so only the failed ones skip their callback."""
+        def fake_invoke(action, **params):
+            return [
+                {"result": 1, "error": None},
+                {"result": None, "error": "bad note"},
+                {"result": 3, "error": None},
+                {"result": None, "error": "duplicate"},
+            ]
+
+        applied = []
+        queue = anki_connect.ActionQueue(fake_invoke)
+        for name in ("a", "b", "c", "d"):
+            queue.add(name, lambda result, name=name: applied.append((name, result)))
+        with self.assertRaisesRegex(anki_connect.AnkiConnectError, "action 1: bad note; action 3: duplicate"):
+            queue.flush()
+
+        self.assertEqual([("a", 1), ("c", 3)], applied)
+        self.assertEqual(0, len(queue))
+
+    def test_note_mirror_refetches_only_changed_notes(self):
+        """A refresh pulls notesInfo only for new notes or notes whose mod changed."""
+        live = {
+            1: {"noteId": 1, "mod": 100, "tags": [], "cards": [10], "fields": {"Front": {"value": "a", "order": 0}}},
+            2: {"noteId": 2, "mod": 100, "tags": [], "cards": [20], "fields": {"Front": {"value": "b", "order": 0}}},
+        }
+        fetched = []
+
+        def fake_invoke(action, **params):
+            if action == "findNotes":
+                return sorted(live)
+            if action == "notesModTime":
+                return [{"noteId": note_id, "mod": live[note_id]["mod"]} for note_id in params["notes"]]
+            if action == "notesInfo":
+                fetched.append(list(params["notes"]))
+                return [live[note_id] for note_id in params["notes"]]
+            if action == "findCards":
+                return [card_id for note in live.values() for card_id in note["cards"]]
+            if action == "cardsToNotes":
+                return sorted({card_id // 10 for card_id in params["cards"]})
+            raise AssertionError(action)
+
+        with tempfile.TemporaryDirectory() as tmp, \
+             anki_mirror.NoteMirror(Path(tmp) / "mirror.sqlite3") as mirror:
+            mirror.notes(fake_invoke, "Model")
+            live[2] = {**live[2], "mod": 200, "fields": {"Front": {"value": "edited", "order": 0}}}
+            live[3] = {"noteId": 3, "mod": 300, "tags": [], "cards": [30], "fields": {}}
+            del live[1]
+            notes = mirror.notes(fake_invoke, "Model")
+
+        self.assertEqual([[1, 2], [2, 3]], fetched)
+        self.assertEqual([2, 3], [note["noteId"] for note in notes])
+        self.assertEqual("edited", notes[0]["fields"]["Front"]["value"])
+
+    def test_note_mirror_refetches_notes_whose_cards_changed(self):
+        """Generated or deleted cards leave mod unchanged but still refresh their note."""
+        live = {
+            note_id: {"noteId": note_id, "mod": 100, "tags": [], "cards": [note_id * 10], "fields": {}}
+            for note_id in range(1, 4)
+        }
+        fetched = []
+
+        def fake_invoke(action, **params):
+            if action == "findNotes":
+                return sorted(live)
+            if action == "notesModTime":
+                return [{"noteId": note_id, "mod": live[note_id]["mod"]} for note_id in params["notes"]]
+            if action == "notesInfo":
+                fetched.append(list(params["notes"]))
+                return [live[note_id] for note_id in params["notes"]]
+            if action == "findCards":
+                return [card_id for note in live.values() for card_id in note["cards"]]
+            if action == "cardsToNotes":
+                return sorted({card_id // 10 for card_id in params["cards"]})
+            raise AssertionError(action)
+
+        with tempfile.TemporaryDirectory() as tmp, \
+             anki_mirror.NoteMirror(Path(tmp) / "mirror.sqlite3") as mirror:
+            mirror.notes(fake_invoke, "Model")
+            live[1] = {**live[1], "cards": [10, 11]}
+            live[3] = {**live[3], "cards": []}
+            notes = mirror.notes(fake_invoke, "Model")
+
+        self.assertEqual([[1, 2, 3], [1, 3]], fetched)
+        self.assertEqual([[10, 11], [20], []], [note["cards"] for note in notes])
+
+    def test_note_mirror_iterates_cached_notes_then_prefetched_chunks(self):
+        """iter_notes yields unchanged notes first, then each refetched notesInfo chunk."""
+        live = {
+            note_id: {"noteId": note_id, "mod": 100, "tags": [], "cards": [], "fields": {"Front": {"value": str(note_id)}}}
+            for note_id in range(1, 6)
+        }
+        fetched = []
+
+        def fake_invoke(action, **params):
+            if action == "findNotes":
+                return sorted(live)
+            if action == "notesModTime":
+                return [{"noteId": note_id, "mod": live[note_id]["mod"]} for note_id in params["notes"]]
+            if action == "notesInfo":
+                fetched.append(list(params["notes"]))
+                return [live[note_id] for note_id in params["notes"]]
+            if action == "findCards":
+                return [card_id for note in live.values() for card_id in note["cards"]]
+            raise AssertionError(action)
+
+        with tempfile.TemporaryDirectory() as tmp, \
+             patch.object(anki_mirror, "NOTES_INFO_BATCH_SIZE", 2), \
+             anki_mirror.NoteMirror(Path(tmp) / "mirror.sqlite3") as mirror:
+            first = [[note["noteId"] for note in batch] for batch in mirror.iter_notes(fake_invoke, "Model")]
+            live[2] = {**live[2], "mod": 200}
+            live[4] = {**live[4], "mod": 200}
+            del live[5]
+            second = [[note["noteId"] for note in batch] for batch in mirror.iter_notes(fake_invoke, "Model")]
+            notes = mirror.notes(fake_invoke, "Model")
+
+        self.assertEqual([[1, 2], [3, 4], [5]], first)
+        self.assertEqual([[1, 3], [2, 4]], second)
+        self.assertEqual([[1, 2], [3, 4], [5], [2, 4]], fetched)
+        self.assertEqual([1, 2, 3, 4], [note["noteId"] for note in notes])
+
+    def test_media_cache_downloads_once_and_records_failures(self):
+        """Cached audio is checksum-verified and failed downloads are not retried at once."""
+        def fake_download(url, timeout=media_cache.DOWNLOAD_TIMEOUT):
+            if url.endswith("404.mp3"):
+                raise OSError("HTTP Error 404")
+            if url.endswith("short.mp3"):
+                raise http.client.IncompleteRead(b"mp3", 100)
+            return b"mp3:" + url.encode("utf-8")
+
+        items = [
+            ("tatoeba_spa_1.mp3", "https://audio.tatoeba.org/sentences/spa/1.mp3"),
+            ("tatoeba_spa_404.mp3", "https://audio.tatoeba.org/sentences/spa/404.mp3"),
+            ("tatoeba_spa_short.mp3", "https://audio.tatoeba.org/sentences/spa/short.mp3"),
+        ]
+        with tempfile.TemporaryDirectory() as tmp, \
+             patch.object(media_cache, "download", side_effect=fake_download) as mock_download, \
+             patch("builtins.print"):
+            first = media_cache.MediaCache(tmp).fetch_all(items)
+            second = media_cache.MediaCache(tmp).fetch_all(items)
+            index = json.loads((Path(tmp) / media_cache.INDEX_NAME).read_text(encoding="utf-8"))
+            cached_bytes = first["tatoeba_spa_1.mp3"].read_bytes()
+
+        self.assertEqual(3, mock_download.call_count)
+        self.assertIsNone(first["tatoeba_spa_404.mp3"])
+        self.assertIsNone(first["tatoeba_spa_short.mp3"])
+        self.assertEqual(first, second)
+        self.assertEqual(b"mp3:https://audio.tatoeba.org/sentences/spa/1.mp3", cached_bytes)
+        self.assertIn("tatoeba_spa_404.mp3", index["failures"])
+        self.assertEqual(len(cached_bytes), index["files"]["tatoeba_spa_1.mp3"]["bytes"])
+
     def test_spanish_core_sync_auto_locks_legacy_manual_edit(self):
         """Bulk sync locks and preserves a differing legacy note while still moving it."""
         row = {field: "" for field in sync_spanish_core_to_anki.FIELDS}
@@ -127,25 +471,259 @@ class TestAnkiAutomation(unittest.TestCase):
             for field, value in row.items()
         }
         live_fields["Front"] = {"value": "my edited front"}
-        note = {"noteId": 42, "fields": live_fields, "tags": []}
+        note = {"noteId": 42, "fields": live_fields, "tags": [], "cards": [420]}
+        sent = []
 
         def fake_invoke(action, **params):
-            if action == "findCards":
-                return [420]
+            if action == "multi":
+                return [fake_invoke(item["action"], **item["params"]) for item in params["actions"]]
+            sent.append((action, params))
+            if action == "cardsInfo":
+                return [{"cardId": 420, "deckName": "Spanish Core::Old"}]
             return None
 
         with patch.object(sync_spanish_core_to_anki, "load_existing_notes", return_value={"core::1": note}), \
-             patch.object(sync_spanish_core_to_anki, "invoke", side_effect=fake_invoke) as mock_invoke:
+             patch.object(sync_spanish_core_to_anki, "invoke", side_effect=fake_invoke):
             result = sync_spanish_core_to_anki.sync_rows([row], store_media=False)
 
         self.assertEqual(result["auto_locked"], 1)
         self.assertEqual(result["updated"], 0)
-        self.assertIn(
-            unittest.mock.call("addTags", notes=[42], tags=anki_protect.LOCKED_TAG),
-            mock_invoke.call_args_list,
+        self.assertIn(("addTags", {"notes": [42], "tags": anki_protect.LOCKED_TAG}), sent)
+        self.assertNotIn("updateNoteFields", [action for action, _ in sent])
+        self.assertIn(("changeDeck", {"cards": [420], "deck": "Spanish Core::A1"}), sent)
+
+    def test_mastery_sync_batches_row_writes_through_multi(self):
+        """Per-row writes are coalesced into multi requests with accurate counters."""
+        rows = []
+        existing = {}
+        for index in range(60):
+            row = {field: "" for field in sync_english_mastery_to_anki.FIELDS}
+            row.update({
+                "SourceID": f"mastery::{index}",
+                "DeckPath": "English Mastery::B2",
+                "Front": f"front {index}",
+                "Tags": "mastery",
+            })
+            rows.append(row)
+            if index < 50:
+                source_fields = {field: row[field] for field in sync_english_mastery_to_anki.FIELDS}
+                existing[row["SourceID"]] = {
+                    "noteId": index,
+                    "tags": [],
+                    "cards": [index * 10, index * 10 + 1],
+                    "fields": {
+                        name: {"value": value}
+                        for name, value in anki_protect.source_fields_with_fingerprint(
+                            source_fields, sync_english_mastery_to_anki.CONTENT_FIELDS
+                        ).items()
+                    },
+                }
+        requests = []
+
+        def fake_invoke(action, **params):
+            requests.append(action)
+            if action == "cardsInfo":
+                return [{"cardId": card_id, "deckName": "English Mastery::Old"} for card_id in params["cards"]]
+            if action == "multi":
+                return [{"result": None, "error": None} for _ in params["actions"]]
+            return None
+
+        with patch.object(sync_english_mastery_to_anki, "load_existing_notes", return_value=existing), \
+             patch.object(sync_english_mastery_to_anki, "invoke", side_effect=fake_invoke):
+            result = sync_english_mastery_to_anki.sync_rows(rows, store_media=False, batch_size=40)
+
+        self.assertEqual(10, result["created"])
+        self.assertEqual(50, result["updated"])
+        self.assertEqual(100, result["moved_cards"])
+        self.assertLessEqual(len(requests), 6)
+        self.assertEqual(["cardsInfo", "createDeck"], [action for action in requests if action != "multi"])
+
+    def test_core_resync_skips_rows_unchanged_since_last_sync(self):
+        """Only rows whose TSV content changed since the last sync reach Anki."""
+        rows = []
+        for index in range(3):
+            row = {field: "" for field in sync_spanish_core_to_anki.FIELDS}
+            row.update({
+                "SourceID": f"manifest::{index}",
+                "DeckPath": "Spanish Core::A1",
+                "Front": f"front {index}",
+                "Tags": "core",
+            })
+            rows.append(row)
+        notes = {
+            row["SourceID"]: {
+                "noteId": index,
+                "tags": [],
+                "cards": [],
+                "fields": {
+                    name: {"value": value}
+                    for name, value in anki_protect.source_fields_with_fingerprint(
+                        row, sync_spanish_core_to_anki.CONTENT_FIELDS
+                    ).items()
+                },
+            }
+            for index, row in enumerate(rows)
+        }
+
+        def fake_invoke(action, **params):
+            if action == "multi":
+                return [None for _ in params["actions"]]
+            return None
+
+        with patch.object(sync_spanish_core_to_anki, "load_existing_notes", return_value=notes), \
+             patch.object(sync_spanish_core_to_anki, "invoke", side_effect=fake_invoke):
+            first = sync_spanish_core_to_anki.sync_rows(rows, store_media=False, force=True)
+            second = sync_spanish_core_to_anki.sync_rows(rows, store_media=False)
+            rows[1] = {**rows[1], "Front": "edited front"}
+            third = sync_spanish_core_to_anki.sync_rows(rows[:2], store_media=False)
+            full = sync_spanish_core_to_anki.sync_rows(rows[:2], store_media=False, full=True)
+
+        self.assertEqual(3, first["updated"])
+        self.assertEqual(0, second["updated"])
+        self.assertEqual(3, second["unchanged_skipped"])
+        self.assertEqual(1, third["updated"])
+        self.assertEqual(1, third["unchanged_skipped"])
+        self.assertEqual(1, third["removed_rows"])
+        self.assertEqual(0, full["unchanged_skipped"])
+
+    def test_core_resync_writes_row_removed_and_re_added(self):
+        """A SourceID that leaves the TSV leaves the manifest, so it is written when it returns."""
+        rows = []
+        for index in range(2):
+            row = {field: "" for field in sync_spanish_core_to_anki.FIELDS}
+            row.update({"SourceID": f"removed::{index}", "DeckPath": "Spanish Core::A1", "Front": str(index), "Tags": "core"})
+            rows.append(row)
+        notes = {
+            row["SourceID"]: {
+                "noteId": index,
+                "tags": [],
+                "cards": [],
+                "fields": {
+                    name: {"value": value}
+                    for name, value in anki_protect.source_fields_with_fingerprint(
+                        row, sync_spanish_core_to_anki.CONTENT_FIELDS
+                    ).items()
+                },
+            }
+            for index, row in enumerate(rows)
+        }
+
+        def fake_invoke(action, **params):
+            if action == "multi":
+                return [None for _ in params["actions"]]
+            return None
+
+        with patch.object(sync_spanish_core_to_anki, "load_existing_notes", return_value=notes), \
+             patch.object(sync_spanish_core_to_anki, "invoke", side_effect=fake_invoke):
+            sync_spanish_core_to_anki.sync_rows(rows, store_media=False, force=True)
+            removed = sync_spanish_core_to_anki.sync_rows(rows[:1], store_media=False)
+            manifest = sync_manifest.load_manifest(
+                sync_spanish_core_to_anki.LEGACY_FINGERPRINT_NAMESPACE, sync_spanish_core_to_anki.FIELDS
+            )
+            re_added = sync_spanish_core_to_anki.sync_rows(rows, store_media=False)
+
+        self.assertEqual(1, removed["removed_rows"])
+        self.assertEqual(["removed::0"], list(manifest))
+        self.assertEqual(1, re_added["updated"])
+        self.assertEqual(1, re_added["unchanged_skipped"])
+
+    def test_core_resync_still_moves_and_locks_unchanged_rows(self):
+        """Manifest-skipped rows keep deck moves and untracked-edit locking."""
+        row = {field: "" for field in sync_spanish_core_to_anki.FIELDS}
+        row.update({"SourceID": "carried::1", "DeckPath": "Spanish Core::A1", "Front": "front", "Tags": "core"})
+        fields = {
+            name: {"value": value}
+            for name, value in anki_protect.source_fields_with_fingerprint(
+                row, sync_spanish_core_to_anki.CONTENT_FIELDS
+            ).items()
+        }
+        note = {"noteId": 7, "tags": [], "cards": [70], "fields": fields}
+        deck = {"name": "Spanish Core::A1"}
+        sent = []
+
+        def fake_invoke(action, **params):
+            if action == "multi":
+                return [fake_invoke(item["action"], **item["params"]) for item in params["actions"]]
+            sent.append((action, params))
+            if action == "cardsInfo":
+                return [{"cardId": 70, "deckName": deck["name"]}]
+            return None
+
+        with patch.object(sync_spanish_core_to_anki, "load_existing_notes", return_value={"carried::1": note}), \
+             patch.object(sync_spanish_core_to_anki, "invoke", side_effect=fake_invoke):
+            sync_spanish_core_to_anki.sync_rows([row], store_media=False, force=True)
+            deck["name"] = "Spanish Core::Old"
+            fields["Front"] = {"value": "my edited front"}
+            sent.clear()
+            result = sync_spanish_core_to_anki.sync_rows([row], store_media=False)
+            manifest = sync_manifest.load_manifest(
+                sync_spanish_core_to_anki.LEGACY_FINGERPRINT_NAMESPACE, sync_spanish_core_to_anki.FIELDS
+            )
+
+        self.assertEqual(1, result["unchanged_skipped"])
+        self.assertEqual(1, result["moved_cards"])
+        self.assertEqual(1, result["auto_locked"])
+        self.assertIn(("addTags", {"notes": [7], "tags": anki_protect.LOCKED_TAG}), sent)
+        self.assertNotIn("updateNoteFields", [action for action, _ in sent])
+        self.assertNotIn("carried::1", manifest)
+
+    def test_core_sync_uploads_each_missing_media_file_once(self):
+        """One media listing covers every prefix and no file is sent twice."""
+        rows = []
+        for index, sentence_id in enumerate([1, 2, 2]):
+            row = {field: "" for field in sync_spanish_core_to_anki.FIELDS}
+            row.update({
+                "SourceID": f"media::{index}",
+                "DeckPath": "Spanish Core::A1",
+                "Front": f"front {index}",
+                "Audio": f"[sound:tatoeba_spa_{sentence_id}.mp3]",
+                "AudioURL": f"https://example.test/{sentence_id}.mp3",
+                "Tags": "core",
+            })
+            rows.append(row)
+        sent = []
+
+        def fake_invoke(action, **params):
+            if action == "multi":
+                return [fake_invoke(item["action"], **item["params"]) for item in params["actions"]]
+            sent.append((action, params))
+            if action == "getMediaFilesNames":
+                return ["tatoeba_spa_1.mp3"] if params["pattern"] == "tatoeba_spa_*" else []
+            return None
+
+        with patch.object(sync_spanish_core_to_anki, "load_existing_notes", return_value={}), \
+             patch.object(sync_spanish_core_to_anki, "invoke", side_effect=fake_invoke), \
+             patch.object(media_cache, "download", return_value=b"audio") as mock_download:
+            result = sync_spanish_core_to_anki.sync_rows(rows, store_media=True)
+
+        listed = [params["pattern"] for action, params in sent if action == "getMediaFilesNames"]
+        stored = [params["filename"] for action, params in sent if action == "storeMediaFile"]
+        self.assertEqual(list(media_cache.MEDIA_PATTERNS), listed)
+        self.assertEqual(["tatoeba_spa_2.mp3"], stored)
+        mock_download.assert_called_once_with("https://example.test/2.mp3")
+        self.assertEqual(3, result["created"])
+        self.assertEqual(2, result["media_upload"]["skipped_existing"])
+
+    def test_core_resync_without_deck_changes_sends_no_moves(self):
+        """Cards already in their row's deck are left alone on a no-op resync."""
+        row = {field: "" for field in sync_spanish_core_to_anki.FIELDS}
+        row.update({"SourceID": "core::1", "DeckPath": "Spanish Core::A1", "Front": "source", "Tags": "core"})
+        note = {"noteId": 42, "fields": {}, "tags": [anki_protect.LOCKED_TAG], "cards": [420, 421]}
+
+        def fake_invoke(action, **params):
+            if action == "cardsInfo":
+                return [{"cardId": card_id, "deckName": "Spanish Core::A1"} for card_id in params["cards"]]
+            return None
+
+        with patch.object(sync_spanish_core_to_anki, "load_existing_notes", return_value={"core::1": note}), \
+             patch.object(sync_spanish_core_to_anki, "invoke", side_effect=fake_invoke) as mock_invoke:
+            result = sync_spanish_core_to_anki.sync_rows([row], store_media=False)
+
+        self.assertEqual(0, result["moved_cards"])
+        self.assertEqual(
+            ["cardsInfo", "createDeck"],
+            sorted({call.args[0] for call in mock_invoke.call_args_list}),
         )
-        self.assertNotIn("updateNoteFields", [call.args[0] for call in mock_invoke.call_args_list])
-        self.assertIn("changeDeck", [call.args[0] for call in mock_invoke.call_args_list])
 
     def test_stale_legacy_note_is_not_pruned_without_fingerprint(self):
         """Pruning cannot prove a legacy note is unedited, so it leaves it alone."""
@@ -182,7 +760,7 @@ class TestAnkiAutomation(unittest.TestCase):
              patch.object(anki_tools, "get_note_fields", return_value=current), \
              patch.object(anki_tools, "get_word_data", return_value=fetched), \
              patch("builtins.input", side_effect=["y", "", "", ""]), \
-             patch.object(anki_tools, "generate_audio_base64") as mock_audio, \
+             patch.object(anki_tools, "generate_audio_file") as mock_audio, \
              patch.object(anki_tools, "invoke") as mock_invoke:
             anki_tools.main()
 
@@ -198,18 +776,21 @@ class TestAnkiAutomation(unittest.TestCase):
         }
         fetched = {"meaning": "fetched", "example": "Fetched apple", "ipa": "/fetched/"}
 
-        with patch("sys.argv", ["anki_tools.py", "apple"]), \
-             patch.object(anki_tools, "find_note_id", return_value=42), \
-             patch.object(anki_tools, "get_note_fields", return_value=current), \
-             patch.object(anki_tools, "get_word_data", return_value=fetched), \
-             patch("builtins.input", side_effect=["y", "new meaning", "New apple example", ""]), \
-             patch.object(
-                 anki_tools,
-                 "generate_audio_base64",
-                 side_effect=[None, "ZXhhbXBsZS1hdWRpbw=="],
-             ), \
-             patch.object(anki_tools, "invoke") as mock_invoke:
-            anki_tools.main()
+        with tempfile.TemporaryDirectory() as temp_dir:
+            example_audio = Path(temp_dir) / "user_apple_example.mp3"
+            example_audio.write_bytes(b"example-audio")
+            with patch("sys.argv", ["anki_tools.py", "apple"]), \
+                 patch.object(anki_tools, "find_note_id", return_value=42), \
+                 patch.object(anki_tools, "get_note_fields", return_value=current), \
+                 patch.object(anki_tools, "get_word_data", return_value=fetched), \
+                 patch("builtins.input", side_effect=["y", "new meaning", "New apple example", ""]), \
+                 patch.object(
+                     anki_tools,
+                     "generate_audio_file",
+                     side_effect=[None, example_audio],
+                 ), \
+                 patch.object(anki_tools, "invoke") as mock_invoke:
+                anki_tools.main()
 
         update_calls = [
             call for call in mock_invoke.call_args_list if call.args[0] == "updateNoteFields"
@@ -249,9 +830,9 @@ class TestAnkiAutomation(unittest.TestCase):
         note = {"noteId": 7, "fields": fields, "cards": [], "tags": []}
         order_map = {"4000 Essential English Words::1.Book::::apple": 1}
 
-        with patch.object(sync_4000_production_to_anki, "get_notes", return_value=[note]), \
+        with patch.object(sync_4000_production_to_anki, "model_notes", return_value=[note]), \
              patch.object(sync_4000_production_to_anki, "update_note_fields_many") as mock_update, \
-             patch.object(sync_4000_production_to_anki, "card_maps_for_notes", return_value={}), \
+             patch.object(sync_4000_production_to_anki, "card_maps_for_notes", return_value=({}, {})), \
              patch.object(sync_4000_production_to_anki, "apply_card_plan"), \
              patch.object(sync_4000_production_to_anki, "invoke") as mock_invoke:
             result = sync_4000_production_to_anki.sync_spanish(
@@ -911,6 +1492,315 @@ class TestAnkiAutomation(unittest.TestCase):
             spanish_core_learning._tatoeba_pair_quality_key(complex_row),
         )
 
+    def test_tatoeba_store_ingests_dumps_once(self):
+        """The corpus store orients spa-eng links and rebuilds only when dumps change."""
+        def write_tsv_bz2(path, rows):
+            with bz2.open(path, "wt", encoding="utf-8", newline="") as handle:
+                csv.writer(handle, delimiter="\t", lineterminator="\n").writerows(rows)
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            directory = Path(tmpdir)
+            write_tsv_bz2(directory / "spa_sentences.tsv.bz2", [("1", "spa", "Hola."), ("3", "spa", "Adiós.")])
+            write_tsv_bz2(directory / "eng_sentences.tsv.bz2", [("2", "eng", "Hello."), ("4", "eng", "Bye.")])
+            write_tsv_bz2(directory / "spa-eng_links.tsv.bz2", [("1", "2"), ("4", "3"), ("2", "9")])
+            audio = "1\t10\tmaria\tCC BY\n3\t30\n".encode("utf-8")
+            with tarfile.open(directory / "sentences_with_audio.tar.bz2", "w:bz2") as archive:
+                info = tarfile.TarInfo("sentences_with_audio.csv")
+                info.size = len(audio)
+                archive.addfile(info, io.BytesIO(audio))
+
+            with tatoeba_store.open_corpus(directory) as corpus:
+                pairs = list(corpus.spa_eng_pairs())
+                english = list(corpus.sentences("eng"))
+                spanish = list(corpus.sentences("spa"))
+            with patch.object(tatoeba_store, "ingest", side_effect=AssertionError("store is current")):
+                tatoeba_store.open_corpus(directory).close()
+                (directory / "eng_sentences.tsv.bz2").unlink()
+                with tatoeba_store.open_corpus(directory) as corpus:
+                    self.assertTrue(corpus.has_links())
+
+            links_only = directory / "links_only"
+            links_only.mkdir()
+            write_tsv_bz2(links_only / "spa-eng_links.tsv.bz2", [("1", "2")])
+            with patch.object(tatoeba_store, "ingest", side_effect=AssertionError("partial dumps")):
+                self.assertIsNone(tatoeba_store.open_corpus(links_only))
+            self.assertFalse(tatoeba_store.store_path(links_only).exists())
+
+        self.assertEqual(
+            [
+                ("1", "Hola.", "2", "Hello.", "10", "maria", "CC BY"),
+                ("3", "Adiós.", "4", "Bye.", None, None, None),
+            ],
+            pairs,
+        )
+        self.assertEqual([("2", "Hello.", None), ("4", "Bye.", None)], english)
+        self.assertEqual([("1", "Hola.", "10"), ("3", "Adiós.", "30")], spanish)
+
+    def test_tatoeba_store_maps_seq_chunks_in_order(self):
+        """Worker results come back in chunk order so merges match a serial scan."""
+        chunks = tatoeba_store.seq_chunks(3, 13, 4)
+        self.assertEqual([(3, 6), (6, 9), (9, 12), (12, 13)], chunks)
+        self.assertEqual([(3, 13)], tatoeba_store.seq_chunks(3, 13, 1))
+        self.assertEqual([], tatoeba_store.seq_chunks(0, 0, 4))
+        results = list(tatoeba_store.map_ordered(pow, [(start, 2) for start, _ in chunks], 2))
+        self.assertEqual([9, 36, 81, 144], results)
+
+    def test_card_validation_reports_structured_errors_in_one_pass(self):
+        """Rules run once per card, repeats are flagged, and each rule is timed."""
+        cards = [
+            {"SourceID": "a", "Front": "one", "Answer": "x"},
+            {"SourceID": "b", "Front": "", "Answer": "y"},
+            {"SourceID": "a", "Front": "three", "Answer": ""},
+            {"SourceID": "a", "Front": "four", "Answer": "z"},
+        ]
+        rules = [
+            card_validation.UniqueRule(
+                "duplicate SourceID",
+                "SourceID",
+                key=lambda card: card["SourceID"],
+                message=lambda card: f"{card['SourceID']}: duplicate SourceID",
+            ),
+            card_validation.required_fields(("Front", "Answer")),
+        ]
+
+        report = card_validation.check_cards(cards, rules)
+        self.assertEqual(
+            [
+                card_validation.CardError("b", "blank field", "Front", "b: blank Front"),
+                card_validation.CardError("a", "duplicate SourceID", "SourceID", "a: duplicate SourceID"),
+                card_validation.CardError("a", "blank field", "Answer", "a: blank Answer"),
+                card_validation.CardError("a", "duplicate SourceID", "SourceID", "a: duplicate SourceID"),
+            ],
+            report.errors,
+        )
+        self.assertEqual({"duplicate SourceID", "blank field"}, set(report.timings))
+        self.assertIn("validation: 4 error(s)", report.summary())
+        self.assertEqual(report.messages, card_validation.check_cards(cards, rules).messages)
+
+        duplicated = spanish_core_learning.get_cards()[:2]
+        duplicated.append(dict(duplicated[0]))
+        self.assertEqual(
+            [f"{duplicated[0]['SourceID']}: duplicate SourceID"],
+            spanish_core_learning.validate_cards(duplicated),
+        )
+
+    def test_card_catalog_builds_once_until_inputs_change(self):
+        """Filters and level counts reuse one build until an input file or the cache is reset."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            source = Path(tmpdir) / "source.tsv"
+            source.write_text("v1", encoding="utf-8")
+            cards = [
+                {"Level": "a1", "CardType": "cloze", "SourceID": "1"},
+                {"Level": "a1", "CardType": "rule", "SourceID": "2"},
+                {"Level": "b1", "CardType": "cloze", "SourceID": "3"},
+            ]
+            build = MagicMock(return_value=cards)
+            catalog = card_catalog.CardCatalog(build, lambda: [source, Path(tmpdir) / "missing.tsv"])
+
+            self.assertEqual(cards, catalog.cards())
+            self.assertEqual(["1", "3"], [card["SourceID"] for card in catalog.cards(card_type="cloze")])
+            self.assertEqual(["1"], [card["SourceID"] for card in catalog.cards("a1", "cloze")])
+            self.assertEqual([], catalog.cards("c2"))
+            self.assertEqual({"a1": 2, "b1": 1}, catalog.level_counts())
+            catalog.cards()[0]["SourceID"] = "changed"
+            self.assertEqual("1", catalog.cards()[0]["SourceID"])
+            self.assertEqual(1, build.call_count)
+
+            catalog.cards(include_extra=True)
+            build.assert_called_with(include_extra=True)
+            source.write_text("v2 is longer", encoding="utf-8")
+            catalog.cards()
+            self.assertEqual(3, build.call_count)
+            catalog.invalidate()
+            catalog.cards()
+            self.assertEqual(4, build.call_count)
+
+        spanish_core_learning.clear_card_cache()
+        self.assertEqual(
+            len(spanish_core_learning.get_cards()),
+            sum(item["card_count"] for item in spanish_core_learning.get_level_summary()),
+        )
+
+    def test_selection_cache_skips_validation_until_file_or_key_changes(self):
+        """A validated marker lets unchanged selection files skip their row checks."""
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = Path(tmpdir) / "selected.tsv"
+            path.write_text("eng_id\ttext\n1\tHello there.\n2\n", encoding="utf-8")
+            rows = tatoeba_store.SelectionFile(path).rows
+            self.assertEqual([{"eng_id": "1", "text": "Hello there."}, {"eng_id": "2", "text": None}], rows)
+            self.assertEqual({"eng_id": "1", "text": "Hi."}, dict(rows[0].replace(text="Hi.")))
+
+            valid = MagicMock(return_value=True)
+            self.assertEqual(rows, english_mastery._read_selection(path, "key", valid))
+            self.assertEqual(rows, english_mastery._read_selection(path, "key", valid))
+            self.assertEqual(2, valid.call_count)
+
+            english_mastery._read_selection(path, "other-key", valid)
+            self.assertEqual(4, valid.call_count)
+            path.write_text("eng_id\ttext\n1\tHello there.\n", encoding="utf-8")
+            valid.side_effect = lambda row: False
+            self.assertEqual([], english_mastery._read_selection(path, "other-key", valid))
+            self.assertEqual([], english_mastery._read_selection(path, "other-key", valid))
+            self.assertEqual(6, valid.call_count)
+
+    def test_spanish_target_index_matches_every_pattern(self):
+        """The first-word index finds the same targets as scanning every regex."""
+        sentences = [
+            "Voy a cantar mañana.",
+            "¿Estás bien? Me gustan los gatos.",
+            "VOY A COMER AHORA.",
+            "Si puedo, lo haré porque quiero.",
+            "No hay nada más que hacer.",
+        ]
+        for sentence in sentences:
+            with self.subTest(sentence=sentence):
+                expected = [
+                    (level, topic, target)
+                    for level, topic, target, pattern in spanish_core_learning.SENTENCE_TARGETS
+                    if re.search(pattern, sentence)
+                ]
+                self.assertEqual(
+                    expected, spanish_core_learning._matching_sentence_targets(sentence)
+                )
+
+    def test_spanish_sentence_features_are_computed_once_per_text(self):
+        """Validators share one feature record per sentence text."""
+        spanish_core_learning._sentence_features.cache_clear()
+        text = "Vosotros habéis comido."
+        features = spanish_core_learning._sentence_features(text)
+        self.assertIs(features, spanish_core_learning._sentence_features(text))
+        self.assertEqual(["Vosotros", "habéis", "comido"], features.tokens)
+        self.assertEqual(3, features.word_count)
+        self.assertEqual("vosotros habéis comido.", features.casefolded)
+        self.assertTrue(features.clean)
+
+        for level in ("a0_survival", "a1_2_core_sentences"):
+            self.assertFalse(spanish_core_learning._tatoeba_level_ok(level, text, "You have eaten."))
+        self.assertEqual({spanish_core_learning._VOSOTROS_RE: True}, features.regex_hits)
+        self.assertEqual(2, spanish_core_learning._sentence_features.cache_info().misses)
+        self.assertFalse(spanish_core_learning._is_clean_sentence("Uno; dos."))
+
+    def test_spanish_tatoeba_candidates_close_full_targets(self):
+        """Full buckets leave the open set, and their patterns are no longer run."""
+        level, _, target, _ = spanish_core_learning.SENTENCE_TARGETS[0]
+        candidates = spanish_core_learning._TatoebaCandidates(1)
+        candidates.candidate_limits[(level, target)] = 2
+        for number in range(2):
+            self.assertIn((level, target), candidates.open_targets)
+            candidates.add(level, "topic", target, f"s{number}", f"Frase {number}.", f"e{number}", "Text.", ("", "", ""))
+        self.assertNotIn((level, target), candidates.open_targets)
+        self.assertFalse(candidates.wants(level, target, "s9", "Otra frase.", "e9"))
+        self.assertEqual(len(spanish_core_learning.SENTENCE_TARGETS) - 1, len(candidates.open_targets))
+
+        sentence = "Voy a cantar mañana."
+        matches = spanish_core_learning._matching_sentence_targets(sentence)
+        self.assertTrue(matches)
+        closed = {(matches[0][0], matches[0][2])}
+        remaining = spanish_core_learning._matching_sentence_targets(
+            sentence, candidates.open_targets - closed
+        )
+        self.assertEqual([match for match in matches if (match[0], match[2]) not in closed], remaining)
+
+    def test_spanish_tatoeba_cache_remines_only_changed_targets(self):
+        """Targets with a changed fingerprint are re-mined; other cached rows are kept."""
+        limit = spanish_core_learning.TATOEBA_LIMIT_PER_TARGET
+        fingerprints = spanish_core_learning._tatoeba_target_fingerprints(limit)
+        rows = []
+        for level, topic, target, _ in spanish_core_learning.SENTENCE_TARGETS:
+            for number in range(spanish_core_learning._tatoeba_target_limit(level, limit)):
+                rows.append(
+                    {
+                        "level": level,
+                        "topic": topic,
+                        "target": target,
+                        "spa_id": f"{target}-{number}",
+                        "spa_text": f"{target} {number}.",
+                        "eng_id": f"{target}-en-{number}",
+                        "eng_text": f"{target} {number}.",
+                    }
+                )
+        changed_level, _, changed_target, _ = spanish_core_learning.SENTENCE_TARGETS[3]
+        changed = (changed_level, changed_target)
+        fingerprints_on_disk = {**fingerprints, changed: "old-pattern"}
+        mined = [
+            {**row, "spa_id": f"new-{number}"}
+            for number, row in enumerate(row for row in rows if (row["level"], row["target"]) == changed)
+        ]
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_path = Path(tmpdir) / "selected.tsv"
+            with (
+                patch.object(spanish_core_learning, "TATOEBA_SELECTED_PATH", cache_path),
+                patch.object(tatoeba_store, "corpus_available", return_value=True),
+                patch.object(spanish_core_learning, "_valid_tatoeba_pair", return_value=True),
+                patch.object(spanish_core_learning, "_tatoeba_pair_rows", return_value=mined) as pair_rows,
+            ):
+                spanish_core_learning._write_selected_tatoeba_pairs(rows, fingerprints_on_disk)
+                selected = spanish_core_learning._load_tatoeba_pairs()
+                self.assertEqual({changed}, pair_rows.call_args.kwargs["targets"])
+
+                pair_rows.reset_mock()
+                self.assertEqual(
+                    [row["spa_id"] for row in selected],
+                    [row["spa_id"] for row in spanish_core_learning._load_tatoeba_pairs()],
+                )
+                pair_rows.assert_not_called()
+
+                # Without a corpus, stale targets keep their rows and the file is untouched.
+                spanish_core_learning._write_selected_tatoeba_pairs(rows, fingerprints_on_disk)
+                written = cache_path.read_bytes()
+                with patch.object(tatoeba_store, "corpus_available", return_value=False):
+                    kept = spanish_core_learning._load_tatoeba_pairs()
+                pair_rows.assert_not_called()
+                self.assertEqual([row["spa_id"] for row in rows], [row["spa_id"] for row in kept])
+                self.assertEqual(written, cache_path.read_bytes())
+
+        expected = [
+            f"new-{row['spa_id'].rsplit('-', 1)[1]}" if (row["level"], row["target"]) == changed else row["spa_id"]
+            for row in rows
+        ]
+        self.assertEqual(expected, [row["spa_id"] for row in selected])
+
+    def test_spanish_tatoeba_cache_remines_only_targets_of_rejected_sentences(self):
+        """Rejecting a cached sentence re-mines its target without touching other fingerprints."""
+        limit = spanish_core_learning.TATOEBA_LIMIT_PER_TARGET
+        fingerprints = spanish_core_learning._tatoeba_target_fingerprints(limit)
+        rows = [
+            {
+                "level": level,
+                "topic": topic,
+                "target": target,
+                "spa_id": f"{target}-{number}",
+                "spa_text": f"{target} {number}.",
+                "eng_id": f"{target}-en-{number}",
+                "eng_text": f"{target} {number}.",
+            }
+            for level, topic, target, _ in spanish_core_learning.SENTENCE_TARGETS
+            for number in range(spanish_core_learning._tatoeba_target_limit(level, limit))
+        ]
+        rejected = rows[5]
+        target = (rejected["level"], rejected["target"])
+        rejected_ids = {*spanish_core_learning.REJECT_TATOEBA_SENTENCE_IDS, rejected["spa_id"]}
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cache_path = Path(tmpdir) / "selected.tsv"
+            with (
+                patch.object(spanish_core_learning, "TATOEBA_SELECTED_PATH", cache_path),
+                patch.object(spanish_core_learning, "REJECT_TATOEBA_SENTENCE_IDS", rejected_ids),
+                patch.object(tatoeba_store, "corpus_available", return_value=True),
+                patch.object(
+                    spanish_core_learning,
+                    "_valid_tatoeba_pair",
+                    side_effect=lambda row: row["spa_id"] not in rejected_ids,
+                ),
+                patch.object(spanish_core_learning, "_tatoeba_pair_rows", return_value=[]) as pair_rows,
+            ):
+                spanish_core_learning._write_selected_tatoeba_pairs(rows, fingerprints)
+                self.assertEqual(fingerprints, spanish_core_learning._tatoeba_target_fingerprints(limit))
+                spanish_core_learning._load_tatoeba_pairs()
+
+        self.assertEqual({target}, pair_rows.call_args.kwargs["targets"])
+
     def test_spanish_tatoeba_cache_is_revalidated(self):
         """Test stale cached pairs cannot bypass current selection rules."""
         fieldnames = [
@@ -1643,6 +2533,41 @@ class TestAnkiAutomation(unittest.TestCase):
                     f"Rejected sentence {eng_id} was still generated",
                 )
 
+    def test_english_tatoeba_selections_share_one_early_stopping_pass(self):
+        """Audio cloze, dictation, and mining read the dump once and stop when full."""
+        rows = [
+            ("1", "We have been here all day long.", "a1"),
+            ("2", "They have been friends for years now.", "a2"),
+            ("3", "My brother reads a book every night.", "a3"),
+            ("4", "I have been waiting for you today.", None),
+            ("5", "She walks to work every single morning.", "a5"),
+        ]
+        consumed = []
+
+        def fake_rows():
+            for row in rows:
+                consumed.append(row[0])
+                yield row
+
+        with tempfile.TemporaryDirectory() as tmpdir, \
+             patch.object(english_mastery, "TATOEBA_DIR", Path(tmpdir)), \
+             patch.object(english_mastery, "TATOEBA_SELECTED_PATH", Path(tmpdir) / "audio.tsv"), \
+             patch.object(english_mastery, "LISTENING_TARGETS", [("have been", r"\bhave been\b")]), \
+             patch.object(english_mastery, "SENTENCE_MINING_TARGETS", [("b2_tense_system", "have been", r"\bhave been\b")]), \
+             patch.object(english_mastery, "AUDIO_CLOZE_PER_TARGET", 1), \
+             patch.object(english_mastery, "DICTATION_QUOTA", 1), \
+             patch.object(english_mastery, "SENTENCE_MINING_PER_TARGET", 1), \
+             patch.object(english_mastery, "_english_tatoeba_rows", side_effect=fake_rows) as mock_rows:
+            audio_rows, mining_rows = english_mastery._english_tatoeba_selections()
+            cached_audio, cached_mining = english_mastery._english_tatoeba_selections()
+
+        mock_rows.assert_called_once()
+        self.assertEqual(["1", "2", "3", "4"], consumed)
+        self.assertEqual([("1", "audio_cloze"), ("2", "dictation")], [(row["eng_id"], row["kind"]) for row in audio_rows])
+        self.assertEqual(["4"], [row["eng_id"] for row in mining_rows])
+        self.assertEqual(["1", "2"], [row["eng_id"] for row in cached_audio])
+        self.assertEqual(["4"], [row["eng_id"] for row in cached_mining])
+
     def test_sentence_mining_has_no_duplicate_source_sentences(self):
         rows = english_mastery._load_sentence_mining_sentences()
         normalized = [re.sub(r"\s+", " ", row["text"]).strip().casefold() for row in rows]
@@ -2120,14 +3045,15 @@ class TestAnkiAutomation(unittest.TestCase):
         order_map = {"4000 Essential English Words::1.Book::::apple": 1}
         planned = {}
 
-        def fake_apply_card_plan(deck_cards, active_cards, suspended_cards):
+        def fake_apply_card_plan(deck_cards, active_cards, suspended_cards, live=None):
             planned["deck_cards"] = deck_cards
             planned["active_cards"] = active_cards
             planned["suspended_cards"] = suspended_cards
 
-        with patch.object(sync_4000_production_to_anki, "get_notes", return_value=[note]), \
+        with patch.object(sync_4000_production_to_anki, "model_notes", return_value=[note]), \
              patch.object(sync_4000_production_to_anki, "update_note_fields_many"), \
-             patch.object(sync_4000_production_to_anki, "card_maps_for_notes", return_value={1: {0: 101, 1: 102, 2: 103}}), \
+             patch.object(sync_4000_production_to_anki, "card_maps_for_notes", return_value=({1: {0: 101, 1: 102, 2: 103}}, {})), \
+             patch.object(sync_4000_production_to_anki, "add_generated_cards"), \
              patch.object(sync_4000_production_to_anki, "apply_card_plan", side_effect=fake_apply_card_plan):
             result = sync_4000_production_to_anki.sync_spanish(
                 order_map, active_limit=400, context_active_limit=0, force=True
@@ -2142,6 +3068,83 @@ class TestAnkiAutomation(unittest.TestCase):
         self.assertNotIn(103, planned["active_cards"])
         self.assertIn(103, planned["suspended_cards"])
 
+    def test_4000_card_plan_only_sends_changed_cards(self):
+        """Cards already in the planned deck and suspension state are not touched."""
+        live = {
+            1: {"cardId": 1, "deckName": "Spanish 4000 Words::A1", "queue": -1},
+            2: {"cardId": 2, "deckName": "Spanish 4000 Words::A1", "queue": 0},
+            3: {"cardId": 3, "deckName": "Spanish 4000 Words::A2", "queue": -1},
+            4: {"cardId": 4, "deckName": "Spanish 4000 Words::A1", "queue": 0},
+        }
+
+        def fake_invoke(action, **params):
+            if action == "cardsInfo":
+                return [live[card_id] for card_id in params["cards"]]
+            return None
+
+        with patch.object(sync_4000_production_to_anki, "invoke", side_effect=fake_invoke) as mock_invoke:
+            result = sync_4000_production_to_anki.apply_card_plan(
+                {"Spanish 4000 Words::A1": [1, 2, 3, 4]}, [2, 3], [1, 4], {1: live[1], 2: live[2], 3: live[3]}
+            )
+
+        reads = [call for call in mock_invoke.call_args_list if call.args[0] == "cardsInfo"]
+        writes = [call for call in mock_invoke.call_args_list if call.args[0] != "cardsInfo"]
+        self.assertEqual([unittest.mock.call("cardsInfo", cards=[4])], reads)
+        self.assertEqual(
+            [
+                unittest.mock.call("changeDeck", cards=[3], deck="Spanish 4000 Words::A1"),
+                unittest.mock.call("unsuspend", cards=[3]),
+                unittest.mock.call("suspend", cards=[4]),
+            ],
+            writes,
+        )
+        self.assertEqual(4, result["planned_deck_moves"])
+        self.assertEqual(1, result["applied_deck_moves"])
+        self.assertEqual(1, result["applied_unsuspend"])
+        self.assertEqual(1, result["applied_suspend"])
+
+    def test_spanish_4000_sync_plans_cards_generated_by_its_updates(self):
+        """Filling ProductionCue creates the production card, which is planned in the same run."""
+        fields = {
+            "SourceID": {"value": "4000 Essential English Words::1.Book::::apple"},
+            "English": {"value": "apple"},
+            "Spanish": {"value": "la manzana"},
+            "SpanishPartOfSpeech": {"value": "noun"},
+            "ProductionCue": {"value": ""},
+        }
+        note = {"noteId": 1, "fields": fields, "cards": [101]}
+        deck_name = sync_4000_production_to_anki.level_deck(sync_4000_production_to_anki.SPANISH_ROOT, 1)
+        cards = {
+            101: {"cardId": 101, "note": 1, "ord": 0, "deckName": deck_name, "queue": -1},
+            102: {"cardId": 102, "note": 1, "ord": 1, "deckName": "Default", "queue": 0},
+        }
+        sent = []
+
+        def fake_invoke(action, **params):
+            sent.append((action, params))
+            if action == "cardsInfo":
+                return [cards[card_id] for card_id in params["cards"]]
+            if action == "findCards":
+                return sorted(cards)
+            return None
+
+        with patch.object(sync_4000_production_to_anki, "model_notes", return_value=[note]) as mock_model_notes, \
+             patch.object(sync_4000_production_to_anki, "update_note_fields_many"), \
+             patch.object(sync_4000_production_to_anki, "invoke", side_effect=fake_invoke):
+            result = sync_4000_production_to_anki.sync_spanish(
+                {"4000 Essential English Words::1.Book::::apple": 1},
+                active_limit=400,
+                context_active_limit=0,
+                force=True,
+            )
+
+        mock_model_notes.assert_called_once_with(sync_4000_production_to_anki.SPANISH_MODEL)
+        self.assertIn(("findCards", {"query": "nid:1"}), sent)
+        self.assertEqual([[101], [102]], [params["cards"] for action, params in sent if action == "cardsInfo"])
+        self.assertIn(("changeDeck", {"cards": [102], "deck": deck_name}), sent)
+        self.assertEqual(0, result["production_suspended"])
+        self.assertEqual(1, result["card_plan"]["applied_deck_moves"])
+
     def test_english_4000_sync_keeps_recognition_suspended(self):
         """Test English 4000 sync only activates production cards."""
         fields = {
@@ -2153,7 +3156,7 @@ class TestAnkiAutomation(unittest.TestCase):
         cue_map = {"4000 Essential English Words::1.Book::::agree": "aynı fikirde olmak"}
         planned = {}
 
-        def fake_apply_card_plan(deck_cards, active_cards, suspended_cards):
+        def fake_apply_card_plan(deck_cards, active_cards, suspended_cards, live=None):
             planned["deck_cards"] = deck_cards
             planned["active_cards"] = active_cards
             planned["suspended_cards"] = suspended_cards
@@ -2170,8 +3173,8 @@ class TestAnkiAutomation(unittest.TestCase):
         with patch.object(sync_4000_production_to_anki, "invoke", side_effect=fake_invoke), \
              patch.object(sync_4000_production_to_anki, "ENGLISH_MODELS", ("4000 EEW",)), \
              patch.object(sync_4000_production_to_anki, "update_note_fields_many"), \
-             patch.object(sync_4000_production_to_anki, "get_notes", return_value=[note]), \
-             patch.object(sync_4000_production_to_anki, "card_maps_for_notes", return_value={1: {0: 201, 1: 202}}), \
+             patch.object(sync_4000_production_to_anki, "model_notes", return_value=[note]), \
+             patch.object(sync_4000_production_to_anki, "card_maps_for_notes", return_value=({1: {0: 201, 1: 202}}, {})), \
              patch.object(sync_4000_production_to_anki, "apply_card_plan", side_effect=fake_apply_card_plan):
             result = sync_4000_production_to_anki.sync_english(
                 order_map, cue_map, active_limit=400, force=True
@@ -2218,8 +3221,8 @@ class TestAnkiAutomation(unittest.TestCase):
         with patch.object(sync_4000_production_to_anki, "invoke", side_effect=fake_invoke), \
              patch.object(sync_4000_production_to_anki, "ENGLISH_MODELS", ("4000 EEW",)), \
              patch.object(sync_4000_production_to_anki, "update_note_fields_many") as mock_update, \
-             patch.object(sync_4000_production_to_anki, "get_notes", return_value=notes), \
-             patch.object(sync_4000_production_to_anki, "card_maps_for_notes", return_value={}), \
+             patch.object(sync_4000_production_to_anki, "model_notes", return_value=notes), \
+             patch.object(sync_4000_production_to_anki, "card_maps_for_notes", return_value=({}, {})), \
              patch.object(sync_4000_production_to_anki, "apply_card_plan"):
             sync_4000_production_to_anki.sync_english(
                 {lower_key: 1, drop_key: 2},
@@ -2269,8 +3272,8 @@ class TestAnkiAutomation(unittest.TestCase):
         with patch.object(sync_4000_production_to_anki, "invoke", side_effect=fake_invoke), \
              patch.object(sync_4000_production_to_anki, "ENGLISH_MODELS", ("4000 EEW",)), \
              patch.object(sync_4000_production_to_anki, "update_note_fields_many") as mock_update, \
-             patch.object(sync_4000_production_to_anki, "get_notes", return_value=[note]), \
-             patch.object(sync_4000_production_to_anki, "card_maps_for_notes", return_value={}), \
+             patch.object(sync_4000_production_to_anki, "model_notes", return_value=[note]), \
+             patch.object(sync_4000_production_to_anki, "card_maps_for_notes", return_value=({}, {})), \
              patch.object(sync_4000_production_to_anki, "apply_card_plan"):
             result = sync_4000_production_to_anki.sync_english(
                 {key: 1},
@@ -2287,6 +3290,109 @@ class TestAnkiAutomation(unittest.TestCase):
         self.assertEqual(1, result["typing_enabled_locked"])
         mock_update.assert_called_once_with([(1, {"ProductionAnswer": "lower"})])
 
+    def test_field_merger_applies_untouched_source_changes_and_reports_conflicts(self):
+        """Three-way merge: base is the last synced value, ours is live, theirs is the source."""
+        field_names = ["Front", "Back", "Notes"]
+        with tempfile.TemporaryDirectory() as tmp:
+            path = Path(tmp) / "sync_base.sqlite3"
+            merger = anki_protect.FieldMerger.load("deck", field_names, path)
+            merger.wrote("1", {"Front": "front", "Back": "back", "Notes": "notes"})
+            merger.save(path)
+
+            merger = anki_protect.FieldMerger.load("deck", field_names, path)
+            live = {"Front": {"value": "front"}, "Back": {"value": "my back"}, "Notes": {"value": "my notes"}}
+            source = {"Front": "new front", "Back": "back", "Notes": "new notes"}
+            self.assertEqual(merger.merge("1", live, source), {"Front": "new front"})
+            self.assertEqual(merger.merge("2", live, source), {})
+            self.assertEqual(merger.conflicts, {"1": ["Notes"], "2": ["Front", "Back", "Notes"]})
+            merger.save(path)
+
+            merger = anki_protect.FieldMerger.load("deck", field_names, path)
+            self.assertEqual(merger.bases["1"], {"Front": "new front", "Back": "back", "Notes": "notes"})
+            self.assertEqual(merger.bases["2"], {})
+            live["Front"]["value"] = "new front"
+            self.assertEqual(merger.merge("1", live, source), {})
+            self.assertEqual(merger.merge("2", live, source), {})
+            self.assertEqual(merger.conflicts, {"1": ["Notes"], "2": ["Back", "Notes"]})
+            self.assertEqual(anki_protect.FieldMerger.load("other", field_names, path).bases, {})
+
+    def test_field_vector_pinpoints_edited_fields_and_serves_as_merge_base(self):
+        """The per-field vector in SyncFingerprint names edits without a sidecar base."""
+        field_names = ["Front", "Back", "Notes"]
+        written = anki_protect.source_fields_with_fingerprint(
+            {"Front": "front", "Back": "<b>back</b>", "Notes": "notes"}, field_names
+        )
+        whole, _, vector = written[anki_protect.FINGERPRINT_FIELD].partition(":")
+        self.assertEqual(whole, anki_protect.content_fingerprint(written, field_names))
+        self.assertEqual(len(vector), 32)
+
+        live = {name: {"value": value} for name, value in written.items()}
+        self.assertEqual(anki_protect.edited_fields(live, field_names), [])
+        self.assertFalse(anki_protect.note_has_untracked_edits(live, written, field_names))
+        live["Back"]["value"] = "<i>back</i>"
+        live["Notes"]["value"] = "my   notes"
+        self.assertEqual(anki_protect.edited_fields(live, field_names), ["Back", "Notes"])
+        self.assertTrue(anki_protect.note_has_untracked_edits(live, written, field_names))
+        self.assertIsNone(anki_protect.edited_fields(live, field_names[:2]))
+        self.assertIsNone(
+            anki_protect.edited_fields({**live, anki_protect.FINGERPRINT_FIELD: {"value": whole}}, field_names)
+        )
+
+        merger = anki_protect.FieldMerger("deck", field_names)
+        source = {"Front": "new front", "Back": "<b>back</b>", "Notes": "new notes"}
+        merged = merger.merge("1", live, source)
+        self.assertEqual(merger.conflicts, {"1": ["Notes"]})
+        self.assertEqual(merger.written["1"], {"Front": "new front", "Back": "<b>back</b>"})
+
+        # The merged write refreshes Front's digest but keeps the content fingerprint.
+        self.assertEqual(set(merged), {"Front", anki_protect.FINGERPRINT_FIELD})
+        self.assertEqual(merged[anki_protect.FINGERPRINT_FIELD].partition(":")[0], whole)
+        live.update({name: {"value": value} for name, value in merged.items()})
+        self.assertEqual(anki_protect.edited_fields(live, field_names), ["Back", "Notes"])
+        later = {"Front": "newer front", "Back": "<b>back</b>", "Notes": "new notes"}
+        self.assertEqual(anki_protect.FieldMerger("deck", field_names).merge("1", live, later)["Front"], "newer front")
+
+    def test_locked_production_note_receives_non_conflicting_source_updates(self):
+        """A locked note keeps its edited cue but takes source changes to untouched fields."""
+        key = "4000 Essential English Words::1.Book::::merge"
+        level = sync_4000_production_to_anki.level_for_order(1)
+        base = {
+            "ProductionSourceID": key,
+            "ProductionCue": "eski ipucu",
+            "ProductionAnswer": "merge",
+            "ProductionOrder": "7",
+            "ProductionLevel": level,
+            "ProductionEnabled": "yes",
+        }
+        merger = anki_protect.FieldMerger(
+            sync_4000_production_to_anki.ENGLISH_PRODUCTION_LEGACY_NAMESPACE,
+            sync_4000_production_to_anki.ENGLISH_PRODUCTION_FIELDS,
+        )
+        merger.wrote(key, base)
+        merger.save()
+        note = {
+            "noteId": 1,
+            "fields": {
+                **{name: {"value": value} for name, value in base.items()},
+                "ProductionCue": {"value": "benim özel ipucum"},
+                "Word": {"value": "merge"},
+            },
+            "cards": [],
+            "tags": [anki_protect.LOCKED_TAG],
+        }
+
+        with patch.object(sync_4000_production_to_anki, "invoke", return_value=[]), \
+             patch.object(sync_4000_production_to_anki, "ENGLISH_MODELS", ("4000 EEW",)), \
+             patch.object(sync_4000_production_to_anki, "update_note_fields_many") as mock_update, \
+             patch.object(sync_4000_production_to_anki, "model_notes", return_value=[note]), \
+             patch.object(sync_4000_production_to_anki, "card_maps_for_notes", return_value=({}, {})), \
+             patch.object(sync_4000_production_to_anki, "apply_card_plan"):
+            result = sync_4000_production_to_anki.sync_english({key: 1}, {key: "birleştirmek"}, active_limit=400)
+
+        self.assertEqual(1, result["merged_locked"])
+        self.assertEqual({key: ["ProductionCue"]}, result["field_conflicts"])
+        mock_update.assert_called_once_with([(1, {"ProductionOrder": "1"})])
+
     def test_english_4000_legacy_generated_cue_migrates_without_locking(self):
         """The old plain production cue is recognized as generated on first sync."""
         key = "4000 Essential English Words::1.Book::::agree"
@@ -2320,8 +3426,8 @@ class TestAnkiAutomation(unittest.TestCase):
         with patch.object(sync_4000_production_to_anki, "invoke", side_effect=fake_invoke) as mock_invoke, \
              patch.object(sync_4000_production_to_anki, "ENGLISH_MODELS", ("4000 EEW",)), \
              patch.object(sync_4000_production_to_anki, "update_note_fields_many") as mock_update, \
-             patch.object(sync_4000_production_to_anki, "get_notes", return_value=[note]), \
-             patch.object(sync_4000_production_to_anki, "card_maps_for_notes", return_value={1: {}}), \
+             patch.object(sync_4000_production_to_anki, "model_notes", return_value=[note]), \
+             patch.object(sync_4000_production_to_anki, "card_maps_for_notes", return_value=({1: {}}, {})), \
              patch.object(sync_4000_production_to_anki, "apply_card_plan"):
             result = sync_4000_production_to_anki.sync_english(
                 {key: 1},
@@ -2993,18 +4099,50 @@ class TestAnkiAutomation(unittest.TestCase):
     @patch('subprocess.run')
     def test_generate_audio_logic(self, mock_run):
         """Test the audio generation command sequence."""
-        # Mocking open to simulate file presence for the base64 conversion
-        with patch("builtins.open", unittest.mock.mock_open(read_data=b"audio_data")):
-            with patch("os.path.exists", return_value=True):
-                with patch("os.remove"):
-                    data = anki_tools.generate_audio_base64("hello", "tmp")
-                    self.assertIsNotNone(data)
-                    # Verify say and ffmpeg were called
-                    self.assertEqual(mock_run.call_count, 2)
-                    args1 = mock_run.call_args_list[0][0][0]
-                    args2 = mock_run.call_args_list[1][0][0]
-                    self.assertEqual(args1[0], "say")
-                    self.assertEqual(args2[0], "ffmpeg")
+        with tempfile.TemporaryDirectory() as temp_dir:
+            output = Path(temp_dir) / "audio" / "hello.mp3"
+            path = anki_tools.generate_audio_file("hello", output)
+            self.assertEqual(output, path)
+            # Verify say and ffmpeg were called
+            self.assertEqual(mock_run.call_count, 2)
+            args1 = mock_run.call_args_list[0][0][0]
+            args2 = mock_run.call_args_list[1][0][0]
+            self.assertEqual(args1[0], "say")
+            self.assertEqual(args2[0], "ffmpeg")
+            self.assertEqual(str(output), args2[-1])
+
+    def test_media_uploader_sends_paths_and_falls_back_to_base64(self):
+        """Local Anki reads cached files by path; a rejected path switches to base64."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            first = Path(temp_dir) / "a.mp3"
+            second = Path(temp_dir) / "b.mp3"
+            first.write_bytes(b"abcdef")
+            second.write_bytes(b"xyz")
+            calls = []
+
+            def fake_invoke(action, **params):
+                calls.append(params)
+                if "path" in params and params["filename"] == "b.mp3":
+                    raise RuntimeError("path not readable")
+                return params["filename"]
+
+            uploader = media_cache.MediaUploader(fake_invoke, by_path=True)
+            with patch("builtins.print"):
+                uploader.store("a.mp3", first)
+                uploader.store("b.mp3", second)
+
+        self.assertEqual(str(first.resolve()), calls[0]["path"])
+        self.assertNotIn("data", calls[0])
+        self.assertEqual("eHl6", calls[2]["data"])
+        self.assertEqual(
+            {
+                "uploaded_by_path": 1,
+                "uploaded_as_base64": 1,
+                "base64_bytes_saved": 8,
+                "skipped_existing": 0,
+            },
+            uploader.summary(),
+        )
 
     def test_find_note_id_formatting(self):
         """Test that the Anki search query is properly formatted."""